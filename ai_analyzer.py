@@ -3,12 +3,48 @@ AI Analysis Module
 Uses Claude API to generate summaries of changes in 10-K sections
 """
 
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
 import json
+import math
+import os
+import threading
+import time
+
+from json_stream import ObjectStream
+from numeric_delta import format_record
+from significance import fit_to_budget
+from stage_cache import digest
+from text_fingerprint import shingles
+from token_budget import TokenCounter, allocate
+
+# Bump on any prompt or response-parsing change, so cached summaries are regenerated
+PROMPT_VERSION = '2'
+
+# USD per million tokens. Prompt cache writes cost 1.25x the input rate, reads 0.1x.
+MODEL_PRICING = {
+    'claude-sonnet-4-20250514': {'input': 3.00, 'output': 15.00},
+    'claude-3-5-haiku-20241022': {'input': 0.80, 'output': 4.00},
+}
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+USD_TO_GBP = 0.79
+
+# Message Batches are billed at half the standard rate (prompt caching discounts still apply)
+BATCH_PRICE_MULTIPLIER = 0.5
+AI_BATCH_POLL_SECONDS = float(os.environ.get('AI_BATCH_POLL_SECONDS', '30'))
+AI_BATCH_MAX_WAIT_SECONDS = float(os.environ.get('AI_BATCH_MAX_WAIT_SECONDS', str(24 * 3600)))
+
+SECTION_NAMES = ['Item 1', 'Item 1A', 'Item 7', 'Item 8']
+
+# Concurrent API calls per analysis (per-section mode and map-reduce parts)
+AI_MAX_CONCURRENCY = int(os.environ.get('AI_MAX_CONCURRENCY', '4'))
+NO_CHANGES = 'No material disclosure changes identified in this section.'
 
 # Try to import required packages
 try:
     import anthropic
+    import httpx
     ANTHROPIC_AVAILABLE = True
 except ImportError:
     ANTHROPIC_AVAILABLE = False
@@ -19,55 +55,13 @@ try:
     CONFIG_AVAILABLE = True
 except ImportError:
     CONFIG_AVAILABLE = False
-    import os
 
 
-class AIAnalyzer:
-    """Generates AI-powered summaries of 10-K changes using Claude API"""
-    
-    def __init__(self, api_key: Optional[str] = None):
-        """
-        Initialize with Anthropic API key
-        If not provided, will load from .env file via config module
-        """
-        if api_key:
-            self.api_key = api_key
-        elif CONFIG_AVAILABLE:
-            self.api_key = check_api_key()
-        else:
-            # Fallback to environment variable
-            self.api_key = os.environ.get('ANTHROPIC_API_KEY')
-            if not self.api_key:
-                raise ValueError(
-                    "Anthropic API key required.\n"
-                    "Please create a .env file with: ANTHROPIC_API_KEY=sk-ant-your-key\n"
-                    "Or set environment variable: export ANTHROPIC_API_KEY='your-key'"
-                )
-        
-        self.model = "claude-sonnet-4-20250514"
-        self.max_tokens = 2000  # Per section summary
-    
-    def create_prompt(self, 
-                     section_name: str,
-                     company_name: str,
-                     ticker: str,
-                     old_date: str,
-                     new_date: str,
-                     removed_content: str,
-                     added_content: str) -> str:
-        """
-        Create the prompt for Claude to analyze section changes
-        
-        CRITICAL: This prompt is designed to prevent hallucination by requiring
-        explicit evidence for every claim. Financial accuracy is paramount.
-        """
-        prompt = f"""You are analyzing changes in SEC 10-K filings for investors. Your accuracy is critical.
-
-CONTEXT:
-Company: {company_name} ({ticker})
-Old Filing: 10-K filed {old_date}
-New Filing: 10-K filed {new_date}
-Section: {section_name}
+# Static instructions, sent as a cached system block ahead of the per-company diff.
+# They must not contain anything company- or filing-specific, or the cache never hits.
+# Blocks shorter than the model's minimum cacheable prompt (1,024 tokens for
+# Sonnet) are sent uncached without error - keep each one above that.
+SECTION_INSTRUCTIONS = """You are analyzing changes in SEC 10-K filings for investors. Your accuracy is critical.
 
 ⚠️ CRITICAL EVIDENCE CONSTRAINT ⚠️
 
@@ -187,165 +181,9 @@ For each bullet, ask:
 
 “Would a professional filings analyst reasonably flag this as a disclosure change?”
 
-If NO → do not include.
-
-REMOVED CONTENT (from old filing):
-{removed_content if removed_content else "[No content removed]"}
-
-ADDED CONTENT (to new filing):
-{added_content if added_content else "[No content added]"}
-
-Analysis (evidence-based only):"""
-
-        return prompt
-    
-    def analyze_section_changes(self,
-                               section_name: str,
-                               company_name: str,
-                               ticker: str,
-                               old_date: str,
-                               new_date: str,
-                               diff_result: Dict) -> Dict:
-        """
-        Analyze changes in a single section using Claude API
-        
-        Returns:
-            Dict with analysis results including summary and metadata
-        """
-        if not diff_result.get('has_meaningful_changes', False):
-            return {
-                'section': section_name,
-                'has_changes': False,
-                'summary': 'No material changes in this section.',
-                'status': 'unchanged'
-            }
-        
-        removed = diff_result.get('removed_content', '')
-        added = diff_result.get('added_content', '')
-        
-        # Truncate if content is too long (to stay within token limits)
-        max_content_length = 15000  # chars per section
-        if len(removed) > max_content_length:
-            removed = removed[:max_content_length] + "\n\n[Content truncated due to length...]"
-        if len(added) > max_content_length:
-            added = added[:max_content_length] + "\n\n[Content truncated due to length...]"
-        
-        prompt = self.create_prompt(
-            section_name=section_name,
-            company_name=company_name,
-            ticker=ticker,
-            old_date=old_date,
-            new_date=new_date,
-            removed_content=removed,
-            added_content=added
-        )
-        
-        # Call Claude API
-        try:
-            if not ANTHROPIC_AVAILABLE:
-                return {
-                    'section': section_name,
-                    'has_changes': True,
-                    'summary': '[MOCK] Anthropic package not installed. Install with: pip install anthropic\n\nThis section would contain AI-generated analysis of changes.',
-                    'status': 'mock',
-                    'tokens': {'input': 10000, 'output': 500, 'total': 10500},
-                    'cost_usd': 0.0375  # Estimated cost
-                }
-            
-            client = anthropic.Anthropic(api_key=self.api_key)
-            
-            message = client.messages.create(
-                model=self.model,
-                max_tokens=self.max_tokens,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            summary = message.content[0].text
-            
-            # Strip common preambles that Claude adds
-            preambles_to_remove = [
-                "Looking at the specific changes between the REMOVED and ADDED content, I identify these material disclosure changes:",
-                "Based on the explicit changes shown in the REMOVED vs ADDED content, here are the material disclosure changes:",
-                "Looking at the specific changes, I identify these material disclosure changes:",
-                "Based on the explicit changes shown, here are the material disclosure changes:",
-                "Here are the material disclosure changes:",
-                "The material disclosure changes are:",
-                "I identify the following material disclosure changes:",
-                "Analysis of the changes reveals:",
-                "The following material changes were identified:",
-            ]
-            
-            # Remove preambles (case-insensitive, strip whitespace)
-            summary_cleaned = summary.strip()
-            for preamble in preambles_to_remove:
-                if summary_cleaned.lower().startswith(preamble.lower()):
-                    summary_cleaned = summary_cleaned[len(preamble):].strip()
-                    break
-            
-            # Get token usage for cost tracking
-            input_tokens = message.usage.input_tokens
-            output_tokens = message.usage.output_tokens
-            
-            # Calculate cost (Claude 3.5 Sonnet pricing)
-            input_cost = input_tokens * (3.00 / 1_000_000)  # $3 per million input tokens
-            output_cost = output_tokens * (15.00 / 1_000_000)  # $15 per million output tokens
-            total_cost = input_cost + output_cost
-            
-            return {
-                'section': section_name,
-                'has_changes': True,
-                'summary': summary_cleaned.strip(),
-                'status': 'analyzed',
-                'tokens': {
-                    'input': input_tokens,
-                    'output': output_tokens,
-                    'total': input_tokens + output_tokens
-                },
-                'cost_usd': round(total_cost, 4)
-            }
-            
-        except Exception as e:
-            return {
-                'section': section_name,
-                'has_changes': True,
-                'summary': f'Error analyzing section: {str(e)}',
-                'status': 'error',
-                'error': str(e)
-            }
-    
-    def analyze_all_sections(self,
-                           company_name: str,
-                           ticker: str,
-                           old_date: str,
-                           new_date: str,
-                           diff_results: Dict[str, Dict]) -> Dict:
-        """
-        Analyze all sections in a SINGLE Claude API call to avoid repetition across sections
-        
-        Args:
-            company_name: Company name
-            ticker: Stock ticker
-            old_date: Date of older filing
-            new_date: Date of newer filing
-            diff_results: Dict mapping section names to diff analysis results
-        
-        Returns:
-            Complete analysis report with all sections
-        """
-        print(f"\n{'='*60}")
-        print(f"AI Analysis (Single Call): {company_name} ({ticker})")
-        print(f"Comparing {old_date} vs {new_date}")
-        print(f"{'='*60}\n")
-        
-        # Build comprehensive prompt with all sections
-        prompt = f"""You are analyzing changes in SEC 10-K filings for investors. Your accuracy is critical.
+If NO → do not include."""
 
-CONTEXT:
-Company: {company_name} ({ticker})
-Old Filing: 10-K filed {old_date}
-New Filing: 10-K filed {new_date}
+ALL_SECTIONS_INSTRUCTIONS = """You are analyzing changes in SEC 10-K filings for investors. Your accuracy is critical.
 
 ⚠️ CRITICAL LEGAL REQUIREMENT - READ FIRST ⚠️
 Under no circumstances use information or data outside of these documents. You cannot use any prior knowledge about this company, its products, its industry, or any other contextual information. For the purposes of this analysis, treat yourself as having ZERO prior knowledge. If it's not in the REMOVED or ADDED content below, it does not exist.
@@ -399,25 +237,953 @@ FORBIDDEN BEHAVIORS:
 ❌ Personnel changes: unless C-suite or board level
 ❌ Background context: restating what the company does
 
+OUTPUT FORMAT (CRITICAL):
+
+Respond with a JSON object where each key is a section name and each value is the analysis:
+
+{
+  "Item 1": "• Bullet point 1\\n• Bullet point 2",
+  "Item 1A": "No material disclosure changes identified in this section.",
+  "Item 7": "• Bullet point 1",
+  "Item 8": "No material disclosure changes identified in this section."
+}
+
+Rules:
+- Maximum 5 bullet points per section
+- Each bullet must pass the Bloomberg test
+- Use "No material disclosure changes identified in this section." if nothing material
+- Keep under 300 words per section
+- NO PREAMBLE - just bullet points starting with •
+- NO REPETITION across sections - each change reported ONCE in most relevant section
+
+Respond ONLY with the JSON object, nothing else."""
+
+
+# Reduce step of map-reduce summarization (short, so not worth a cache marker)
+REDUCE_INSTRUCTIONS = """You are merging partial analyses of ONE section of an SEC 10-K filing. The section's changes were too long for a single request, so each part of the REMOVED vs ADDED content was analyzed separately. Combine the partial bullet lists into the final analysis for the section.
+
+RULES (MANDATORY):
+- Use ONLY the bullet points provided. Do not add, infer, or extrapolate facts.
+- Merge bullets that describe the same change into one.
+- Keep the most significant changes: maximum 5 bullet points, most significant first.
+- Keep total output under 300 words.
+- If none of the partial analyses reports a material change, respond ONLY with:
+"No material disclosure changes identified in this section."
+
+NO PREAMBLE - bullet points starting with • only"""
+
+
+def cached_system(instructions: str) -> list:
+    """System prompt as a single block marked for Anthropic prompt caching"""
+    return [{
+        "type": "text",
+        "text": instructions,
+        "cache_control": {"type": "ephemeral"}
+    }]
+
+
+def usage_tokens(usage) -> Dict[str, int]:
+    """
+    Token counts from an API usage object, including prompt cache traffic
+    (input_tokens excludes tokens written to or read from the cache)
+    """
+    tokens = {
+        'input': usage.input_tokens,
+        'output': usage.output_tokens,
+        'cache_creation': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+        'cache_read': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+    }
+    tokens['total'] = sum(tokens.values())
+    return tokens
+
+
+def calculate_cost(model: str, tokens: Dict[str, int]) -> float:
+    """USD cost of one call from its usage_tokens()"""
+    pricing = MODEL_PRICING.get(model, MODEL_PRICING['claude-sonnet-4-20250514'])
+    input_rate = pricing['input'] / 1_000_000
+    output_rate = pricing['output'] / 1_000_000
+    return (
+        tokens['input'] * input_rate
+        + tokens['cache_creation'] * input_rate * CACHE_WRITE_MULTIPLIER
+        + tokens['cache_read'] * input_rate * CACHE_READ_MULTIPLIER
+        + tokens['output'] * output_rate
+    )
+
+
+def token_allocation(budgets: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Allocation record of budget_sections output (without the content)"""
+    return {
+        name: {key: budget[key] for key in ('tokens_needed', 'tokens_allocated', 'significance')}
+        for name, budget in budgets.items()
+    }
+
+
+def level_usage(results: List[Dict]) -> Dict:
+    """Calls, cost and tokens of one map-reduce level"""
+    return {
+        'calls': len(results),
+        'cost_usd': round(sum(result.get('cost_usd', 0.0) for result in results), 4),
+        'cached_cost_usd': round(sum(result.get('cached_cost_usd', 0.0) for result in results), 4),
+        'tokens': sum(result.get('tokens', {}).get('total', 0) for result in results if result.get('cost_usd'))
+    }
+
+
+_BULLET_PREFIXES = ('•', '-', '*')
+
+
+def deduplicate_sections(sections: List[Dict], threshold: float = 0.6) -> int:
+    """
+    Drop bullets that repeat a fact already reported in an earlier section
+    
+    Cheap lexical check, no API call: two bullets are the same fact when
+    most of the shorter one's word pairs appear in the other. The first
+    occurrence (in Item 1, 1A, 7, 8 order) is kept. Sections are edited
+    in place.
+    
+    Returns:
+        Number of bullets removed
+    """
+    seen = []  # Shingle sets of bullets kept so far, from earlier sections
+    removed = 0
+    
+    for section in sections:
+        if section.get('status') != 'analyzed':
+            continue
+        
+        kept_lines = []
+        section_bullets = []
+        had_bullets = False
+        for line in section['summary'].split('\n'):
+            if not line.strip().startswith(_BULLET_PREFIXES):
+                kept_lines.append(line)
+                continue
+            had_bullets = True
+            bullet = shingles(line, size=2)
+            if any(bullet and other and len(bullet & other) / min(len(bullet), len(other)) >= threshold
+                   for other in seen):
+                removed += 1
+                continue
+            kept_lines.append(line)
+            section_bullets.append(bullet)
+        seen.extend(section_bullets)
+        
+        if had_bullets and not section_bullets:
+            section['summary'] = NO_CHANGES
+        else:
+            section['summary'] = '\n'.join(kept_lines).strip()
+        section['has_changes'] = section['summary'] != NO_CHANGES
+    
+    return removed
+
+
+# Connection pool shared by every job in the process. Each new client costs
+# a fresh connection pool (DNS + TCP + TLS handshake on the first request).
+MAX_CONNECTIONS = int(os.environ.get('ANTHROPIC_MAX_CONNECTIONS', '20'))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('ANTHROPIC_MAX_KEEPALIVE', '10'))
+KEEPALIVE_EXPIRY_SECONDS = float(os.environ.get('ANTHROPIC_KEEPALIVE_EXPIRY', '120'))
+
+_clients = {}
+_async_clients = {}  # api_key -> client, all used on _async_loop
+_clients_lock = threading.Lock()
+_async_loop = None
+
+
+def _connection_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+    )
+
+
+def get_client(api_key: str):
+    """Process-wide Anthropic client for this API key (thread-safe)"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = anthropic.Anthropic(
+                api_key=api_key,
+                http_client=anthropic.DefaultHttpxClient(limits=_connection_limits())
+            )
+            _clients[api_key] = client
+        return client
+
+
+def run_async(coroutine):
+    """
+    Run a coroutine on the process-wide AI event loop and wait for its result
+    
+    httpx async connections belong to the loop that opened them. asyncio.run
+    makes a new loop per call, which would mean a new client and pool per
+    report; one long-lived loop on a daemon thread keeps them for the process.
+    Call from synchronous code only (never from a coroutine on that loop).
+    """
+    global _async_loop
+    with _clients_lock:
+        if _async_loop is None:
+            _async_loop = asyncio.new_event_loop()
+            threading.Thread(target=_async_loop.run_forever, name='ai-event-loop', daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _async_loop).result()
+
+
+def get_async_client(api_key: str):
+    """Process-wide AsyncAnthropic client for this API key (use within run_async)"""
+    with _clients_lock:
+        client = _async_clients.get(api_key)
+        if client is None:
+            client = anthropic.AsyncAnthropic(
+                api_key=api_key,
+                http_client=anthropic.DefaultAsyncHttpxClient(limits=_connection_limits())
+            )
+            _async_clients[api_key] = client
+        return client
+
+
+class AIAnalyzer:
+    """Generates AI-powered summaries of 10-K changes using Claude API"""
+    
+    def __init__(self, api_key: Optional[str] = None, response_cache=None):
+        """
+        Initialize with Anthropic API key
+        If not provided, will load from .env file via config module
+        
+        Args:
+            api_key: Anthropic API key
+            response_cache: LocalCache for parsed responses, keyed by the exact
+                            request (shared by every worker using the same cache dir)
+        """
+        if api_key:
+            self.api_key = api_key
+        elif CONFIG_AVAILABLE:
+            self.api_key = check_api_key()
+        else:
+            # Fallback to environment variable
+            self.api_key = os.environ.get('ANTHROPIC_API_KEY')
+            if not self.api_key:
+                raise ValueError(
+                    "Anthropic API key required.\n"
+                    "Please create a .env file with: ANTHROPIC_API_KEY=sk-ant-your-key\n"
+                    "Or set environment variable: export ANTHROPIC_API_KEY='your-key'"
+                )
+        
+        self.model = os.environ.get('AI_LARGE_MODEL', "claude-sonnet-4-20250514")
+        self.max_tokens = 2000  # Per section summary
+        
+        # Model routing: diffs that are small (by input tokens) or of low total
+        # significance go to the cheaper, faster model. Oversized sections and
+        # map-reduce calls always use the large model. AI_SMALL_MODEL='' disables.
+        # Routed calls get no prompt-cache reads with the default Haiku model:
+        # Haiku only caches prefixes of 2048+ tokens and the cached system
+        # blocks here are about 1.1-1.25k tokens (Sonnet's minimum is 1024),
+        # so the cache_control marker is ignored and each call pays full input.
+        self.small_model = os.environ.get('AI_SMALL_MODEL', 'claude-3-5-haiku-20241022')
+        self.route_max_tokens = int(os.environ.get('AI_ROUTE_MAX_TOKENS', '4000'))
+        self.route_max_significance = float(os.environ.get('AI_ROUTE_MAX_SIGNIFICANCE', '10'))
+        self.response_cache = response_cache
+        self.max_concurrency = AI_MAX_CONCURRENCY
+        
+        # Sections over their share of the input budget are split into parts
+        # of map_part_tokens, summarized concurrently, then merged (map-reduce)
+        # instead of being trimmed. Parts beyond max_map_parts are trimmed.
+        self.map_reduce = os.environ.get('AI_MAP_REDUCE', '1') != '0'
+        self.map_part_tokens = int(os.environ.get('AI_MAP_PART_TOKENS', '24000'))
+        self.max_map_parts = 8
+        
+        # Input tokens for diff content per report, split across sections by significance
+        self.input_token_budget = int(os.environ.get('AI_INPUT_TOKEN_BUDGET', '48000'))
+        self.token_count_threshold = 0.8  # Share of the budget above which the API count is used
+        self.token_counter = TokenCounter(
+            client=get_client(self.api_key) if ANTHROPIC_AVAILABLE else None,
+            model=self.model
+        )
+    
+    def response_key(self, system: str, prompt: str, max_tokens: int, model: Optional[str] = None) -> str:
+        """Content address of a request: model, prompt version and exact payload"""
+        return digest([model or self.model, PROMPT_VERSION, system, prompt, max_tokens])
+    
+    def routing_config(self) -> Dict:
+        """Settings that decide routing (part of any cache key covering routed results)"""
+        return {
+            'large': self.model,
+            'small': self.small_model,
+            'max_tokens': self.route_max_tokens,
+            'max_significance': self.route_max_significance
+        }
+    
+    def route(self, budgets: Dict[str, Dict]) -> Dict:
+        """
+        Pick the model for a request covering these budget_sections entries
+        
+        Returns:
+            Routing decision: {'model', 'reason', 'input_tokens', 'significance'}
+        """
+        tokens = sum(budget['tokens_allocated'] for budget in budgets.values())
+        significance = sum(budget['significance'] for budget in budgets.values())
+        
+        if not self.small_model:
+            model, reason = self.model, 'routing disabled'
+        elif any(budget['oversized'] for budget in budgets.values()):
+            model, reason = self.model, 'diff exceeds input budget'
+        elif tokens <= self.route_max_tokens:
+            model, reason = self.small_model, f'small diff ({tokens:,} <= {self.route_max_tokens:,} tokens)'
+        elif significance <= self.route_max_significance:
+            model, reason = self.small_model, f'low significance ({significance:.1f} <= {self.route_max_significance:g})'
+        else:
+            model, reason = self.model, f'large diff ({tokens:,} tokens, significance {significance:.1f})'
+        
+        print(f"Model routing: {model} - {reason}")
+        return {
+            'model': model,
+            'reason': reason,
+            'input_tokens': tokens,
+            'significance': round(significance, 2)
+        }
+    
+    def get_cached_response(self, key: str) -> Optional[Dict]:
+        """Parsed response and usage from an identical earlier request (None on miss)"""
+        if self.response_cache is None:
+            return None
+        cached = self.response_cache.get_artifact('llm-response', key)
+        if cached is not None:
+            print(f"    ✓ Reused cached AI response (saved ${cached['cost_usd']:.4f})")
+        return cached
+    
+    def save_response(self, key: str, response: Dict):
+        if self.response_cache is not None:
+            self.response_cache.save_artifact('llm-response', key, response)
+    
+    def format_numeric_changes(self, diff_result: Dict, max_records: int = 200) -> str:
+        """
+        Render a section's changed table figures as "label: old → new" lines
+        These replace the raw table rows, which DiffAnalyzer has already removed
+        """
+        records = diff_result.get('numeric_changes') or []
+        lines = [format_record(record) for record in records[:max_records]]
+        if len(records) > max_records:
+            lines.append(f"[... {len(records) - max_records} more changed figures omitted ...]")
+        return '\n'.join(lines)
+    
+    def format_numeric_block(self, numeric_changes: str) -> str:
+        """Prompt block for numeric changes (empty if there are none)"""
+        if not numeric_changes:
+            return ''
+        return f"""
+NUMERIC CHANGES (table figures, old filing → new filing):
+{numeric_changes}
 """
+    
+    def create_prompt(self, 
+                     section_name: str,
+                     company_name: str,
+                     ticker: str,
+                     old_date: str,
+                     new_date: str,
+                     removed_content: str,
+                     added_content: str,
+                     numeric_changes: str = '') -> str:
+        """
+        Create the per-section user message for Claude to analyze section changes
+        
+        The instructions themselves are SECTION_INSTRUCTIONS, sent as a cached
+        system block. CRITICAL: they are designed to prevent hallucination by
+        requiring explicit evidence for every claim. Financial accuracy is paramount.
+        """
+        prompt = f"""CONTEXT:
+Company: {company_name} ({ticker})
+Old Filing: 10-K filed {old_date}
+New Filing: 10-K filed {new_date}
+Section: {section_name}
+
+REMOVED CONTENT (from old filing):
+{removed_content if removed_content else "[No content removed]"}
+
+ADDED CONTENT (to new filing):
+{added_content if added_content else "[No content added]"}
+{self.format_numeric_block(numeric_changes)}
+Analysis (evidence-based only):"""
+
+        return prompt
+    
+    def budget_sections(self, diff_results: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Fit every changed section's content into the report's input token budget
+        
+        Each section's need is measured in tokens (numeric changes included),
+        estimated locally and calibrated by a single API count when the
+        report is near the budget; the budget is then allocated in proportion to the section's change
+        significance, never giving a section more than it needs. Sections
+        over their allocation keep their most significant hunks; they are
+        flagged 'oversized' and carry their full content for map_reduce.
+        
+        Returns:
+            {section: {'removed', 'added', 'tokens_needed', 'tokens_allocated',
+                       'significance', 'oversized', 'full_removed', 'full_added'}}
+            for sections with meaningful changes
+        """
+        contents = {}
+        for section_name in SECTION_NAMES:
+            diff_result = diff_results.get(section_name, {})
+            if not diff_result.get('has_meaningful_changes', False):
+                continue
+            # Start from everything the diff found, not DiffAnalyzer's own budgeted cut
+            full_content = diff_result.get('full_content') or diff_result
+            contents[section_name] = (full_content.get('removed_content', ''), full_content.get('added_content', ''))
+        
+        # Exact counts only matter near the budget: then one API count for
+        # the whole report calibrates the estimates (no per-section round-trips)
+        texts = {name: f"{removed}\n{added}" for name, (removed, added) in contents.items()}
+        estimated = sum(self.token_counter.estimate(text) for text in texts.values())
+        if estimated >= self.token_count_threshold * self.input_token_budget:
+            self.token_counter.calibrate('\n'.join(texts.values()))
+        
+        needs = {}
+        for section_name, (removed, added) in contents.items():
+            text_tokens = self.token_counter.estimate(texts[section_name])
+            numeric_tokens = self.token_counter.estimate(self.format_numeric_changes(diff_results[section_name]))
+            needs[section_name] = (removed, added, text_tokens, numeric_tokens)
+        
+        demands = {name: text + numeric for name, (_, _, text, numeric) in needs.items()}
+        # Floor of 1 so a low-scoring section still gets a share
+        weights = {name: max(diff_results[name].get('significance', 0.0), 1.0) for name in needs}
+        allocation = allocate(demands, weights, self.input_token_budget)
+        
+        budgets = {}
+        print(f"Token budget: {self.input_token_budget:,} input tokens for diff content")
+        for section_name, (removed, added, text_tokens, numeric_tokens) in needs.items():
+            full_removed, full_added = removed, added
+            oversized = allocation[section_name] < demands[section_name]
+            if oversized:
+                # Convert the token allocation to characters at this section's own ratio
+                chars_per_token = (len(removed) + len(added) + 1) / max(text_tokens, 1)
+                char_budget = int(max(allocation[section_name] - numeric_tokens, 0) * chars_per_token)
+                removed_share = len(removed) / max(len(removed) + len(added), 1)
+                removed, added = (
+                    fit_to_budget(removed, int(char_budget * removed_share), reference=added),
+                    fit_to_budget(added, int(char_budget * (1 - removed_share)), reference=removed)
+                )
+            
+            budgets[section_name] = {
+                'removed': removed,
+                'added': added,
+                'tokens_needed': demands[section_name],
+                'tokens_allocated': allocation[section_name],
+                'significance': weights[section_name],
+                'oversized': oversized,
+                'full_removed': full_removed,
+                'full_added': full_added
+            }
+            print(f"  {section_name}: significance {weights[section_name]:.1f}, "
+                  f"needs {demands[section_name]:,} tokens, allocated {allocation[section_name]:,}"
+                  + (" (oversized)" if oversized else ""))
+        
+        return budgets
+    
+    def _prepare_section(self,
+                         section_name: str,
+                         company_name: str,
+                         ticker: str,
+                         old_date: str,
+                         new_date: str,
+                         diff_result: Dict,
+                         budget: Optional[Dict] = None,
+                         model: Optional[str] = None) -> Tuple[Optional[Dict], Dict, str]:
+        """
+        Build the API request for one section
+        
+        Args:
+            budget: This section's entry from budget_sections (None budgets
+                    the section on its own, with the whole input budget)
+            model: Model to use (default: the large model)
+        
+        Returns:
+            (result, request, cache_key). result is set when no API call is
+            needed: unchanged section, cached response, or mock mode.
+        """
+        if not diff_result.get('has_meaningful_changes', False):
+            return {
+                'section': section_name,
+                'has_changes': False,
+                'summary': 'No material changes in this section.',
+                'status': 'unchanged'
+            }, {}, ''
+        
+        if budget is None:
+            budget = self.budget_sections({section_name: diff_result})[section_name]
+        removed, added = budget['removed'], budget['added']
+        
+        prompt = self.create_prompt(
+            section_name=section_name,
+            company_name=company_name,
+            ticker=ticker,
+            old_date=old_date,
+            new_date=new_date,
+            removed_content=removed,
+            added_content=added,
+            numeric_changes=self.format_numeric_changes(diff_result)
+        )
+        request = {
+            'model': model or self.model,
+            'max_tokens': self.max_tokens,
+            'system': cached_system(SECTION_INSTRUCTIONS),
+            'messages': [{"role": "user", "content": prompt}]
+        }
+        
+        cache_key = self.response_key(SECTION_INSTRUCTIONS, prompt, self.max_tokens, request['model'])
+        cached = self.get_cached_response(cache_key)
+        if cached is not None:
+            return {
+                'section': section_name,
+                'has_changes': True,
+                'summary': cached['summary'],
+                'status': 'analyzed',
+                'model': request['model'],
+                'tokens': cached['tokens'],
+                'cost_usd': 0.0,  # Nothing spent this time
+                'cached_cost_usd': cached['cost_usd']
+            }, request, cache_key
+        
+        if not ANTHROPIC_AVAILABLE:
+            return {
+                'section': section_name,
+                'has_changes': True,
+                'summary': '[MOCK] Anthropic package not installed. Install with: pip install anthropic\n\nThis section would contain AI-generated analysis of changes.',
+                'status': 'mock',
+                'tokens': {'input': 10000, 'output': 500, 'total': 10500},
+                'cost_usd': 0.0375  # Estimated cost
+            }, request, cache_key
+        
+        return None, request, cache_key
+    
+    def _section_result(self, section_name: str, message, latency: float, cache_key: str, model: str) -> Dict:
+        """Clean up one section's response, price it (at the model's rates) and cache it"""
+        summary = message.content[0].text
+        
+        # Strip common preambles that Claude adds
+        preambles_to_remove = [
+            "Looking at the specific changes between the REMOVED and ADDED content, I identify these material disclosure changes:",
+            "Based on the explicit changes shown in the REMOVED vs ADDED content, here are the material disclosure changes:",
+            "Looking at the specific changes, I identify these material disclosure changes:",
+            "Based on the explicit changes shown, here are the material disclosure changes:",
+            "Here are the material disclosure changes:",
+            "The material disclosure changes are:",
+            "I identify the following material disclosure changes:",
+            "Analysis of the changes reveals:",
+            "The following material changes were identified:",
+        ]
+        
+        # Remove preambles (case-insensitive, strip whitespace)
+        summary_cleaned = summary.strip()
+        for preamble in preambles_to_remove:
+            if summary_cleaned.lower().startswith(preamble.lower()):
+                summary_cleaned = summary_cleaned[len(preamble):].strip()
+                break
+        
+        # Get token usage for cost tracking (including prompt cache hits)
+        tokens = usage_tokens(message.usage)
+        total_cost = calculate_cost(model, tokens)
+        
+        self.save_response(cache_key, {
+            'summary': summary_cleaned.strip(),
+            'tokens': tokens,
+            'cost_usd': round(total_cost, 4)
+        })
+        
+        return {
+            'section': section_name,
+            'has_changes': True,
+            'summary': summary_cleaned.strip(),
+            'status': 'analyzed',
+            'model': model,
+            'tokens': tokens,
+            'cost_usd': round(total_cost, 4),
+            'cached_cost_usd': 0.0,
+            'latency_seconds': round(latency, 2)
+        }
+    
+    def _section_error(self, section_name: str, error: Exception) -> Dict:
+        return {
+            'section': section_name,
+            'has_changes': True,
+            'summary': f'Error analyzing section: {str(error)}',
+            'status': 'error',
+            'error': str(error)
+        }
+    
+    def analyze_section_changes(self,
+                               section_name: str,
+                               company_name: str,
+                               ticker: str,
+                               old_date: str,
+                               new_date: str,
+                               diff_result: Dict) -> Dict:
+        """
+        Analyze changes in a single section using Claude API
+        
+        Returns:
+            Dict with analysis results including summary and metadata
+        """
+        budget, routing = None, None
+        if diff_result.get('has_meaningful_changes', False):
+            budget = self.budget_sections({section_name: diff_result})[section_name]
+            routing = self.route({section_name: budget})
+        
+        result, request, cache_key = self._prepare_section(
+            section_name, company_name, ticker, old_date, new_date, diff_result,
+            budget, routing['model'] if routing else None
+        )
+        if result is None:
+            # Call Claude API
+            try:
+                client = get_client(self.api_key)
+                started = time.perf_counter()
+                message = client.messages.create(**request)
+                result = self._section_result(section_name, message, time.perf_counter() - started,
+                                              cache_key, request['model'])
+            except Exception as e:
+                result = self._section_error(section_name, e)
+        
+        if routing:
+            result['routing'] = routing
+        return result
+    
+    async def analyze_section_changes_async(self,
+                                            section_name: str,
+                                            company_name: str,
+                                            ticker: str,
+                                            old_date: str,
+                                            new_date: str,
+                                            diff_result: Dict,
+                                            semaphore=None,
+                                            budget: Optional[Dict] = None,
+                                            model: Optional[str] = None) -> Dict:
+        """
+        analyze_section_changes on the shared AsyncAnthropic client
+        
+        Args:
+            semaphore: asyncio.Semaphore capping concurrent API calls (optional)
+            budget: This section's entry from budget_sections (optional)
+            model: Model to use (default: the large model; routing is the caller's)
+        """
+        result, request, cache_key = self._prepare_section(
+            section_name, company_name, ticker, old_date, new_date, diff_result, budget, model
+        )
+        if result is not None:
+            return result
+        
+        try:
+            client = get_async_client(self.api_key)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(1)
+            async with semaphore:
+                started = time.perf_counter()
+                message = await client.messages.create(**request)
+                latency = time.perf_counter() - started
+            return self._section_result(section_name, message, latency, cache_key, request['model'])
+        except Exception as e:
+            return self._section_error(section_name, e)
+    
+    def _map_parts(self, budget: Dict) -> List[Tuple[str, str]]:
+        """
+        Split a section's full content into (removed, added) parts of about map_part_tokens
+        
+        Changed lines of both sides are taken in order of their relative
+        position within their side and packed into parts by cumulative size.
+        A line longer than the space left in a part is split across parts at
+        word boundaries rather than trimmed. Only content beyond
+        max_map_parts parts is cut, by significance, before packing.
+        """
+        part_chars = int(self.map_part_tokens * self.token_counter.chars_per_token)
+        removed, added = budget['full_removed'], budget['full_added']
+        
+        # Leave some slack for packing, so the cut content fits in max_map_parts
+        total_chars = int(part_chars * self.max_map_parts * 0.9)
+        if len(removed) + len(added) > total_chars:
+            removed_share = len(removed) / (len(removed) + len(added))
+            removed, added = (
+                fit_to_budget(removed, int(total_chars * removed_share), reference=added),
+                fit_to_budget(added, int(total_chars * (1 - removed_share)), reference=removed)
+            )
+        
+        lines = []
+        for side, text in enumerate((removed, added)):
+            side_lines = [line for line in text.split('\n') if line.strip()]
+            lines.extend((i / len(side_lines), side, line) for i, line in enumerate(side_lines))
+        lines.sort(key=lambda entry: (entry[0], entry[1]))
+        
+        parts = []
+        current = ([], [])
+        size = 0
+        for _, side, line in lines:
+            while line:
+                space = part_chars - size
+                if len(line) + 1 <= space:
+                    current[side].append(line)
+                    size += len(line) + 1
+                    line = ''
+                    continue
+                if len(line) + 1 > part_chars and space > part_chars // 10:
+                    # Longer than a whole part: fill this part with its start
+                    cut = line.rfind(' ', 0, space - 1)
+                    cut = cut if cut > 0 else space - 1
+                    current[side].append(line[:cut])
+                    line = line[cut:].lstrip()
+                parts.append(current)
+                current = ([], [])
+                size = 0
+        if size:
+            parts.append(current)
+        
+        if len(parts) > self.max_map_parts:
+            print(f"    ⚠ {len(parts) - self.max_map_parts} map parts over the limit of {self.max_map_parts} not analyzed")
+            parts = parts[:self.max_map_parts]
+        
+        return [('\n'.join(part_removed), '\n'.join(part_added)) for part_removed, part_added in parts]
+    
+    async def _map_reduce_section_async(self,
+                                        section_name: str,
+                                        company_name: str,
+                                        ticker: str,
+                                        old_date: str,
+                                        new_date: str,
+                                        diff_result: Dict,
+                                        budget: Dict,
+                                        semaphore) -> Dict:
+        """
+        Summarize an oversized section hierarchically
+        
+        Map: each part is analyzed with the normal section prompt, concurrently
+        (bounded by the shared semaphore). Reduce: one call merges the partial
+        bullet lists. Cost and tokens are recorded per level.
+        """
+        parts = self._map_parts(budget)
+        print(f"    {section_name}: map-reduce over {len(parts)} parts")
+        
+        part_results = await asyncio.gather(*(
+            self.analyze_section_changes_async(
+                f"{section_name} (part {k + 1} of {len(parts)})",
+                company_name, ticker, old_date, new_date,
+                # Numeric changes go with the first part only
+                {**diff_result, 'numeric_changes': diff_result.get('numeric_changes') if k == 0 else []},
+                semaphore=semaphore,
+                budget={'removed': removed, 'added': added}
+            )
+            for k, (removed, added) in enumerate(parts)
+        ))
+        
+        analyzed = [result for result in part_results if result['status'] == 'analyzed']
+        findings = [result['summary'] for result in analyzed if result['summary'].strip() != NO_CHANGES]
+        levels = {'map': level_usage(part_results), 'reduce': level_usage([])}
+        
+        if not analyzed:
+            summary, status = f"Error: all {len(parts)} parts failed", 'error'
+        elif not findings:
+            summary, status = NO_CHANGES, 'analyzed'
+        elif len(findings) == 1:
+            summary, status = findings[0], 'analyzed'
+        else:
+            partials = '\n\n'.join(f"PART {k + 1} OF {len(findings)}:\n{finding}" for k, finding in enumerate(findings))
+            prompt = f"""CONTEXT:
+Company: {company_name} ({ticker})
+Old Filing: 10-K filed {old_date}
+New Filing: 10-K filed {new_date}
+Section: {section_name}
+
+PARTIAL ANALYSES:
+{partials}
+
+Final analysis (bullet points only):"""
+            
+            cache_key = self.response_key(REDUCE_INSTRUCTIONS, prompt, self.max_tokens)
+            cached = self.get_cached_response(cache_key)
+            if cached is not None:
+                reduced = {'summary': cached['summary'], 'status': 'analyzed', 'tokens': cached['tokens'],
+                           'cost_usd': 0.0, 'cached_cost_usd': cached['cost_usd']}
+            else:
+                try:
+                    client = get_async_client(self.api_key)
+                    async with semaphore:
+                        started = time.perf_counter()
+                        message = await client.messages.create(
+                            model=self.model,
+                            max_tokens=self.max_tokens,
+                            system=REDUCE_INSTRUCTIONS,
+                            messages=[{"role": "user", "content": prompt}]
+                        )
+                        latency = time.perf_counter() - started
+                    reduced = self._section_result(section_name, message, latency, cache_key, self.model)
+                except Exception as e:
+                    reduced = self._section_error(section_name, e)
+            
+            levels['reduce'] = level_usage([reduced])
+            summary, status = reduced['summary'], reduced['status']
+        
+        return {
+            'section': section_name,
+            'has_changes': status == 'analyzed' and summary != NO_CHANGES,
+            'summary': summary,
+            'status': status,
+            'tokens': {'total': levels['map']['tokens'] + levels['reduce']['tokens']},
+            'cost_usd': round(levels['map']['cost_usd'] + levels['reduce']['cost_usd'], 4),
+            'cached_cost_usd': round(levels['map']['cached_cost_usd'] + levels['reduce']['cached_cost_usd'], 4),
+            'map_reduce': {
+                'parts': len(parts),
+                'failed_parts': len(parts) - len(analyzed),
+                'levels': levels
+            }
+        }
+    
+    def _uses_map_reduce(self, budget: Optional[Dict]) -> bool:
+        return bool(budget and budget['oversized'] and self.map_reduce and ANTHROPIC_AVAILABLE)
+    
+    def map_reduce_sections(self, section_names: List[str], company_name: str, ticker: str,
+                            old_date: str, new_date: str, diff_results: Dict[str, Dict],
+                            budgets: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Map-reduce several oversized sections at once, sharing one concurrency limit"""
+        async def run_all():
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            return await asyncio.gather(*(
+                self._map_reduce_section_async(
+                    name, company_name, ticker, old_date, new_date,
+                    diff_results[name], budgets[name], semaphore
+                )
+                for name in section_names
+            ))
+        
+        return dict(zip(section_names, run_async(run_all())))
+    
+    def analyze_sections_concurrently(self,
+                                      company_name: str,
+                                      ticker: str,
+                                      old_date: str,
+                                      new_date: str,
+                                      diff_results: Dict[str, Dict],
+                                      on_section: Optional[Callable[[Dict], None]] = None,
+                                      max_concurrency: Optional[int] = None) -> Dict:
+        """
+        Analyze each section in its own API call, all at once
+        
+        Alternative to analyze_all_sections: latency is that of the slowest
+        section rather than all four summaries in sequence, and a malformed
+        reply only loses its own section. Facts repeated across sections are
+        then removed by deduplicate_sections (the single call avoids them in
+        the prompt instead). Oversized sections are summarized by map-reduce.
+        
+        Returns:
+            Same shape as analyze_all_sections, plus 'duplicates_removed'
+        """
+        max_concurrency = max_concurrency or self.max_concurrency
+        print(f"\n{'='*60}")
+        print(f"AI Analysis (Per Section): {company_name} ({ticker})")
+        print(f"Comparing {old_date} vs {new_date}")
+        print(f"{'='*60}\n")
+        
+        # One input budget for the report, shared across the per-section calls
+        budgets = self.budget_sections(diff_results)
+        # Each call is routed on its own section's size and significance
+        routing = {name: self.route({name: budget}) for name, budget in budgets.items()
+                   if not self._uses_map_reduce(budget)}
+        
+        async def run_all():
+            semaphore = asyncio.Semaphore(max_concurrency)
+            
+            async def run_one(section_name):
+                if self._uses_map_reduce(budgets.get(section_name)):
+                    analysis = await self._map_reduce_section_async(
+                        section_name, company_name, ticker, str(old_date), str(new_date),
+                        diff_results[section_name], budgets[section_name], semaphore
+                    )
+                else:
+                    model = routing[section_name]['model'] if section_name in routing else None
+                    analysis = await self.analyze_section_changes_async(
+                        section_name, company_name, ticker, str(old_date), str(new_date),
+                        diff_results.get(section_name, {}), semaphore=semaphore,
+                        budget=budgets.get(section_name), model=model
+                    )
+                print(f"    ✓ {section_name}: {analysis['status']}")
+                if on_section:
+                    on_section(analysis)
+                return analysis
+            
+            return await asyncio.gather(*(run_one(name) for name in SECTION_NAMES))
+        
+        started = time.perf_counter()
+        sections = run_async(run_all())
+        latency = time.perf_counter() - started
+        
+        duplicates = deduplicate_sections(sections)
+        
+        total_cost = sum(section.get('cost_usd', 0.0) for section in sections)
+        total_tokens = sum(section['tokens']['total'] for section in sections if section.get('cost_usd'))
+        
+        print(f"✓ Per-section calls complete")
+        print(f"Total cost: ${total_cost:.4f} (£{total_cost * USD_TO_GBP:.4f})")
+        print(f"Total tokens: {total_tokens:,}")
+        print(f"Wall-clock latency: {latency:.1f}s")
+        print(f"Repeated facts removed: {duplicates}")
+        
+        return {
+            'company_name': company_name,
+            'ticker': ticker,
+            'old_filing_date': str(old_date),
+            'new_filing_date': str(new_date),
+            'sections': sections,
+            'total_cost_usd': round(total_cost, 4),
+            'total_cost_gbp': round(total_cost * USD_TO_GBP, 4),
+            'total_tokens': total_tokens,
+            'cached_cost_usd': round(sum(section.get('cached_cost_usd', 0.0) for section in sections), 4),
+            'latency_seconds': round(latency, 2),
+            'duplicates_removed': duplicates,
+            'token_allocation': token_allocation(budgets),
+            'map_reduce': {section['section']: section['map_reduce'] for section in sections if 'map_reduce' in section},
+            'routing': routing,
+            'generated_at': None
+        }
+    
+    def build_all_sections_request(self,
+                                   company_name: str,
+                                   ticker: str,
+                                   old_date: str,
+                                   new_date: str,
+                                   diff_results: Dict[str, Dict],
+                                   map_reduce: bool = True) -> Dict:
+        """
+        Build the single-call request for a filing pair (shared by the
+        interactive and batch paths)
+        
+        Args:
+            map_reduce: Leave oversized sections out for separate map-reduce
+                        calls (False = trim them into the single call)
+        
+        Returns:
+            {'request', 'cache_key', 'budgets', 'separate', 'routing'}
+        """
+        # Static instructions go in the cached system block; this is the per-company part
+        prompt = f"""CONTEXT:
+Company: {company_name} ({ticker})
+Old Filing: 10-K filed {old_date}
+New Filing: 10-K filed {new_date}
+
+"""
+        
+        # Share the input token budget across sections by significance
+        budgets = self.budget_sections(diff_results)
+        # Sections too big for their share are summarized separately (map-reduce)
+        separate = [name for name in SECTION_NAMES if map_reduce and self._uses_map_reduce(budgets.get(name))]
         
         # Add each section's diff content
         for section_name in ['Item 1', 'Item 1A', 'Item 7', 'Item 8']:
             diff_result = diff_results.get(section_name, {})
             
-            if not diff_result.get('has_meaningful_changes', False):
+            if section_name not in budgets:
                 prompt += f"\n{'='*80}\n{section_name}: NO MEANINGFUL CHANGES\n{'='*80}\n\n"
                 continue
             
-            removed = diff_result.get('removed_content', '')
-            added = diff_result.get('added_content', '')
+            if section_name in separate:
+                prompt += f"\n{'='*80}\n{section_name}: ANALYZED SEPARATELY (answer with an empty string)\n{'='*80}\n\n"
+                continue
             
-            # Truncate if too long
-            max_content_length = 15000
-            if len(removed) > max_content_length:
-                removed = removed[:max_content_length] + "\n\n[Content truncated...]"
-            if len(added) > max_content_length:
-                added = added[:max_content_length] + "\n\n[Content truncated...]"
+            removed = budgets[section_name]['removed']
+            added = budgets[section_name]['added']
             
             prompt += f"""
 {'='*80}
@@ -429,30 +1195,128 @@ REMOVED CONTENT (from old filing):
 
 ADDED CONTENT (to new filing):
 {added if added else "[No content added]"}
-
+{self.format_numeric_block(self.format_numeric_changes(diff_result))}
 """
         
         prompt += """
-OUTPUT FORMAT (CRITICAL):
-
-Respond with a JSON object where each key is a section name and each value is the analysis:
-
-{
-  "Item 1": "• Bullet point 1\\n• Bullet point 2",
-  "Item 1A": "No material disclosure changes identified in this section.",
-  "Item 7": "• Bullet point 1",
-  "Item 8": "No material disclosure changes identified in this section."
-}
-
-Rules:
-- Maximum 5 bullet points per section
-- Each bullet must pass the Bloomberg test
-- Use "No material disclosure changes identified in this section." if nothing material
-- Keep under 300 words per section
-- NO PREAMBLE - just bullet points starting with •
-- NO REPETITION across sections - each change reported ONCE in most relevant section
-
-Respond ONLY with the JSON object, nothing else."""
+Respond ONLY with the JSON object described in the instructions, nothing else."""
+        
+        # Route on what this call actually carries (not the separately analyzed sections)
+        routing = self.route({name: budget for name, budget in budgets.items() if name not in separate})
+        model = routing['model']
+        
+        max_tokens = 4000  # Increased for all sections
+        cache_key = self.response_key(ALL_SECTIONS_INSTRUCTIONS, prompt, max_tokens, model)
+        if separate:
+            # The prompt only says "ANALYZED SEPARATELY", but the stored result also
+            # holds those sections' summaries: key on their content and settings too
+            cache_key = digest([
+                cache_key,
+                {
+                    name: [budgets[name]['full_removed'], budgets[name]['full_added'],
+                           diff_results.get(name, {}).get('numeric_changes')]
+                    for name in separate
+                },
+                self.model, self.map_part_tokens, self.max_map_parts, REDUCE_INSTRUCTIONS
+            ])
+        
+        return {
+            'request': {
+                'model': model,
+                'max_tokens': max_tokens,
+                'system': cached_system(ALL_SECTIONS_INSTRUCTIONS),
+                'messages': [{"role": "user", "content": prompt}]
+            },
+            'cache_key': cache_key,
+            'budgets': budgets,
+            'separate': separate,
+            'routing': routing
+        }
+    
+    def parse_sections_response(self, message) -> Dict[str, Dict]:
+        """Section analyses from a complete (non-streamed) single-call response"""
+        response_text = message.content[0].text.strip()
+        
+        # Parse JSON response
+        # Remove markdown code blocks if present
+        if response_text.startswith('```'):
+            lines = response_text.split('\n')
+            # Remove first and last lines (``` markers)
+            response_text = '\n'.join(lines[1:-1])
+            if response_text.startswith('json'):
+                response_text = response_text[4:].strip()
+        
+        section_summaries = json.loads(response_text)
+        return {
+            section_name: self.section_analysis(section_name, summary)
+            for section_name, summary in section_summaries.items()
+        }
+    
+    def cached_result(self, company_name: str, ticker: str, old_date: str, new_date: str, cached: Dict) -> Dict:
+        """Report for a filing pair answered from the response cache"""
+        return {
+            'company_name': company_name,
+            'ticker': ticker,
+            'old_filing_date': str(old_date),
+            'new_filing_date': str(new_date),
+            'sections': cached['sections'],
+            'total_cost_usd': 0.0,
+            'total_cost_gbp': 0.0,
+            'total_tokens': 0,
+            'tokens': cached['tokens'],
+            'cached_cost_usd': cached['cost_usd'],
+            'generated_at': None
+        }
+    
+    def analyze_all_sections(self,
+                           company_name: str,
+                           ticker: str,
+                           old_date: str,
+                           new_date: str,
+                           diff_results: Dict[str, Dict],
+                           stream: bool = False,
+                           on_section: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Analyze all sections in a SINGLE Claude API call to avoid repetition across sections
+        
+        Args:
+            company_name: Company name
+            ticker: Stock ticker
+            old_date: Date of older filing
+            new_date: Date of newer filing
+            diff_results: Dict mapping section names to diff analysis results
+            stream: Stream the response and parse each section as it completes
+                    (if the stream breaks, finished sections are kept)
+            on_section: Called with each section's analysis as soon as it is
+                        final - when parsed while streaming, or when it failed
+        
+        Returns:
+            Complete analysis report with all sections
+        """
+        print(f"\n{'='*60}")
+        print(f"AI Analysis (Single Call): {company_name} ({ticker})")
+        print(f"Comparing {old_date} vs {new_date}")
+        print(f"{'='*60}\n")
+        
+        built = self.build_all_sections_request(company_name, ticker, old_date, new_date, diff_results)
+        budgets, separate, routing = built['budgets'], built['separate'], built['routing']
+        model, cache_key = built['request']['model'], built['cache_key']
+        
+        cached = self.get_cached_response(cache_key)
+        if cached is not None:
+            # Identical request seen before: same summaries, nothing spent
+            return self.cached_result(company_name, ticker, old_date, new_date, cached)
+        
+        # Sections analyzed so far, by name (filled while streaming)
+        analyses = {}
+        reported = set()
+        map_reduce_cost = 0.0
+        stream_usage = {}  # Usage of the single call as stream events arrive
+        
+        def report(analysis):
+            reported.add(analysis['section'])
+            if on_section:
+                on_section(analysis)
         
         # Call Claude API
         try:
@@ -474,60 +1338,75 @@ Respond ONLY with the JSON object, nothing else."""
                     'total_tokens': 10000
                 }
             
-            client = anthropic.Anthropic(api_key=self.api_key)
+            if separate:
+                analyses.update(self.map_reduce_sections(
+                    separate, company_name, ticker, str(old_date), str(new_date), diff_results, budgets
+                ))
+                map_reduce_cost = sum(analyses[name]['cost_usd'] for name in separate)
+                for name in separate:
+                    report(analyses[name])
             
-            message = client.messages.create(
-                model=self.model,
-                max_tokens=4000,  # Increased for all sections
-                messages=[{"role": "user", "content": prompt}]
-            )
-            
-            response_text = message.content[0].text.strip()
+            client = get_client(self.api_key)
+            request = built['request']
             
-            # Parse JSON response
-            # Remove markdown code blocks if present
-            if response_text.startswith('```'):
-                lines = response_text.split('\n')
-                # Remove first and last lines (``` markers)
-                response_text = '\n'.join(lines[1:-1])
-                if response_text.startswith('json'):
-                    response_text = response_text[4:].strip()
+            started = time.perf_counter()
+            if stream:
+                message = self._stream_sections(client, request, analyses, report, stream_usage)
+            else:
+                message = client.messages.create(**request)
+            latency = time.perf_counter() - started
             
-            section_summaries = json.loads(response_text)
+            if not stream:
+                for section_name, analysis in self.parse_sections_response(message).items():
+                    if section_name not in analyses:
+                        analyses[section_name] = analysis
             
-            # Build analyses list
-            analyses = []
-            for section_name in ['Item 1', 'Item 1A', 'Item 7', 'Item 8']:
-                summary = section_summaries.get(section_name, 'No material disclosure changes identified in this section.')
-                analyses.append({
-                    'section': section_name,
-                    'has_changes': summary != 'No material disclosure changes identified in this section.',
-                    'summary': summary,
-                    'status': 'analyzed'
-                })
+            # Sections the model left out had nothing to report
+            sections = [
+                analyses.get(section_name) or self.section_analysis(section_name, NO_CHANGES)
+                for section_name in SECTION_NAMES
+            ]
+            if separate:
+                # The single call never saw these sections, so it could not avoid repeating them
+                deduplicate_sections(sections)
+            for analysis in sections:
+                if analysis['section'] not in reported:
+                    report(analysis)
             
             # Calculate cost
-            input_tokens = message.usage.input_tokens
-            output_tokens = message.usage.output_tokens
-            total_tokens = input_tokens + output_tokens
-            
-            input_cost = input_tokens * (3.00 / 1_000_000)
-            output_cost = output_tokens * (15.00 / 1_000_000)
-            total_cost = input_cost + output_cost
+            tokens = usage_tokens(message.usage)
+            total_tokens = tokens['total'] + sum(analyses[name]['tokens']['total'] for name in separate)
+            total_cost = calculate_cost(model, tokens) + map_reduce_cost
+            # Map-reduce levels served from the response cache
+            cached_cost = sum(analyses[name].get('cached_cost_usd', 0.0) for name in separate)
             
-            print(f"✓ Single call complete")
-            print(f"Total cost: ${total_cost:.4f} (£{total_cost * 0.79:.4f})")
+            print(f"✓ Single call complete ({model})")
+            print(f"Total cost: ${total_cost:.4f} (£{total_cost * USD_TO_GBP:.4f})")
             print(f"Total tokens: {total_tokens:,}")
+            print(f"API latency: {latency:.1f}s")
+            print(f"Prompt cache: {tokens['cache_read']:,} read, {tokens['cache_creation']:,} written")
+            
+            self.save_response(cache_key, {
+                'sections': sections,
+                'tokens': tokens,
+                'cost_usd': round(total_cost + cached_cost, 4)
+            })
             
             return {
                 'company_name': company_name,
                 'ticker': ticker,
                 'old_filing_date': str(old_date),
                 'new_filing_date': str(new_date),
-                'sections': analyses,
+                'sections': sections,
                 'total_cost_usd': round(total_cost, 4),
-                'total_cost_gbp': round(total_cost * 0.79, 4),
+                'total_cost_gbp': round(total_cost * USD_TO_GBP, 4),
                 'total_tokens': total_tokens,
+                'tokens': tokens,
+                'cached_cost_usd': round(cached_cost, 4),
+                'latency_seconds': round(latency, 2),
+                'token_allocation': token_allocation(budgets),
+                'map_reduce': {name: analyses[name]['map_reduce'] for name in separate},
+                'routing': routing,
                 'generated_at': None
             }
             
@@ -536,22 +1415,251 @@ Respond ONLY with the JSON object, nothing else."""
             import traceback
             traceback.print_exc()
             
-            # Fall back to empty analyses
+            # A stream that broke partway was still billed for its input and
+            # the output generated so far
+            partial_cost = calculate_cost(model, stream_usage) if stream_usage else 0.0
+            total_cost = map_reduce_cost + partial_cost
+            
+            # Keep sections that completed before a stream broke; the rest failed
+            sections = []
+            for name in SECTION_NAMES:
+                if name not in analyses:
+                    analyses[name] = {'section': name, 'has_changes': False, 'summary': f'Error: {str(e)}', 'status': 'error'}
+                    report(analyses[name])
+                sections.append(analyses[name])
+            
             return {
                 'company_name': company_name,
                 'ticker': ticker,
                 'old_filing_date': str(old_date),
                 'new_filing_date': str(new_date),
-                'sections': [
-                    {'section': name, 'has_changes': False, 'summary': f'Error: {str(e)}', 'status': 'error'}
-                    for name in ['Item 1', 'Item 1A', 'Item 7', 'Item 8']
-                ],
-                'total_cost_usd': 0,
-                'total_cost_gbp': 0,
-                'total_tokens': 0,
+                'sections': sections,
+                'total_cost_usd': round(total_cost, 4),  # Finished map-reduce calls and the partial stream
+                'total_cost_gbp': round(total_cost * USD_TO_GBP, 4),
+                'cached_cost_usd': round(sum(analyses[name].get('cached_cost_usd', 0.0) for name in separate
+                                             if name in analyses), 4),
+                'total_tokens': stream_usage.get('total', 0) + sum(
+                    analyses[name]['tokens']['total'] for name in separate if name in analyses
+                ),
                 'generated_at': None
             }
     
+    def section_analysis(self, section_name: str, summary: str) -> Dict:
+        """Analysis entry for one section of a single-call response"""
+        return {
+            'section': section_name,
+            'has_changes': summary != NO_CHANGES,
+            'summary': summary,
+            'status': 'analyzed'
+        }
+    
+    def _stream_sections(self, client, request: Dict, analyses: Dict,
+                         on_section: Optional[Callable[[Dict], None]],
+                         usage: Optional[Dict] = None):
+        """
+        Stream a single-call request, filling `analyses` as each section's
+        summary completes
+        
+        `usage` (if given) is kept current as events arrive, in usage_tokens
+        form: input and cache tokens from message_start, output tokens from
+        message_delta, estimated from the text received until that arrives.
+        
+        Returns:
+            The final message (for usage). Raises if the stream fails or ends
+            before the JSON object is complete; `analyses` then holds the
+            sections that did complete and `usage` what was billed so far.
+        """
+        usage = {} if usage is None else usage
+        parser = ObjectStream()
+        received_chars = 0
+        with client.messages.stream(**request) as response:
+            for event in response:
+                if event.type == 'message_start':
+                    usage.update(usage_tokens(event.message.usage))
+                elif event.type == 'message_delta':
+                    usage['output'] = event.usage.output_tokens
+                    usage['total'] = usage['input'] + usage['output'] + usage['cache_creation'] + usage['cache_read']
+                elif event.type == 'text':
+                    received_chars += len(event.text)
+                    if usage:
+                        # Output generated so far is billed even if the stream breaks
+                        usage['output'] = max(usage['output'], math.ceil(received_chars / self.token_counter.chars_per_token))
+                        usage['total'] = usage['input'] + usage['output'] + usage['cache_creation'] + usage['cache_read']
+                    for section_name, summary in parser.feed(event.text):
+                        if section_name not in SECTION_NAMES or section_name in analyses:
+                            continue  # Unknown key, or a section analyzed separately
+                        analyses[section_name] = self.section_analysis(section_name, summary)
+                        print(f"    ✓ {section_name} summary received")
+                        if on_section:
+                            on_section(analyses[section_name])
+            message = response.get_final_message()
+        
+        if not parser.finished:
+            raise ValueError(f"Response ended before the JSON object was complete (stop reason: {message.stop_reason})")
+        return message
+    
+    def analyze_batch(self,
+                      pairs: Dict[str, Dict],
+                      poll_interval: Optional[float] = None,
+                      max_wait: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        Analyze many filing pairs through the Message Batches API
+        
+        For non-interactive sweeps (validation runs, cache pre-warming): every
+        single-call request goes out in one batch at half price, and the
+        caller waits on one poll loop instead of a call per ticker. Oversized
+        sections are trimmed rather than map-reduced, so each pair is exactly
+        one request. Responses are saved to the response cache like any
+        other call.
+        
+        Batches are a beta resource in the pinned SDK (anthropic 0.40), so
+        this goes through client.beta.messages.batches. The client honours
+        ANTHROPIC_BASE_URL; anthropic_stub.py serves a local stand-in of
+        these endpoints and drives this method against it.
+        
+        Args:
+            pairs: Caller's key (e.g. ticker) -> analyze_all_sections arguments
+                   (company_name, ticker, old_date, new_date, diff_results)
+            poll_interval: Seconds between status checks (default AI_BATCH_POLL_SECONDS)
+            max_wait: Cancel the batch if it has not ended after this many
+                      seconds (default AI_BATCH_MAX_WAIT_SECONDS)
+        
+        Returns:
+            Caller's key -> result in the analyze_all_sections format
+        """
+        poll_interval = AI_BATCH_POLL_SECONDS if poll_interval is None else poll_interval
+        max_wait = AI_BATCH_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        
+        results = {}
+        pending = {}  # custom_id -> (caller's key, pair, built request)
+        
+        for key, pair in pairs.items():
+            built = self.build_all_sections_request(
+                pair['company_name'], pair['ticker'], pair['old_date'], pair['new_date'],
+                pair['diff_results'], map_reduce=False
+            )
+            cached = self.get_cached_response(built['cache_key'])
+            if cached is not None:
+                results[key] = self.cached_result(
+                    pair['company_name'], pair['ticker'], pair['old_date'], pair['new_date'], cached
+                )
+            elif not ANTHROPIC_AVAILABLE:
+                results[key] = self.analyze_all_sections(**pair)  # Mock response
+            else:
+                # custom_id only allows [a-zA-Z0-9_-], which tickers like BRK.B break
+                pending[f'pair-{len(pending)}'] = (key, pair, built)
+        
+        if not pending:
+            return results
+        
+        batches = get_client(self.api_key).beta.messages.batches
+        batch_id = None
+        try:
+            batch = batches.create(requests=[
+                {'custom_id': custom_id, 'params': built['request']}
+                for custom_id, (_, _, built) in pending.items()
+            ])
+            batch_id = batch.id
+            print(f"✓ Submitted batch {batch_id} ({len(pending)} requests)")
+            
+            started = time.perf_counter()
+            while batch.processing_status != 'ended':
+                if time.perf_counter() - started > max_wait:
+                    batches.cancel(batch_id)
+                    raise TimeoutError(f"Batch {batch_id} did not end within {max_wait:.0f}s (canceled)")
+                time.sleep(poll_interval)
+                batch = batches.retrieve(batch_id)
+                counts = batch.request_counts
+                print(f"    Batch {batch_id}: {counts.processing} processing, "
+                      f"{counts.succeeded} succeeded, {counts.errored} errored")
+            
+            latency = time.perf_counter() - started
+            for entry in batches.results(batch_id):
+                if entry.custom_id not in pending:
+                    continue
+                key, pair, built = pending.pop(entry.custom_id)
+                results[key] = self._batch_result(pair, built, entry.result, batch_id, latency)
+        
+        except Exception as e:
+            print(f"✗ Batch error: {str(e)}")
+            for key, pair, _ in pending.values():
+                results[key] = self._batch_error(pair, f'Error: {str(e)}')
+            pending = {}
+        
+        # Requests the batch returned no result for
+        for key, pair, _ in pending.values():
+            results[key] = self._batch_error(pair, f'Error: no result in batch {batch_id}')
+        
+        total_cost = sum(result['total_cost_usd'] for result in results.values())
+        print(f"✓ Batch complete: {len(results)} pairs, ${total_cost:.4f} (£{total_cost * USD_TO_GBP:.4f})")
+        return {key: results[key] for key in pairs}  # Results arrive in any order
+    
+    def _batch_result(self, pair: Dict, built: Dict, result, batch_id: str, latency: float) -> Dict:
+        """analyze_all_sections-style result for one entry of a batch"""
+        if result.type != 'succeeded':
+            error = getattr(getattr(result, 'error', None), 'error', None)
+            detail = getattr(error, 'message', None) or result.type
+            return self._batch_error(pair, f'Error: batch request {result.type} ({detail})')
+        
+        message = result.message
+        model = built['request']['model']
+        tokens = usage_tokens(message.usage)
+        total_cost = calculate_cost(model, tokens) * BATCH_PRICE_MULTIPLIER
+        
+        try:
+            analyses = self.parse_sections_response(message)
+        except Exception as e:
+            # The request was still billed
+            error_result = self._batch_error(pair, f'Error: {str(e)}')
+            error_result['total_cost_usd'] = round(total_cost, 4)
+            error_result['total_cost_gbp'] = round(total_cost * USD_TO_GBP, 4)
+            error_result['total_tokens'] = tokens['total']
+            return error_result
+        
+        sections = [
+            analyses.get(section_name) or self.section_analysis(section_name, NO_CHANGES)
+            for section_name in SECTION_NAMES
+        ]
+        self.save_response(built['cache_key'], {
+            'sections': sections,
+            'tokens': tokens,
+            'cost_usd': round(total_cost, 4)
+        })
+        
+        return {
+            'company_name': pair['company_name'],
+            'ticker': pair['ticker'],
+            'old_filing_date': str(pair['old_date']),
+            'new_filing_date': str(pair['new_date']),
+            'sections': sections,
+            'total_cost_usd': round(total_cost, 4),
+            'total_cost_gbp': round(total_cost * USD_TO_GBP, 4),
+            'total_tokens': tokens['total'],
+            'tokens': tokens,
+            'cached_cost_usd': 0.0,
+            'latency_seconds': round(latency, 2),
+            'token_allocation': token_allocation(built['budgets']),
+            'routing': built['routing'],
+            'batch_id': batch_id,
+            'generated_at': None
+        }
+    
+    def _batch_error(self, pair: Dict, summary: str) -> Dict:
+        return {
+            'company_name': pair['company_name'],
+            'ticker': pair['ticker'],
+            'old_filing_date': str(pair['old_date']),
+            'new_filing_date': str(pair['new_date']),
+            'sections': [
+                {'section': name, 'has_changes': False, 'summary': summary, 'status': 'error'}
+                for name in SECTION_NAMES
+            ],
+            'total_cost_usd': 0.0,
+            'total_cost_gbp': 0.0,
+            'total_tokens': 0,
+            'generated_at': None
+        }
+    
     def format_report_text(self, analysis_result: Dict) -> str:
         """
         Format the analysis result as readable text (for console output or text file)
@@ -580,6 +1688,7 @@ REPORT METADATA
 {'='*80}
 
 Total Analysis Cost: ${analysis_result['total_cost_usd']} (£{analysis_result['total_cost_gbp']})
+Reused From Cache: ${analysis_result.get('cached_cost_usd', 0.0)}
 Total Tokens: {analysis_result['total_tokens']:,}
 
 Generated: {analysis_result.get('generated_at', 'N/A')}
@@ -589,6 +1698,52 @@ Generated: {analysis_result.get('generated_at', 'N/A')}
 
 
 if __name__ == "__main__":
-    # This will be tested as part of the full pipeline
-    print("AI Analyzer module loaded")
-    print("To test, run the full validation pipeline with: python validation_pipeline.py")
\ No newline at end of file
+    import sys
+    
+    if '--latency' in sys.argv and ANTHROPIC_AVAILABLE:
+        # Per-call overhead of a new client vs the pooled one. Each call is a
+        # messages.create with max_tokens=1, so generation time is negligible.
+        # --stub measures against the local stand-in (no key, no spend).
+        if '--stub' in sys.argv:
+            from anthropic_stub import StubAnthropicServer
+            stub = StubAnthropicServer().start()
+            os.environ['ANTHROPIC_BASE_URL'] = stub.base_url
+            print(f"Measuring against local stub at {stub.base_url}")
+        
+        analyzer = AIAnalyzer(api_key='stub-key' if '--stub' in sys.argv else None)
+        request = {
+            'model': analyzer.small_model or analyzer.model,
+            'max_tokens': 1,
+            'messages': [{"role": "user", "content": "Latency probe"}]
+        }
+        
+        def timed(call, calls=20):
+            timings = []
+            for _ in range(calls):
+                started = time.perf_counter()
+                call()
+                timings.append(time.perf_counter() - started)
+            return sum(timings) / len(timings)
+        
+        async def fresh_async_call():
+            client = anthropic.AsyncAnthropic(api_key=analyzer.api_key)
+            await client.messages.create(**request)
+            await client.close()
+        
+        async def shared_async_call():
+            await get_async_client(analyzer.api_key).messages.create(**request)
+        
+        results = {
+            'New client per call': timed(lambda: anthropic.Anthropic(api_key=analyzer.api_key).messages.create(**request)),
+            'Pooled client': timed(lambda: get_client(analyzer.api_key).messages.create(**request)),
+            # Async path: a client per asyncio.run loop vs the shared loop's client
+            'Async, asyncio.run': timed(lambda: asyncio.run(fresh_async_call())),
+            'Async, shared loop': timed(lambda: run_async(shared_async_call()))
+        }
+        for label, seconds in results.items():
+            print(f"{label + ':':<21}{seconds * 1000:.1f} ms/call")
+    else:
+        # This will be tested as part of the full pipeline
+        print("AI Analyzer module loaded")
+        print("To test, run the full validation pipeline with: python validation_pipeline.py")
+        print("To measure client overhead: python ai_analyzer.py --latency [--stub]")
\ No newline at end of file
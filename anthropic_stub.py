@@ -0,0 +1,231 @@
+"""
+Anthropic Stub Module
+Local stand-in for the Anthropic API endpoints the pipeline calls
+
+Serves messages, token counting and the Message Batches endpoints on
+localhost, so batch submission, polling and result mapping can be
+exercised with the real SDK and no API key. Point the client at it with
+ANTHROPIC_BASE_URL (the SDK reads it when a client is created).
+
+tests/test_message_batches.py runs analyze_batch against it under pytest.
+Run directly for a quick demo of a batch with one errored request:
+    python anthropic_stub.py
+"""
+
+import json
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+SECTION_NAMES = ['Item 1', 'Item 1A', 'Item 7', 'Item 8']
+CHARS_PER_TOKEN = 4
+
+
+def _tokens(payload) -> int:
+    return max(1, len(json.dumps(payload)) // CHARS_PER_TOKEN)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StubAnthropicServer:
+    """Threaded HTTP server answering like the Anthropic API"""
+    
+    def __init__(self, polls_until_ended: int = 2, failing_ids: Optional[set] = None,
+                 expired_ids: Optional[set] = None):
+        """
+        Args:
+            polls_until_ended: Retrieve calls a batch stays 'in_progress' for
+            failing_ids: custom_ids whose batch result is 'errored'
+            expired_ids: custom_ids whose batch result is 'expired'
+        """
+        self.polls_until_ended = polls_until_ended
+        self.failing_ids = set(failing_ids or ())
+        self.expired_ids = set(expired_ids or ())
+        self.batches = {}
+        self.calls = []  # (method, path, anthropic-beta header)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def start(self) -> 'StubAnthropicServer':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def message(self, params: Dict) -> Dict:
+        """Message answering a messages.create request"""
+        # Single-call prompts expect a JSON object keyed by section
+        text = json.dumps({name: f'• Stub summary for {name}' for name in SECTION_NAMES})
+        return {
+            'id': f'msg_stub_{len(self.calls)}',
+            'type': 'message',
+            'role': 'assistant',
+            'model': params.get('model', ''),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {
+                'input_tokens': _tokens([params.get('system'), params.get('messages')]),
+                'output_tokens': _tokens(text),
+                'cache_creation_input_tokens': 0,
+                'cache_read_input_tokens': 0
+            }
+        }
+    
+    def batch_status(self, batch_id: str) -> Dict:
+        batch = self.batches[batch_id]
+        ended = batch['canceled'] or batch['polls'] >= self.polls_until_ended
+        ids = [request['custom_id'] for request in batch['requests']]
+        failed = sum(1 for custom_id in ids if custom_id in self.failing_ids)
+        expired = sum(1 for custom_id in ids if custom_id in self.expired_ids)
+        
+        if ended:
+            counts = {'processing': 0, 'succeeded': 0 if batch['canceled'] else len(ids) - failed - expired,
+                      'errored': 0 if batch['canceled'] else failed,
+                      'canceled': len(ids) if batch['canceled'] else 0,
+                      'expired': 0 if batch['canceled'] else expired}
+        else:
+            counts = {'processing': len(ids), 'succeeded': 0, 'errored': 0, 'canceled': 0, 'expired': 0}
+        
+        return {
+            'id': batch_id,
+            'type': 'message_batch',
+            'processing_status': 'ended' if ended else 'in_progress',
+            'request_counts': counts,
+            'created_at': batch['created_at'],
+            'expires_at': batch['expires_at'],
+            'ended_at': _now() if ended else None,
+            'archived_at': None,
+            'cancel_initiated_at': _now() if batch['canceled'] else None,
+            'results_url': f'{self.base_url}/v1/messages/batches/{batch_id}/results' if ended else None
+        }
+    
+    def batch_results(self, batch_id: str) -> List[Dict]:
+        batch = self.batches[batch_id]
+        results = []
+        for request in batch['requests']:
+            custom_id = request['custom_id']
+            if batch['canceled']:
+                result = {'type': 'canceled'}
+            elif custom_id in self.failing_ids:
+                result = {'type': 'errored', 'error': {
+                    'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}
+                }}
+            elif custom_id in self.expired_ids:
+                result = {'type': 'expired'}
+            else:
+                result = {'type': 'succeeded', 'message': self.message(request['params'])}
+            results.append({'custom_id': custom_id, 'result': result})
+        results.reverse()  # The API does not keep request order either
+        return results
+    
+    def _handler(self):
+        stub = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so client connection reuse shows
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
+            
+            def log_message(self, format, *args):
+                pass  # Keep test output readable
+            
+            def _send(self, status: int, body, content_type: str = 'application/json'):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def _not_found(self):
+                self._send(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            
+            def _route(self, method: str):
+                path = self.path.split('?')[0]
+                stub.calls.append((method, path, self.headers.get('anthropic-beta')))
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                
+                if method == 'POST' and path == '/v1/messages':
+                    return self._send(200, stub.message(body))
+                if method == 'POST' and path == '/v1/messages/count_tokens':
+                    return self._send(200, {'input_tokens': _tokens([body.get('system'), body.get('messages')])})
+                if method == 'POST' and path == '/v1/messages/batches':
+                    batch_id = f'msgbatch_stub_{len(stub.batches)}'
+                    stub.batches[batch_id] = {
+                        'requests': body['requests'], 'polls': -1, 'canceled': False,
+                        'created_at': _now(),
+                        'expires_at': (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat()
+                    }
+                    return self._send(200, stub.batch_status(batch_id))
+                
+                match = re.fullmatch(r'/v1/messages/batches/([\w-]+)(/results|/cancel)?', path)
+                if not match or match.group(1) not in stub.batches:
+                    return self._not_found()
+                batch_id, action = match.groups()
+                
+                if method == 'GET' and action is None:
+                    stub.batches[batch_id]['polls'] += 1
+                    return self._send(200, stub.batch_status(batch_id))
+                if method == 'POST' and action == '/cancel':
+                    stub.batches[batch_id]['canceled'] = True
+                    return self._send(200, stub.batch_status(batch_id))
+                if method == 'GET' and action == '/results':
+                    lines = '\n'.join(json.dumps(entry) for entry in stub.batch_results(batch_id))
+                    return self._send(200, lines.encode('utf-8'), 'application/binary')
+                return self._not_found()
+            
+            def do_GET(self):
+                self._route('GET')
+            
+            def do_POST(self):
+                self._route('POST')
+        
+        return Handler
+
+
+if __name__ == "__main__":
+    import os
+    
+    stub = StubAnthropicServer(polls_until_ended=2, failing_ids={'pair-1'}).start()
+    os.environ['ANTHROPIC_BASE_URL'] = stub.base_url
+    print(f"Stub API listening on {stub.base_url}")
+    
+    from ai_analyzer import AIAnalyzer
+    
+    diff_results = {
+        'Item 1A': {
+            'has_meaningful_changes': True,
+            'added_content': 'New risk factor: tariffs on imported components could raise costs.',
+            'removed_content': '',
+            'significance': 12.0
+        }
+    }
+    pairs = {
+        ticker: {'company_name': f'{ticker} Inc.', 'ticker': ticker, 'old_date': '2023-02-01',
+                 'new_date': '2024-02-01', 'diff_results': diff_results}
+        for ticker in ['AAPL', 'BRK.B', 'XOM']
+    }
+    
+    analyzer = AIAnalyzer(api_key='stub-key')
+    results = analyzer.analyze_batch(pairs, poll_interval=0)
+    
+    statuses = {ticker: result['sections'][0]['status'] for ticker, result in results.items()}
+    polls = sum(1 for method, path, _ in stub.calls if method == 'GET' and path.count('/') == 4)
+    print(f"\nResult status by ticker: {statuses} (BRK.B is set up to error)")
+    print(f"Batch polled {polls} times")
+    
+    stub.stop()
@@ -44,7 +44,11 @@ def generate_report():
         "user_id": "uuid-here",
         "ticker": "AAPL",
         "callback_url": "https://your-edge-function-url",
-        "dry_run": false  (optional - if true, skips AI analysis for testing)
+        "dry_run": false,  (optional - if true, skips AI analysis for testing)
+        "years": 2,  (optional - number of 10-Ks to compare, 2-10; more than 2
+                      produces one report per consecutive pair)
+        "analysis_mode": "single"  (optional - "single" for one AI call covering
+                                    all sections, "sections" for one call per section)
     }
     
     Returns immediately with 202 Accepted
@@ -67,6 +71,20 @@ def generate_report():
         ticker = data['ticker'].upper()
         callback_url = data['callback_url']
         dry_run = data.get('dry_run', False)  # Optional dry run mode
+        try:
+            years = min(max(int(data.get('years', 2)), 2), 10)  # Optional history mode
+        except (TypeError, ValueError):
+            return jsonify({
+                'error': 'invalid_years',
+                'message': 'years must be an integer between 2 and 10'
+            }), 400
+        
+        analysis_mode = data.get('analysis_mode', 'single')
+        if analysis_mode not in ('single', 'sections'):
+            return jsonify({
+                'error': 'invalid_analysis_mode',
+                'message': 'analysis_mode must be "single" or "sections"'
+            }), 400
         
         # Check if job already exists
         if job_id in jobs:
@@ -83,13 +101,15 @@ def generate_report():
             'progress': 0,
             'ticker': ticker,
             'start_time': datetime.now().isoformat(),
-            'dry_run': dry_run
+            'dry_run': dry_run,
+            'years': years,
+            'analysis_mode': analysis_mode
         }
         
         # Process in background thread
         thread = threading.Thread(
             target=process_job,
-            args=(job_id, user_id, ticker, callback_url, jobs, dry_run),
+            args=(job_id, user_id, ticker, callback_url, jobs, dry_run, years, analysis_mode),
             daemon=True  # Thread dies when main program exits
         )
         thread.start()
@@ -0,0 +1,179 @@
+"""
+Boilerplate Index Module
+Tracks how many different filers use each paragraph, so shared boilerplate
+(auditor report language, forward-looking-statement disclaimers, generic
+risk prose) can be dropped before diffing and AI analysis
+"""
+
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from local_cache import DEFAULT_CACHE_DIR
+from text_fingerprint import canonicalize_text, normalize_paragraph, paragraph_hash, split_paragraphs
+
+
+class BoilerplateIndex:
+    """
+    Persistent paragraph fingerprint index with per-filer document frequency
+    
+    Frequency is counted per company (CIK), not per filing, so a company's
+    own text repeated across its yearly 10-Ks never counts as boilerplate.
+    
+    Uses one short-lived SQLite connection per call, so an instance can be
+    shared by worker threads and sent to worker processes.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None, min_filers: int = 25, min_share: float = 0.05):
+        """
+        Args:
+            cache_dir: Directory holding boilerplate.db (default: the
+                       LocalCache directory)
+            min_filers: A paragraph must be used by at least this many filers...
+            min_share: ...and by at least this share of all indexed filers
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.cache_dir.mkdir(exist_ok=True)
+        self.db_path = self.cache_dir / 'boilerplate.db'
+        self.min_filers = min_filers
+        self.min_share = min_share
+        self.min_paragraph_length = 80  # Short lines (headings, labels) are not indexed
+        
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS filings (accession TEXT PRIMARY KEY, cik TEXT)')
+            conn.execute('CREATE TABLE IF NOT EXISTS filers (cik TEXT PRIMARY KEY)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS fingerprints ('
+                'hash TEXT NOT NULL, cik TEXT NOT NULL, PRIMARY KEY (hash, cik)) WITHOUT ROWID'
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+    
+    def _fingerprints(self, paragraphs: Iterable[str]) -> List[str]:
+        """Hashes of paragraphs long enough to be indexed"""
+        return [
+            paragraph_hash(p) for p in paragraphs
+            if len(normalize_paragraph(p)) >= self.min_paragraph_length
+        ]
+    
+    def add_filing(self, accession: str, cik: str, sections: Dict[str, str],
+                   fiscal_year: Optional[int] = None) -> bool:
+        """
+        Index every paragraph of a filing's extracted sections
+        
+        With a fiscal year, paragraphs are indexed in canonical form (years as
+        <FY>, <FY-1>, ...), matching what DiffAnalyzer looks up when it diffs
+        with fiscal years, so dated disclaimers count across filing years.
+        
+        Returns:
+            True if the filing was added, False if it was already indexed
+        """
+        if not accession or not cik:
+            return False
+        
+        hashes = set()
+        for content in sections.values():
+            if fiscal_year:
+                content = canonicalize_text(content, fiscal_year)
+            hashes.update(self._fingerprints(split_paragraphs(content)))
+        
+        try:
+            with closing(self._connect()) as conn, conn:
+                inserted = conn.execute(
+                    'INSERT OR IGNORE INTO filings (accession, cik) VALUES (?, ?)', (accession, cik)
+                ).rowcount
+                if not inserted:
+                    return False
+                
+                conn.execute('INSERT OR IGNORE INTO filers (cik) VALUES (?)', (cik,))
+                conn.executemany(
+                    'INSERT OR IGNORE INTO fingerprints (hash, cik) VALUES (?, ?)',
+                    ((h, cik) for h in hashes)
+                )
+            return True
+        except sqlite3.Error as e:
+            print(f"    Warning: Could not update boilerplate index: {e}")
+            return False
+    
+    def boilerplate_hashes(self, paragraphs: List[str]) -> set:
+        """Return the hashes (of the given paragraphs) that count as boilerplate"""
+        hashes = list(set(self._fingerprints(paragraphs)))
+        if not hashes:
+            return set()
+        
+        try:
+            with closing(self._connect()) as conn:
+                total_filers = conn.execute('SELECT COUNT(*) FROM filers').fetchone()[0]
+                threshold = max(self.min_filers, self.min_share * total_filers)
+                if total_filers < threshold:
+                    return set()  # Index too small to judge anything
+                
+                found = set()
+                # Stay under SQLite's bound-parameter limit
+                for start in range(0, len(hashes), 500):
+                    batch = hashes[start:start + 500]
+                    placeholders = ','.join('?' * len(batch))
+                    rows = conn.execute(
+                        f'SELECT hash, COUNT(*) FROM fingerprints WHERE hash IN ({placeholders}) GROUP BY hash',
+                        batch
+                    )
+                    found.update(h for h, count in rows if count >= threshold)
+                return found
+        except sqlite3.Error as e:
+            print(f"    Warning: Could not read boilerplate index: {e}")
+            return set()
+    
+    def generation(self) -> Dict:
+        """
+        Everything boilerplate decisions depend on, for cache keys of results
+        computed with this index (changes whenever a filing is indexed)
+        """
+        try:
+            with closing(self._connect()) as conn:
+                filings = conn.execute('SELECT COUNT(*) FROM filings').fetchone()[0]
+        except sqlite3.Error:
+            filings = None
+        return {'filings': filings, 'min_filers': self.min_filers, 'min_share': self.min_share}
+    
+    def get_index_info(self) -> Dict:
+        """Get information about the index"""
+        with closing(self._connect()) as conn:
+            return {
+                'filings': conn.execute('SELECT COUNT(*) FROM filings').fetchone()[0],
+                'filers': conn.execute('SELECT COUNT(*) FROM filers').fetchone()[0],
+                'fingerprints': conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0],
+                'db_path': str(self.db_path)
+            }
+
+
+# Singleton instance
+_index = None
+
+def get_boilerplate_index() -> BoilerplateIndex:
+    """Get the global boilerplate index instance"""
+    global _index
+    if _index is None:
+        _index = BoilerplateIndex()
+    return _index
+
+
+if __name__ == "__main__":
+    import shutil
+    
+    # Test the index with a shared disclaimer across 30 filers
+    index = BoilerplateIndex('./test_boilerplate', min_filers=25)
+    disclaimer = ("This report contains forward-looking statements within the meaning of the "
+                  "Private Securities Litigation Reform Act of 1995 that involve risks and uncertainties.")
+    
+    for i in range(30):
+        unique = f"Company {i} designs and sells widgets of type {i} to customers in region {i} " * 2
+        index.add_filing(f"0000-{i}", str(1000 + i), {'Item 1A': f"{disclaimer}\n\n{unique}"})
+    
+    found = index.boilerplate_hashes([disclaimer, "Company 3 designs and sells widgets of type 3 to customers in region 3 " * 2])
+    print(f"Boilerplate paragraphs found: {len(found)} (expected 1)")
+    print(f"Index info: {index.get_index_info()}")
+    
+    shutil.rmtree('./test_boilerplate')
+    print("Test index cleaned up")
@@ -31,10 +31,14 @@ class SupabaseClient:
                       older_filing_date, newer_accession, older_accession,
                       sections_extracted, extraction_issues, extraction_success,
                       ai_summaries, ai_cost_usd, total_tokens_consumed,
-                      generation_time_seconds):
+                      generation_time_seconds, ai_cost_cached_usd=0.0):
         """
         Insert report into database
         
+        ai_cost_usd is what this report actually spent on the API;
+        ai_cost_cached_usd is what reused (cached) AI responses originally cost
+        (column added by supabase/migrations/20261018120100_reports_ai_cost_cached.sql).
+        
         Returns: report_id (UUID)
         """
         
@@ -57,6 +61,7 @@ class SupabaseClient:
             'extraction_success': extraction_success,
             'ai_summaries': ai_summaries,
             'ai_cost_usd': float(ai_cost_usd),
+            'ai_cost_cached_usd': float(ai_cost_cached_usd),
             'total_tokens_consumed': int(total_tokens_consumed),
             'tokens_used': 1,  # Always 1 token per report
             'refunded': False,  # Will be updated if refund issued
@@ -70,6 +75,36 @@ class SupabaseClient:
         
         return result.data[0]['id']
     
+    def get_filing_sections(self, accession, extraction_version):
+        """
+        Get the sections extracted from a filing for an earlier report
+        
+        Table: filing_sections, created by
+        supabase/migrations/20261018120000_filing_sections.sql
+        
+        Returns: {'sections': {...}, 'tables': {...}} or None if not stored
+        """
+        result = self.client.table('filing_sections').select('sections, tables') \
+            .eq('accession', accession) \
+            .eq('extraction_version', extraction_version) \
+            .execute()
+        
+        if not result.data:
+            return None
+        
+        row = result.data[0]
+        return {'sections': row['sections'], 'tables': row.get('tables') or {}}
+    
+    def save_filing_sections(self, accession, extraction_version, ticker, sections, tables):
+        """Store a filing's extracted sections so later reports can skip fetching it"""
+        self.client.table('filing_sections').upsert({
+            'accession': accession,
+            'extraction_version': extraction_version,
+            'ticker': ticker,
+            'sections': sections,
+            'tables': tables
+        }, on_conflict='accession,extraction_version').execute()
+    
     def create_token_refund(self, user_id, report_id, reason):
         """
         Issue a token refund for quality issues
@@ -3,55 +3,113 @@ Diff Analysis Module
 Compares two versions of a 10-K section and identifies meaningful changes
 """
 
+import copy
 import difflib
-from typing import Dict, List, Tuple
+import hashlib
+import json
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 import re
 
+from line_diff import get_opcodes
+from numeric_delta import detect_scale, match_rows
+from risk_factors import segment_risk_factors
+from significance import select_hunks
+from text_fingerprint import (
+    canonicalize_header, canonicalize_text, content_defined_chunks, find_similar_pairs, has_year,
+    normalize_paragraph, paragraph_hash, restore_years, split_paragraphs
+)
+
+
+# Bump whenever a change to the diff logic would change results, so
+# cached diffs computed by older code are no longer served
+DIFF_ALGORITHM_VERSION = '4'
+
 
 class DiffAnalyzer:
     """Analyzes differences between two versions of text"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 1, boilerplate_index=None, result_cache=None):
+        """
+        Args:
+            max_workers: Number of worker processes used by compare_sections.
+                         1 (default) runs everything serially in this process.
+            boilerplate_index: Optional BoilerplateIndex. Paragraphs used by
+                               many other filers are dropped before diffing.
+            result_cache: Optional LocalCache. Section diffs are stored there
+                          by accession pair and served on repeat comparisons.
+        """
         self.min_change_length = 50  # Ignore changes shorter than this (minor wording)
+        # Chars above which chunked comparison is used. The line diff engine is
+        # near-linear, so only truly huge sections need chunking now.
+        self.large_section_threshold = 1000000
+        self.max_workers = max(1, int(max_workers or 1))
+        self.skip_identical_paragraphs = True  # Drop paragraphs present in both versions before diffing
+        self.boilerplate_index = boilerplate_index
+        self.result_cache = result_cache
+        
+        # Near-duplicate pairing of deleted/added paragraphs (MinHash/LSH)
+        self.detect_similar_paragraphs = True
+        self.reword_similarity = 0.5  # At or above: paired as moved/reworded
+        self.word_context = 5         # Unchanged words kept either side of a word-level change
+        
+        # Word-granular mode: replaced blocks containing a line this long are
+        # diffed word by word (get_text() often yields whole tables as one line)
+        self.word_granular_diff = True
+        self.long_line_chars = 500
+        
+        # Per-section, per-side character budget for changes handed to the AI.
+        # Filled greedily by hunk significance rather than first-N characters.
+        self.section_char_budget = 15000
+        
+        # Sections whose changed table rows are reported as numeric records
+        self.numeric_sections = {'Item 7', 'Item 8'}
+        
+        # Sections diffed factor by factor (falls back to a plain diff when
+        # fewer than min_risk_factors headings are found on either side)
+        self.risk_factor_sections = {'Item 1A'}
+        self.min_risk_factors = 5
     
-    def _chunked_diff_analysis(self, old_text: str, new_text: str, chunk_size: int = 20000) -> Dict:
+    def _chunked_diff_analysis(self, old_text: str, new_text: str, chunk_size: int = 20000,
+                               executor: Optional[Executor] = None,
+                               fiscal_years: Optional[Tuple[int, int]] = None,
+                               numeric: bool = False) -> Dict:
         """
-        Analyze large sections by breaking them into chunks
-        This avoids performance issues with difflib on huge texts
+        Analyze very large sections by breaking them into chunks
+        Keeps memory bounded and gives compare_sections units to parallelize
         
         Strategy:
-        1. Split both texts into chunks of ~20K chars
-        2. Diff each corresponding chunk pair
-        3. Aggregate meaningful changes
-        4. Return combined results
+        1. Split both texts into content-defined chunks of ~20K chars
+           (boundaries come from a rolling hash over paragraph hashes, so an
+           insertion near the top does not shift every later chunk)
+        2. Align chunks and skip the identical ones
+        3. Diff each changed region (fanned out to executor if given)
+        4. Aggregate meaningful changes and return combined results
+        
+        With fiscal years, boundaries and chunk equality use the canonical
+        form of each paragraph (as compute_diff does), so a year rollover
+        does not make every chunk differ. Chunks are still reported and
+        diffed in their original wording.
         """
         # Split into paragraphs first (better boundary than arbitrary chars)
-        old_paragraphs = old_text.split('\n\n')
-        new_paragraphs = new_text.split('\n\n')
-        
-        # Group paragraphs into chunks
-        def create_chunks(paragraphs, target_size):
-            chunks = []
-            current_chunk = []
-            current_size = 0
-            
-            for para in paragraphs:
-                para_size = len(para)
-                if current_size + para_size > target_size and current_chunk:
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = [para]
-                    current_size = para_size
-                else:
-                    current_chunk.append(para)
-                    current_size += para_size
-            
-            if current_chunk:
-                chunks.append('\n\n'.join(current_chunk))
-            
-            return chunks
+        old_paragraphs = split_paragraphs(old_text)
+        new_paragraphs = split_paragraphs(new_text)
+        
+        if fiscal_years and all(fiscal_years):
+            old_keys = [canonicalize_text(p, fiscal_years[0]) for p in old_paragraphs]
+            new_keys = [canonicalize_text(p, fiscal_years[1]) for p in new_paragraphs]
+        else:
+            old_keys, new_keys = old_paragraphs, new_paragraphs
+        
+        # Both versions must use the same boundary rule
+        total_paragraphs = max(1, len(old_paragraphs) + len(new_paragraphs))
+        avg_paragraph_size = (sum(map(len, old_keys)) + sum(map(len, new_keys))) / total_paragraphs
         
-        old_chunks = create_chunks(old_paragraphs, chunk_size)
-        new_chunks = create_chunks(new_paragraphs, chunk_size)
+        old_chunks = content_defined_chunks(old_paragraphs, chunk_size, avg_paragraph_size, keys=old_keys)
+        new_chunks = content_defined_chunks(new_paragraphs, chunk_size, avg_paragraph_size, keys=new_keys)
+        old_chunk_keys = content_defined_chunks(old_keys, chunk_size, avg_paragraph_size)
+        new_chunk_keys = content_defined_chunks(new_keys, chunk_size, avg_paragraph_size)
         
         print(f"    Split into {len(old_chunks)} old chunks and {len(new_chunks)} new chunks")
         
@@ -59,10 +117,11 @@ class DiffAnalyzer:
         all_added = []
         all_removed = []
         
-        # Use difflib on chunk level first to align them
-        chunk_matcher = difflib.SequenceMatcher(None, old_chunks, new_chunks)
+        # Changed regions (old chunk range, new chunk range) that need a detailed diff
+        regions = []
         
-        for tag, i1, i2, j1, j2 in chunk_matcher.get_opcodes():
+        # Diff on chunk level first to align them
+        for tag, i1, i2, j1, j2 in get_opcodes(old_chunk_keys, new_chunk_keys):
             if tag == 'equal':
                 continue  # No changes in these chunks
             elif tag == 'delete':
@@ -74,29 +133,47 @@ class DiffAnalyzer:
                 for idx in range(j1, j2):
                     all_added.append(new_chunks[idx])
             elif tag == 'replace':
-                # Chunks modified - do detailed diff
-                for old_idx, new_idx in zip(range(i1, i2), range(j1, j2)):
-                    chunk_diff = self.compute_diff(old_chunks[old_idx], new_chunks[new_idx])
-                    if chunk_diff['has_changes']:
-                        all_removed.append(chunk_diff['deletions'])
-                        all_added.append(chunk_diff['additions'])
+                # Chunks modified - diff the whole region so unequal chunk
+                # counts on each side are handled
+                regions.append((
+                    '\n\n'.join(old_chunks[i1:i2]),
+                    '\n\n'.join(new_chunks[j1:j2])
+                ))
+        
+        if executor is not None:
+            # Submit every region first, then collect in order so the
+            # output is identical to the serial path
+            futures = [executor.submit(self.compute_diff, old, new, fiscal_years, numeric) for old, new in regions]
+            region_diffs = [future.result() for future in futures]
+        else:
+            region_diffs = [self.compute_diff(old, new, fiscal_years, numeric) for old, new in regions]
+        
+        numeric_changes = []
+        for region_diff in region_diffs:
+            numeric_changes.extend(region_diff['numeric_changes'])
+            if region_diff['deletions']:
+                all_removed.append(region_diff['deletions'])
+            if region_diff['additions']:
+                all_added.append(region_diff['additions'])
         
         # Combine results
         removed_content = '\n\n'.join(filter(None, all_removed))
         added_content = '\n\n'.join(filter(None, all_added))
         
-        has_changes = bool(removed_content or added_content)
+        has_changes = bool(removed_content or added_content or numeric_changes)
         
-        # Limit output size for AI (max 10K chars each)
-        if len(removed_content) > 10000:
-            removed_content = removed_content[:10000] + "\n\n[... additional changes truncated ...]"
-        if len(added_content) > 10000:
-            added_content = added_content[:10000] + "\n\n[... additional changes truncated ...]"
+        # Keep the most significant changes within the budget
+        budgeted = self.apply_change_budget(added_content, removed_content)
         
         return {
-            'added_content': added_content,
-            'removed_content': removed_content,
+            'added_content': budgeted['added_content'],
+            'removed_content': budgeted['removed_content'],
             'has_meaningful_changes': has_changes,
+            'significance': budgeted['significance'],
+            'omitted_hunks': budgeted['omitted_hunks'],
+            'truncated_hunks': budgeted['truncated_hunks'],
+            'full_content': budgeted['full_content'],
+            'numeric_changes': numeric_changes,
             'summary': f'Analyzed large section in chunks: found {len(all_added)} additions and {len(all_removed)} removals'
         }
     
@@ -115,9 +192,9 @@ class DiffAnalyzer:
         
         # Remove leading/trailing whitespace from each line
         lines = [line.strip() for line in text.split('\n')]
-        text = '\n'.join(lines)
+        text = '\n'.join(lines).strip()
         
-        return text.strip()
+        return text
     
     def get_text_chunks(self, text: str, chunk_size: int = 500) -> List[str]:
         """
@@ -143,38 +220,346 @@ class DiffAnalyzer:
         
         return chunks
     
-    def compute_diff(self, old_text: str, new_text: str) -> Dict:
+    def remove_common_paragraphs(self, old_text: str, new_text: str) -> Tuple[str, str, List[str]]:
+        """
+        Fast path: drop paragraphs that appear in both versions
+        
+        Paragraphs are hashed after normalization and matched as a multiset,
+        regardless of order. A paragraph that appears twice in the old
+        filing and once in the new one leaves one copy in the old residue.
+        
+        Returns:
+            (old_residue, new_residue, common_paragraphs)
+        """
+        old_paragraphs = split_paragraphs(old_text)
+        new_paragraphs = split_paragraphs(new_text)
+        
+        old_hashes = [paragraph_hash(p) for p in old_paragraphs]
+        new_hashes = [paragraph_hash(p) for p in new_paragraphs]
+        
+        common = Counter(old_hashes) & Counter(new_hashes)
+        
+        def residue(paragraphs, hashes):
+            remaining = common.copy()
+            kept = []
+            skipped = []
+            for para, para_hash in zip(paragraphs, hashes):
+                if remaining[para_hash] > 0:
+                    remaining[para_hash] -= 1
+                    skipped.append(para)
+                else:
+                    kept.append(para)
+            return kept, skipped
+        
+        old_kept, common_paragraphs = residue(old_paragraphs, old_hashes)
+        new_kept, _ = residue(new_paragraphs, new_hashes)
+        
+        return '\n\n'.join(old_kept), '\n\n'.join(new_kept), common_paragraphs
+    
+    def remove_common_lines(self, old_text: str, new_text: str) -> Tuple[str, str, List[str]]:
+        """
+        Drop non-blank lines that appear verbatim in both versions
+        
+        Matched as a multiset like remove_common_paragraphs, but on exact
+        line text. Blank lines are kept so paragraph breaks survive.
+        
+        Returns:
+            (old_residue, new_residue, common_lines)
+        """
+        old_lines = old_text.split('\n')
+        new_lines = new_text.split('\n')
+        common = Counter(line for line in old_lines if line.strip()) & Counter(line for line in new_lines if line.strip())
+        
+        def residue(lines):
+            remaining = common.copy()
+            kept = []
+            skipped = []
+            for line in lines:
+                if remaining[line] > 0:
+                    remaining[line] -= 1
+                    skipped.append(line)
+                else:
+                    kept.append(line)
+            return kept, skipped
+        
+        old_kept, common_lines = residue(old_lines)
+        new_kept, _ = residue(new_lines)
+        
+        return '\n'.join(old_kept).strip(), '\n'.join(new_kept).strip(), common_lines
+    
+    def word_level_delta(self, old_text: str, new_text: str,
+                         min_overlap: float = 0.0) -> Optional[Tuple[str, str]]:
+        """
+        Reduce a changed text pair to just the changed word spans
+        
+        Each span keeps a few unchanged words either side for context.
+        Changes closer together than that are merged into one span, and
+        separate spans are joined with ' … '.
+        
+        Args:
+            min_overlap: Minimum share of words that must be unchanged. Below
+                         it the texts are unrelated and None is returned.
+        
+        Returns:
+            (removed_spans, added_spans), or None if below min_overlap
+        """
+        old_words = old_text.split()
+        new_words = new_text.split()
+        context = self.word_context
+        
+        opcodes = get_opcodes(old_words, new_words)
+        
+        if min_overlap > 0:
+            matched = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == 'equal')
+            if matched < min_overlap * max(len(old_words), len(new_words), 1):
+                return None
+        
+        # Group changes separated by fewer than 2 * context unchanged words
+        groups = []
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == 'equal':
+                continue
+            if groups and i1 - groups[-1][-1][2] <= 2 * context:
+                groups[-1].append((tag, i1, i2, j1, j2))
+            else:
+                groups.append([(tag, i1, i2, j1, j2)])
+        
+        removed = []
+        added = []
+        for group in groups:
+            i1, j1 = group[0][1], group[0][3]
+            i2, j2 = group[-1][2], group[-1][4]
+            if any(op[2] > op[1] for op in group):
+                removed.append(' '.join(old_words[max(0, i1 - context):i2 + context]))
+            if any(op[4] > op[3] for op in group):
+                added.append(' '.join(new_words[max(0, j1 - context):j2 + context]))
+        
+        return ' … '.join(removed), ' … '.join(added)
+    
+    def collapse_similar_paragraphs(self, deletions: List[str], additions: List[str],
+                                    skip_deletions: Optional[set] = None,
+                                    skip_additions: Optional[set] = None) -> Dict:
+        """
+        Pair deleted and added paragraphs that are near-duplicates
+        
+        A line diff reports a moved or lightly reworded risk factor as a full
+        deletion plus a full addition. Pairs found by MinHash/LSH are:
+        - suppressed if the words are identical (moved, or whitespace-only edits)
+        - replaced by their word-level delta otherwise (reworded)
+        
+        Args:
+            skip_deletions / skip_additions: Indices that are already
+                word-level spans and must not be paired again
+        
+        Returns:
+            Dict with the rewritten 'deletions'/'additions' lists (in original
+            order) and counts of 'moved' and 'reworded' pairs
+        """
+        skip_deletions = skip_deletions or set()
+        skip_additions = skip_additions or set()
+        old_index = [i for i in range(len(deletions)) if i not in skip_deletions]
+        new_index = [j for j in range(len(additions)) if j not in skip_additions]
+        
+        pairs = find_similar_pairs(
+            [deletions[i] for i in old_index],
+            [additions[j] for j in new_index],
+            self.reword_similarity
+        )
+        
+        deletions = list(deletions)
+        additions = list(additions)
+        moved = 0
+        reworded = 0
+        
+        for old_pos, new_pos, _ in pairs:
+            old_idx = old_index[old_pos]
+            new_idx = new_index[new_pos]
+            removed, added = self.word_level_delta(deletions[old_idx], additions[new_idx])
+            deletions[old_idx] = removed
+            additions[new_idx] = added
+            if removed or added:
+                reworded += 1
+            else:
+                moved += 1
+        
+        return {
+            'deletions': [line for line in deletions if line],
+            'additions': [line for line in additions if line],
+            'moved': moved,
+            'reworded': reworded
+        }
+    
+    def remove_boilerplate(self, old_text: str, new_text: str) -> Tuple[str, str, int]:
+        """
+        Drop paragraphs the boilerplate index sees across many filers
+        
+        A standard-language paragraph is only dropped when the other side
+        has it too, or an equivalent standard paragraph (e.g. a reworded
+        auditor opinion). One that was newly added or removed - a first
+        going-concern paragraph, a new emphasis of matter - is common
+        language but a material change for this filer, so it is kept.
+        
+        Returns:
+            (old_text, new_text, number of paragraphs dropped)
+        """
+        old_paragraphs = split_paragraphs(old_text)
+        new_paragraphs = split_paragraphs(new_text)
+        
+        boilerplate = self.boilerplate_index.boilerplate_hashes(old_paragraphs + new_paragraphs)
+        if not boilerplate:
+            return old_text, new_text, 0
+        
+        old_hashes = [paragraph_hash(p) for p in old_paragraphs]
+        new_hashes = [paragraph_hash(p) for p in new_paragraphs]
+        old_standard = [i for i, h in enumerate(old_hashes) if h in boilerplate]
+        new_standard = [j for j, h in enumerate(new_hashes) if h in boilerplate]
+        
+        # Same paragraph on both sides
+        shared = set(old_hashes) & set(new_hashes)
+        old_drop = {i for i in old_standard if old_hashes[i] in shared}
+        new_drop = {j for j in new_standard if new_hashes[j] in shared}
+        
+        # Standard paragraph replaced by an equivalent standard paragraph
+        old_rest = [i for i in old_standard if i not in old_drop]
+        new_rest = [j for j in new_standard if j not in new_drop]
+        if old_rest and new_rest:
+            pairs = find_similar_pairs(
+                [old_paragraphs[i] for i in old_rest],
+                [new_paragraphs[j] for j in new_rest],
+                self.reword_similarity
+            )
+            for old_pos, new_pos, _ in pairs:
+                old_drop.add(old_rest[old_pos])
+                new_drop.add(new_rest[new_pos])
+        
+        old_kept = [p for i, p in enumerate(old_paragraphs) if i not in old_drop]
+        new_kept = [p for j, p in enumerate(new_paragraphs) if j not in new_drop]
+        
+        return '\n\n'.join(old_kept), '\n\n'.join(new_kept), len(old_drop) + len(new_drop)
+    
+    def compute_diff(self, old_text: str, new_text: str,
+                     fiscal_years: Optional[Tuple[int, int]] = None,
+                     numeric: bool = False) -> Dict:
         """
         Compute differences between old and new text
         Returns structured diff with additions, deletions, and unchanged portions
+        
+        fiscal_years: (old, new) fiscal years. When given, paragraphs and
+        lines identical in both filings are set aside first; the rest is
+        diffed in canonical form (see canonicalize_text) and reported lines
+        are mapped back to the original wording of their filing.
+        numeric: Pull changed table rows out as numeric_changes records
+        (used for Items 7 and 8) instead of reporting them as lines.
         """
+        # One scale per section - tables rarely mix thousands and millions
+        scale = (detect_scale(new_text) or detect_scale(old_text)) if numeric else ''
+        numeric_changes = []
+        
+        old_fy, new_fy = fiscal_years if fiscal_years and all(fiscal_years) else (None, None)
         old_clean = self.clean_text(old_text)
         new_clean = self.clean_text(new_text)
         
-        # Use difflib to get differences at line level
-        old_lines = old_clean.split('\n')
-        new_lines = new_clean.split('\n')
+        # Canonical line -> original line, for turning output back into real text
+        old_display = {}
+        new_display = {}
+        unchanged = []
+        if old_fy:
+            # Text identical in both filings is unchanged, whatever its years
+            # canonicalize to: a fixed date gets a different token in each
+            old_clean, new_clean, unchanged = self.remove_common_paragraphs(old_clean, new_clean)
+            old_clean, new_clean, common_lines = self.remove_common_lines(old_clean, new_clean)
+            unchanged.extend(common_lines)
+            
+            old_canonical = canonicalize_text(old_clean, old_fy)
+            new_canonical = canonicalize_text(new_clean, new_fy)
+            for canonical, original in zip(old_canonical.split('\n'), old_clean.split('\n')):
+                old_display.setdefault(canonical, original)
+            for canonical, original in zip(new_canonical.split('\n'), new_clean.split('\n')):
+                new_display.setdefault(canonical, original)
+            old_clean, new_clean = old_canonical, new_canonical
+        
+        # Most of a 10-K is identical year to year - only diff the residue
+        if self.skip_identical_paragraphs:
+            old_clean, new_clean, common = self.remove_common_paragraphs(old_clean, new_clean)
+            unchanged.extend(common)
+        
+        # Standard language shared by many filers is never a material change
+        boilerplate = 0
+        if self.boilerplate_index is not None and (old_clean or new_clean):
+            old_clean, new_clean, boilerplate = self.remove_boilerplate(old_clean, new_clean)
         
-        differ = difflib.Differ()
-        diff = list(differ.compare(old_lines, new_lines))
+        # Diff at line level (patience/Myers, near-linear on real filings)
+        old_lines = old_clean.split('\n') if old_clean else []
+        new_lines = new_clean.split('\n') if new_clean else []
         
         additions = []
         deletions = []
-        unchanged = []
         
-        for line in diff:
-            if line.startswith('+ '):
-                additions.append(line[2:])
-            elif line.startswith('- '):
-                deletions.append(line[2:])
-            elif line.startswith('  '):
-                unchanged.append(line[2:])
+        # Indices of entries that are already word-level spans
+        refined_deletions = set()
+        refined_additions = set()
+        
+        for tag, i1, i2, j1, j2 in get_opcodes(old_lines, new_lines):
+            if tag == 'equal':
+                unchanged.extend(old_lines[i1:i2])
+                continue
+            
+            old_block = old_lines[i1:i2]
+            new_block = new_lines[j1:j2]
+            
+            # Changed table rows become "label: old → new" records
+            if tag == 'replace' and numeric:
+                records, used_old, used_new = match_rows(old_block, new_block, scale)
+                numeric_changes.extend(records)
+                old_block = [line for k, line in enumerate(old_block) if k not in used_old]
+                new_block = [line for k, line in enumerate(new_block) if k not in used_new]
+            
+            # Long, mostly unchanged lines: keep only the changed word spans
+            delta = None
+            if tag == 'replace' and self.word_granular_diff and old_block and new_block:
+                if max(len(line) for line in old_block + new_block) >= self.long_line_chars:
+                    delta = self.word_level_delta('\n'.join(old_block), '\n'.join(new_block), min_overlap=0.5)
+            
+            if delta is not None:
+                removed, added = delta
+                if removed:
+                    refined_deletions.add(len(deletions))
+                    deletions.append(removed)
+                if added:
+                    refined_additions.add(len(additions))
+                    additions.append(added)
+            else:
+                deletions.extend(line for line in old_block if line)
+                additions.extend(line for line in new_block if line)
+        
+        moved = reworded = 0
+        if self.detect_similar_paragraphs and deletions and additions:
+            collapsed = self.collapse_similar_paragraphs(
+                deletions, additions,
+                skip_deletions=refined_deletions,
+                skip_additions=refined_additions
+            )
+            deletions = collapsed['deletions']
+            additions = collapsed['additions']
+            moved = collapsed['moved']
+            reworded = collapsed['reworded']
+        
+        if old_fy:
+            for record in numeric_changes:
+                record['label'] = restore_years(record['label'], new_fy)
+            deletions = [old_display.get(line) or restore_years(line, old_fy) for line in deletions]
+            additions = [new_display.get(line) or restore_years(line, new_fy) for line in additions]
+            unchanged = [restore_years(text, new_fy) for text in unchanged]
         
         return {
             'additions': '\n'.join(additions),
             'deletions': '\n'.join(deletions),
             'unchanged': '\n'.join(unchanged),
-            'has_changes': bool(additions or deletions)
+            'has_changes': bool(additions or deletions or numeric_changes),
+            'moved_paragraphs': moved,
+            'reworded_paragraphs': reworded,
+            'boilerplate_paragraphs': boilerplate,
+            'numeric_changes': numeric_changes
         }
     
     def get_unified_diff(self, old_text: str, new_text: str, context_lines: int = 3) -> str:
@@ -197,7 +582,264 @@ class DiffAnalyzer:
         
         return '\n'.join(diff)
     
-    def extract_meaningful_changes(self, old_text: str, new_text: str) -> Dict:
+    def apply_change_budget(self, added: str, removed: str) -> Dict:
+        """
+        Fit added/removed content into section_char_budget by significance
+        
+        Each side is split into hunks (one per line) and scored on novelty,
+        numeric content, size and risk keywords; the best hunks are kept in
+        document order. Late changes in a section are no longer dropped just
+        because of their position.
+        
+        Returns:
+            Dict with budgeted 'added_content'/'removed_content', the total
+            'significance' score of all hunks, the number of 'omitted_hunks'
+            and 'truncated_hunks' (oversized hunks cut to a window) and, when
+            either is non-zero, the unbudgeted 'full_content'
+            ({'added_content', 'removed_content'}) for map-reduce summarization
+        """
+        result = {'significance': 0.0, 'omitted_hunks': 0, 'truncated_hunks': 0, 'full_content': None}
+        
+        for key, content, other in (('added_content', added, removed),
+                                    ('removed_content', removed, added)):
+            selected, omitted, truncated, score = select_hunks(content.split('\n'), self.section_char_budget, reference=other)
+            text = '\n'.join(selected)
+            if omitted:
+                text += f"\n\n[... {omitted} lower-significance changes omitted ...]"
+            result[key] = text
+            result['significance'] += score
+            result['omitted_hunks'] += omitted
+            result['truncated_hunks'] += truncated
+        
+        result['significance'] = round(result['significance'], 2)
+        if result['omitted_hunks'] or result['truncated_hunks']:
+            result['full_content'] = {'added_content': added, 'removed_content': removed}
+        return result
+    
+    def compare_tables(self, old_tables: List[Dict], new_tables: List[Dict],
+                       fiscal_years: Optional[Tuple[int, int]] = None) -> List[Dict]:
+        """
+        Diff parsed table grids cell by cell
+        
+        Tables are paired by the overlap of their row labels. Within a pair,
+        cells are matched by row label and period column: with fiscal years,
+        "2024" in the new filing lines up with "2023" in the old one (both
+        <FY>), and a period present in both filings is also checked for
+        restatement. Columns whose header names no period ("Amount",
+        "% of revenue", the "column N" fallback) are matched by position
+        and never reported as restated.
+        
+        Returns:
+            numeric_changes records ({'label', 'old', 'new', 'scale'})
+        """
+        old_fy, new_fy = fiscal_years if fiscal_years and all(fiscal_years) else (None, None)
+        
+        def row_keys(table):
+            return {label.lower() for label in table['rows']}
+        
+        # Greedy pairing by row-label Jaccard similarity
+        scored = []
+        for i, old_table in enumerate(old_tables):
+            old_keys = row_keys(old_table)
+            for j, new_table in enumerate(new_tables):
+                new_keys = row_keys(new_table)
+                similarity = len(old_keys & new_keys) / max(1, len(old_keys | new_keys))
+                if similarity >= 0.5:
+                    scored.append((-similarity, i, j))
+        scored.sort()
+        
+        pairs = []
+        used_old = set()
+        used_new = set()
+        for _, i, j in scored:
+            if i not in used_old and j not in used_new:
+                used_old.add(i)
+                used_new.add(j)
+                pairs.append((i, j))
+        
+        records = []
+        for i, j in sorted(pairs, key=lambda pair: pair[1]):
+            old_table, new_table = old_tables[i], new_tables[j]
+            scale = new_table.get('scale') or old_table.get('scale') or ''
+            title = new_table.get('title') or ''
+            prefix = f'{title} / ' if title else ''
+            
+            old_rows = {label.lower(): cells for label, cells in old_table['rows'].items()}
+            old_columns = {}
+            for column in old_table['columns']:
+                key = canonicalize_header(column, old_fy) if old_fy else column
+                old_columns.setdefault(key, column)
+            
+            for label, cells in new_table['rows'].items():
+                old_cells = old_rows.get(label.lower())
+                if old_cells is None:
+                    # New line item: report its latest figure
+                    first = next(iter(cells.values()))
+                    records.append({'label': f'{prefix}{label} (new line item)', 'old': '—', 'new': first,
+                                    'scale': scale})
+                    continue
+                
+                for column, value in cells.items():
+                    if not has_year(column):
+                        # No period in the header: same position last year
+                        k = new_table['columns'].index(column)
+                        old_column = old_table['columns'][k] if k < len(old_table['columns']) else None
+                        if old_column in old_cells and old_cells[old_column] != value:
+                            records.append({'label': f'{prefix}{label} ({column})', 'old': old_cells[old_column],
+                                            'new': value, 'scale': scale})
+                        continue
+                    
+                    if column in old_table['columns']:
+                        # Same period reported in both filings: only a restatement changes it
+                        if column in old_cells and old_cells[column] != value:
+                            records.append({'label': f'{prefix}{label} ({column}, restated)',
+                                            'old': old_cells[column], 'new': value, 'scale': scale})
+                        continue
+                    
+                    # New period: compare with the same relative period last year
+                    key = canonicalize_header(column, new_fy) if new_fy else column
+                    old_column = old_columns.get(key)
+                    if old_column in old_cells and old_cells[old_column] != value:
+                        records.append({'label': f'{prefix}{label} ({column})', 'old': old_cells[old_column],
+                                        'new': value, 'scale': scale})
+            
+            new_labels = {label.lower() for label in new_table['rows']}
+            for label, cells in old_table['rows'].items():
+                if label.lower() not in new_labels:
+                    first = next(iter(cells.values()))
+                    records.append({'label': f'{prefix}{label} (line item removed)', 'old': first, 'new': '—',
+                                    'scale': scale})
+        
+        # Tables with no counterpart: every row is new
+        for j, new_table in enumerate(new_tables):
+            if j in used_new:
+                continue
+            title = new_table.get('title') or 'New table'
+            for label, cells in new_table['rows'].items():
+                records.append({'label': f'{title} / {label}', 'old': '—', 'new': next(iter(cells.values())),
+                                'scale': new_table.get('scale') or ''})
+        
+        return records
+    
+    def compare_risk_factors(self, old_text: str, new_text: str,
+                             fiscal_years: Optional[Tuple[int, int]] = None) -> Optional[Dict]:
+        """
+        Diff Item 1A one risk factor at a time
+        
+        Factors are matched by title (exact after canonicalization, then
+        fuzzy), then by body similarity for factors whose title was rewritten.
+        Only matched factors whose text changed are diffed; new and removed
+        factors are reported whole. Every factor contributes one line per side,
+        prefixed with its title, so the significance budget keeps or drops a
+        factor's changes together.
+        
+        Returns:
+            Same shape as extract_meaningful_changes plus 'risk_factors', or
+            None if either version could not be segmented
+        """
+        old_fy, new_fy = fiscal_years if fiscal_years and all(fiscal_years) else (None, None)
+        old_factors = segment_risk_factors(self.clean_text(old_text))
+        new_factors = segment_risk_factors(self.clean_text(new_text))
+        if len(old_factors) < self.min_risk_factors or len(new_factors) < self.min_risk_factors:
+            return None
+        
+        def key(text, fiscal_year):
+            return normalize_paragraph(canonicalize_text(text, fiscal_year) if fiscal_year else text)
+        
+        # 1. Identical titles
+        pairs = []
+        old_by_title = {}
+        for i, (title, _) in enumerate(old_factors):
+            old_by_title.setdefault(key(title, old_fy), []).append(i)
+        for j, (title, _) in enumerate(new_factors):
+            candidates = old_by_title.get(key(title, new_fy))
+            if candidates:
+                pairs.append((candidates.pop(0), j))
+        
+        # 2. Reworded titles, then 3. rewritten titles over a similar body
+        for field in (0, 1):
+            used_old = {i for i, _ in pairs}
+            used_new = {j for _, j in pairs}
+            old_left = [i for i in range(len(old_factors)) if i not in used_old]
+            new_left = [j for j in range(len(new_factors)) if j not in used_new]
+            if not old_left or not new_left:
+                break
+            similar = find_similar_pairs(
+                [old_factors[i][field] for i in old_left],
+                [new_factors[j][field] for j in new_left],
+                self.reword_similarity
+            )
+            pairs.extend((old_left[a], new_left[b]) for a, b, _ in similar)
+        
+        def entry(label, title, text):
+            return f"[{label}: {title[:150]}] " + ' … '.join(line for line in text.split('\n') if line)
+        
+        added = []
+        removed = []
+        changed_titles = []
+        for i, j in sorted(pairs, key=lambda pair: pair[1]):
+            old_title, old_body = old_factors[i]
+            new_title, new_body = new_factors[j]
+            if key(old_body, old_fy) == key(new_body, new_fy):
+                if key(old_title, old_fy) != key(new_title, new_fy):
+                    removed.append(entry('Risk factor retitled', old_title, ''))
+                    added.append(entry('Risk factor retitled', new_title, ''))
+                    changed_titles.append(new_title)
+                continue
+            
+            diff = self.compute_diff(old_body, new_body, fiscal_years)
+            if diff['deletions']:
+                removed.append(entry('Risk factor changed', old_title, diff['deletions']))
+            if diff['additions']:
+                added.append(entry('Risk factor changed', new_title, diff['additions']))
+            if diff['has_changes']:
+                changed_titles.append(new_title)
+        
+        matched_old = {i for i, _ in pairs}
+        matched_new = {j for _, j in pairs}
+        new_titles = [title for j, (title, _) in enumerate(new_factors) if j not in matched_new]
+        removed_titles = [title for i, (title, _) in enumerate(old_factors) if i not in matched_old]
+        for j, (title, body) in enumerate(new_factors):
+            if j not in matched_new:
+                added.append(entry('NEW RISK FACTOR', title, body))
+        for i, (title, body) in enumerate(old_factors):
+            if i not in matched_old:
+                removed.append(entry('REMOVED RISK FACTOR', title, body))
+        
+        added_content = '\n'.join(added)
+        removed_content = '\n'.join(removed)
+        has_changes = (len(added_content) >= self.min_change_length
+                       or len(removed_content) >= self.min_change_length)
+        budgeted = self.apply_change_budget(added_content, removed_content)
+        
+        return {
+            'added_content': budgeted['added_content'] if has_changes else '',
+            'removed_content': budgeted['removed_content'] if has_changes else '',
+            'has_meaningful_changes': has_changes,
+            'significance': budgeted['significance'],
+            'omitted_hunks': budgeted['omitted_hunks'],
+            'truncated_hunks': budgeted['truncated_hunks'],
+            'full_content': budgeted['full_content'] if has_changes else None,
+            'risk_factors': {
+                'old_count': len(old_factors),
+                'new_count': len(new_factors),
+                'added': new_titles,
+                'removed': removed_titles,
+                'changed': changed_titles
+            },
+            'summary': (f'Risk factors: {len(new_titles)} new, {len(removed_titles)} removed, '
+                        f'{len(changed_titles)} changed (of {len(new_factors)})')
+        }
+    
+    def is_large_section(self, old_text: str, new_text: str) -> bool:
+        """Check whether a section pair is big enough to need chunked comparison"""
+        return len(old_text) > self.large_section_threshold or len(new_text) > self.large_section_threshold
+    
+    def extract_meaningful_changes(self, old_text: str, new_text: str,
+                                   executor: Optional[Executor] = None,
+                                   fiscal_years: Optional[Tuple[int, int]] = None,
+                                   numeric: bool = False,
+                                   risk_factors: bool = False) -> Dict:
         """
         Extract only meaningful changes, filtering out minor wording changes
         Uses chunked analysis for large sections to avoid performance issues
@@ -205,15 +847,25 @@ class DiffAnalyzer:
         Returns:
         - added_content: Text that was added
         - removed_content: Text that was removed
+        - numeric_changes: Changed table figures (only when numeric=True)
+        - risk_factors: New/removed/changed factor titles (only when risk_factors=True)
         - modified_sections: Sections that were substantially modified
         """
-        # For very large sections (>100K chars), use chunked comparison
-        if len(old_text) > 100000 or len(new_text) > 100000:
+        # Item 1A: diff factor by factor when the headings can be found
+        if risk_factors:
+            result = self.compare_risk_factors(old_text, new_text, fiscal_years)
+            if result is not None:
+                return result
+            print("    Could not segment risk factors, using plain comparison...")
+        
+        # For very large sections (>1M chars), use chunked comparison
+        if self.is_large_section(old_text, new_text):
             print(f"    Large section detected ({len(old_text):,} / {len(new_text):,} chars), using chunked comparison...")
-            return self._chunked_diff_analysis(old_text, new_text)
+            return self._chunked_diff_analysis(old_text, new_text, executor=executor,
+                                               fiscal_years=fiscal_years, numeric=numeric)
         
         # For normal-sized sections, use standard diff
-        diff = self.compute_diff(old_text, new_text)
+        diff = self.compute_diff(old_text, new_text, fiscal_years, numeric)
         
         if not diff['has_changes']:
             return {
@@ -225,9 +877,11 @@ class DiffAnalyzer:
         
         added = diff['additions']
         removed = diff['deletions']
+        numeric_changes = diff['numeric_changes']
         
         # Filter out very short changes (likely just minor wording)
-        if len(added) < self.min_change_length and len(removed) < self.min_change_length:
+        if (len(added) < self.min_change_length and len(removed) < self.min_change_length
+                and not numeric_changes):
             return {
                 'added_content': '',
                 'removed_content': '',
@@ -235,29 +889,96 @@ class DiffAnalyzer:
                 'summary': 'Only minor wording changes detected'
             }
         
+        # Keep the most significant changes within the budget
+        budgeted = self.apply_change_budget(added, removed)
+        
         return {
-            'added_content': added,
-            'removed_content': removed,
+            'added_content': budgeted['added_content'],
+            'removed_content': budgeted['removed_content'],
             'has_meaningful_changes': True,
+            'significance': budgeted['significance'],
+            'omitted_hunks': budgeted['omitted_hunks'],
+            'truncated_hunks': budgeted['truncated_hunks'],
+            'full_content': budgeted['full_content'],
+            'numeric_changes': numeric_changes,
             'summary': f'Changes detected: ~{len(added)} chars added, ~{len(removed)} chars removed'
+                       + (f', {len(numeric_changes)} figures changed' if numeric_changes else '')
+        }
+    
+    def diff_cache_key(self, section_name: str, old_accession: str, new_accession: str,
+                       old_content: str, new_content: str, fiscal_years, old_tables, new_tables) -> str:
+        """
+        Cache key for one section diff
+        
+        Covers the accession pair and section, the diff algorithm version and
+        every setting that affects results. The section texts and tables are
+        digested too, so a change in section extraction never serves a stale diff.
+        The boilerplate index generation is included because its decisions
+        change as more filings are indexed.
+        """
+        settings = {
+            name: sorted(value) if isinstance(value, set) else value
+            for name, value in vars(self).items()
+            if name not in ('boilerplate_index', 'result_cache', 'max_workers')
+        }
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (old_content, new_content,
+                     json.dumps([old_tables, new_tables], sort_keys=True, default=str)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        
+        key = json.dumps([
+            DIFF_ALGORITHM_VERSION, settings, section_name, old_accession, new_accession,
+            fiscal_years, self.boilerplate_index.generation() if self.boilerplate_index is not None else None,
+            digest.hexdigest()
+        ], sort_keys=True, default=str)
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def section_options(self, section_name: str) -> Dict:
+        """Per-section extract_meaningful_changes options"""
+        return {
+            'numeric': section_name in self.numeric_sections,
+            'risk_factors': section_name in self.risk_factor_sections
         }
     
     def compare_sections(self, old_sections: Dict[str, str], 
-                        new_sections: Dict[str, str]) -> Dict[str, Dict]:
+                        new_sections: Dict[str, str],
+                        old_fiscal_year: Optional[int] = None,
+                        new_fiscal_year: Optional[int] = None,
+                        old_tables: Optional[Dict[str, List[Dict]]] = None,
+                        new_tables: Optional[Dict[str, List[Dict]]] = None,
+                        old_accession: Optional[str] = None,
+                        new_accession: Optional[str] = None) -> Dict[str, Dict]:
         """
         Compare all sections between two filings
         
+        When max_workers > 1, sections are fanned out across a process pool.
+        Large sections are chunked in this process and their chunk pairs are
+        submitted to the same pool. Results are identical to the serial path.
+        
         Args:
             old_sections: Dict mapping section names to content (older filing)
             new_sections: Dict mapping section names to content (newer filing)
+            old_fiscal_year / new_fiscal_year: Fiscal years of the two filings.
+                When both are known, year and page references are compared
+                relative to each filing's own year.
+            old_tables / new_tables: Parsed table grids per section (from
+                SECFetcher). Compared cell by cell; the changed cells are
+                added to the section's numeric_changes.
+            old_accession / new_accession: Identify the filings. With a
+                result_cache, section diffs are served from and saved to it.
         
         Returns:
             Dict mapping section names to their diff analysis
         """
         results = {}
+        fiscal_years = (old_fiscal_year, new_fiscal_year) if old_fiscal_year and new_fiscal_year else None
+        
+        # Get all section names (stable order: old filing first, then new-only sections)
+        all_sections = list(old_sections.keys()) + [s for s in new_sections if s not in old_sections]
         
-        # Get all section names
-        all_sections = set(old_sections.keys()) | set(new_sections.keys())
+        # Sections present in both filings need a real comparison
+        to_compare = []
         
         for section_name in all_sections:
             old_content = old_sections.get(section_name, '')
@@ -284,13 +1005,118 @@ class DiffAnalyzer:
                     'summary': 'Entire section was removed'
                 }
             else:
-                # Section exists in both, compare
-                changes = self.extract_meaningful_changes(old_content, new_content)
-                changes['status'] = 'modified' if changes['has_meaningful_changes'] else 'unchanged'
-                results[section_name] = changes
+                # Section exists in both, compare below
+                results[section_name] = None
+                to_compare.append(section_name)
+        
+        # Serve repeat comparisons of the same filing pair from the cache
+        cache_keys = {}
+        if self.result_cache is not None and old_accession and new_accession:
+            for section_name in to_compare:
+                cache_keys[section_name] = self.diff_cache_key(
+                    section_name, old_accession, new_accession,
+                    old_sections[section_name], new_sections[section_name], fiscal_years,
+                    (old_tables or {}).get(section_name), (new_tables or {}).get(section_name)
+                )
+                results[section_name] = self.result_cache.get_artifact('diff', cache_keys[section_name])
+            
+            cached = [s for s in to_compare if results[s] is not None]
+            if cached:
+                print(f"    ✓ Loaded {len(cached)} section diffs from cache")
+            to_compare = [s for s in to_compare if results[s] is None]
+        
+        if self.max_workers > 1 and to_compare:
+            print(f"    Comparing {len(to_compare)} sections across {self.max_workers} worker processes...")
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {}
+                for section_name in to_compare:
+                    old_content = old_sections[section_name]
+                    new_content = new_sections[section_name]
+                    if self.is_large_section(old_content, new_content):
+                        # Chunk here, diff chunk pairs in the pool
+                        continue
+                    futures[section_name] = executor.submit(
+                        self.extract_meaningful_changes, old_content, new_content,
+                        fiscal_years=fiscal_years, **self.section_options(section_name)
+                    )
+                
+                # Large sections run while the small ones are already in flight
+                for section_name in to_compare:
+                    if section_name not in futures:
+                        results[section_name] = self.extract_meaningful_changes(
+                            old_sections[section_name], new_sections[section_name], executor=executor,
+                            fiscal_years=fiscal_years, **self.section_options(section_name)
+                        )
+                
+                for section_name, future in futures.items():
+                    results[section_name] = future.result()
+        else:
+            for section_name in to_compare:
+                results[section_name] = self.extract_meaningful_changes(
+                    old_sections[section_name], new_sections[section_name],
+                    fiscal_years=fiscal_years, **self.section_options(section_name)
+                )
+        
+        for section_name in to_compare:
+            changes = results[section_name]
+            
+            old_section_tables = (old_tables or {}).get(section_name)
+            new_section_tables = (new_tables or {}).get(section_name)
+            if old_section_tables and new_section_tables:
+                table_changes = self.compare_tables(old_section_tables, new_section_tables, fiscal_years)
+                if table_changes:
+                    changes['numeric_changes'] = table_changes + changes.get('numeric_changes', [])
+                    if changes['has_meaningful_changes']:
+                        changes['summary'] += f' ({len(table_changes)} table cells changed)'
+                    else:
+                        changes['summary'] = f'Table changes only: {len(table_changes)} cells changed'
+                        changes['has_meaningful_changes'] = True
+            
+            changes['status'] = 'modified' if changes['has_meaningful_changes'] else 'unchanged'
+            
+            if section_name in cache_keys:
+                self.result_cache.save_artifact('diff', cache_keys[section_name], changes)
         
         return results
     
+    def compare_filing_history(self, filings: List[Dict]) -> List[Dict[str, Dict]]:
+        """
+        Compare N consecutive filings (history mode)
+        
+        Args:
+            filings: Filing dicts from SECFetcher.get_10k_sections, newest first
+        
+        Returns:
+            One compare_sections result per consecutive pair, newest pair first.
+            With max_workers > 1 the pairs are compared in parallel, one
+            process per pair.
+        """
+        def pair_arguments(older, newer):
+            return {
+                'old_sections': older['sections'],
+                'new_sections': newer['sections'],
+                'old_fiscal_year': older.get('fiscal_year'),
+                'new_fiscal_year': newer.get('fiscal_year'),
+                'old_tables': older.get('tables'),
+                'new_tables': newer.get('tables'),
+                'old_accession': older.get('accession'),
+                'new_accession': newer.get('accession')
+            }
+        
+        pairs = [(filings[i + 1], filings[i]) for i in range(len(filings) - 1)]
+        
+        if self.max_workers > 1 and len(pairs) > 1:
+            # Parallelism is across pairs here; each pair runs serially in its worker
+            serial = copy.copy(self)
+            serial.max_workers = 1
+            print(f"    Comparing {len(pairs)} filing pairs across {min(self.max_workers, len(pairs))} worker processes...")
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pairs))) as executor:
+                futures = [executor.submit(serial.compare_sections, **pair_arguments(older, newer))
+                           for older, newer in pairs]
+                return [future.result() for future in futures]
+        
+        return [self.compare_sections(**pair_arguments(older, newer)) for older, newer in pairs]
+    
     def generate_diff_report(self, section_name: str, diff_result: Dict) -> str:
         """
         Generate a human-readable diff report for a section
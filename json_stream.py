@@ -0,0 +1,119 @@
+"""
+JSON Stream Module
+Incremental parser for the flat JSON object returned by the single-call AI analysis
+
+The model answers with {"Item 1": "...", "Item 1A": "...", ...}. Feeding
+streamed text into ObjectStream yields each key/value pair as soon as its
+closing quote arrives, so progress can be reported per section instead of
+after the whole response.
+"""
+
+import json
+from typing import Any, List, Tuple
+
+
+class ObjectStream:
+    """Yields the top-level (key, value) pairs of a JSON object fed in pieces"""
+    
+    def __init__(self):
+        self.state = 'start'
+        self.key = None
+        self.raw = []
+        self.escape = False
+        self.depth = 0
+    
+    @property
+    def finished(self) -> bool:
+        """True once the closing brace of the object has been seen"""
+        return self.state == 'end'
+    
+    def _decode_string(self) -> str:
+        # strict=False: models sometimes put raw newlines inside strings
+        return json.loads('"' + ''.join(self.raw) + '"', strict=False)
+    
+    def _decode_other(self) -> Any:
+        text = ''.join(self.raw).strip()
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+    
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        Consume the next piece of the response
+        
+        Returns:
+            Pairs completed by this piece, in order. Text before the opening
+            brace (e.g. a ```json fence) and after the closing one is ignored.
+        """
+        completed = []
+        
+        for ch in text:
+            state = self.state
+            
+            if state == 'start':
+                if ch == '{':
+                    self.state = 'key'
+            
+            elif state in ('key', 'next'):
+                if ch == '"' and state == 'key':
+                    self.state = 'key_string'
+                    self.raw = []
+                elif ch == ',':
+                    self.state = 'key'
+                elif ch == '}':
+                    self.state = 'end'
+            
+            elif state in ('key_string', 'value_string'):
+                if self.escape:
+                    self.raw.append(ch)
+                    self.escape = False
+                elif ch == '\\':
+                    self.raw.append(ch)
+                    self.escape = True
+                elif ch == '"':
+                    if state == 'key_string':
+                        self.key = self._decode_string()
+                        self.state = 'colon'
+                    else:
+                        completed.append((self.key, self._decode_string()))
+                        self.state = 'next'
+                else:
+                    self.raw.append(ch)
+            
+            elif state == 'colon':
+                if ch == ':':
+                    self.state = 'value'
+            
+            elif state == 'value':
+                if ch == '"':
+                    self.state = 'value_string'
+                    self.raw = []
+                elif not ch.isspace():
+                    # Numbers, null, nested arrays/objects (not expected, but kept)
+                    self.state = 'value_other'
+                    self.raw = []
+                    self.depth = 0
+                    state = 'value_other'
+            
+            if state == 'value_other':
+                if ch in '[{':
+                    self.depth += 1
+                elif ch in ']}' and self.depth > 0:
+                    self.depth -= 1
+                elif ch in ',}' and self.depth == 0:
+                    completed.append((self.key, self._decode_other()))
+                    self.state = 'key' if ch == ',' else 'end'
+                    continue
+                self.raw.append(ch)
+        
+        return completed
+
+
+if __name__ == "__main__":
+    response = '```json\n{\n  "Item 1": "• New segment\\n• Exit from \\"Legacy\\" market",\n  "Item 1A": "No material disclosure changes identified in this section.",\n  "Count": 2\n}\n```'
+    stream = ObjectStream()
+    for k in range(0, len(response), 7):  # Arrives in small pieces
+        for key, value in stream.feed(response[k:k + 7]):
+            print(f"{key!r}: {value!r}")
+    print(f"Finished: {stream.finished}")
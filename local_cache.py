@@ -1,19 +1,26 @@
 """
 Local Caching Module
-Saves fetched HTML files locally to avoid re-fetching during development
+Saves fetched HTML files locally to avoid re-fetching during development,
+plus compressed JSON artifacts (e.g. diff results) keyed by their inputs
 """
 
 import os
+import gzip
 import hashlib
 import json
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Any, Optional
+
+# Next to the code rather than the working directory, so the app, worker
+# and scripts share one cache wherever they are started from
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / 'cache'
 
 class LocalCache:
     """Simple file-based cache for HTML files"""
     
-    def __init__(self, cache_dir: str = './cache'):
-        self.cache_dir = Path(cache_dir)
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
         self.cache_dir.mkdir(exist_ok=True)
         
         # Create subdirectories
@@ -21,6 +28,8 @@ class LocalCache:
         self.metadata_dir = self.cache_dir / 'metadata'
         self.html_dir.mkdir(exist_ok=True)
         self.metadata_dir.mkdir(exist_ok=True)
+        self.artifacts_dir = self.cache_dir / 'artifacts'
+        self.artifacts_dir.mkdir(exist_ok=True)
     
     def _get_cache_key(self, url: str) -> str:
         """Generate a cache key from URL"""
@@ -70,6 +79,42 @@ class LocalCache:
         except Exception as e:
             print(f"    Warning: Could not save to cache: {e}")
     
+    def _artifact_path(self, kind: str, key: str) -> Path:
+        """artifacts/<kind>/<first 2 chars of key>/<key>.json.gz"""
+        return self.artifacts_dir / kind / key[:2] / f"{key}.json.gz"
+    
+    def get_artifact(self, kind: str, key: str) -> Optional[Any]:
+        """Get a cached artifact (None if missing or unreadable)"""
+        artifact_file = self._artifact_path(kind, key)
+        if not artifact_file.exists():
+            return None
+        
+        try:
+            with gzip.open(artifact_file, 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"    Error reading cached {kind}: {e}")
+            return None
+    
+    def save_artifact(self, kind: str, key: str, value: Any):
+        """
+        Save a JSON-serializable artifact, gzip-compressed
+        Written to a temp file first so concurrent readers never see a partial file.
+        The temp name is per process and thread: worker threads may save the
+        same key at once, and must not write into each other's temp file.
+        """
+        artifact_file = self._artifact_path(kind, key)
+        tmp_file = artifact_file.with_name(f"{artifact_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        
+        try:
+            artifact_file.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(tmp_file, 'wt', encoding='utf-8') as f:
+                json.dump(value, f, default=str)
+            os.replace(tmp_file, artifact_file)
+        except Exception as e:
+            print(f"    Warning: Could not cache {kind}: {e}")
+            tmp_file.unlink(missing_ok=True)
+    
     def clear_cache(self):
         """Clear all cached files"""
         import shutil
@@ -78,16 +123,19 @@ class LocalCache:
             self.cache_dir.mkdir(exist_ok=True)
             self.html_dir.mkdir(exist_ok=True)
             self.metadata_dir.mkdir(exist_ok=True)
+            self.artifacts_dir.mkdir(exist_ok=True)
             print("Cache cleared")
     
     def get_cache_info(self):
         """Get information about cached files"""
         html_files = list(self.html_dir.glob('*.html'))
+        artifact_files = list(self.artifacts_dir.glob('*/*/*.json.gz'))
         
-        total_size = sum(f.stat().st_size for f in html_files)
+        total_size = sum(f.stat().st_size for f in html_files + artifact_files)
         
         return {
             'num_files': len(html_files),
+            'num_artifacts': len(artifact_files),
             'total_size_mb': total_size / (1024 * 1024),
             'cache_dir': str(self.cache_dir)
         }
@@ -122,6 +170,13 @@ if __name__ == "__main__":
     else:
         print("✗ Cache test failed")
     
+    # Test artifacts
+    cache.save_artifact('test', 'abc123', {'added_content': 'x' * 1000})
+    if cache.get_artifact('test', 'abc123') == {'added_content': 'x' * 1000}:
+        print("✓ Artifact cache working correctly!")
+    else:
+        print("✗ Artifact cache test failed")
+    
     # Show info
     info = cache.get_cache_info()
     print(f"\nCache info: {info}")
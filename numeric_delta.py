@@ -0,0 +1,206 @@
+"""
+Numeric Delta Module
+Turns changed table rows into compact "label: old → new" records
+
+Financial statement and MD&A tables flatten to lines like
+"Net sales $ 391,035 $ 383,285". When such a row changes, the figures are
+the only information - the AI stage gets one short record per changed
+figure instead of the raw rows.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# One figure: $1,234.5  (1,234)  12.5%  — (nil)
+_VALUE = re.compile(r'\(?\$?\s*\d[\d,]*(?:\.\d+)?\s*\)?\s*%?|[—–]')
+# What may appear between the figures of a table row
+_ROW_FILLER = re.compile(r'^[\s$%()—–-]*$')
+_SCALE = re.compile(r'in\s+(thousands|millions|billions)', re.IGNORECASE)
+
+
+def detect_scale(text: str) -> str:
+    """
+    Scale most often stated in a section ("(in millions, except ...)")
+    Returns '' if the section never states one
+    """
+    counts = {}
+    for match in _SCALE.finditer(text):
+        scale = match.group(1).lower()
+        counts[scale] = counts.get(scale, 0) + 1
+    if not counts:
+        return ''
+    return max(counts, key=lambda scale: (counts[scale], scale))
+
+
+def _normalize_value(value: str) -> str:
+    """Canonical display form of one figure ("$ 1,234" -> "$1,234")"""
+    return re.sub(r'\s+', '', value)
+
+
+def parse_row(line: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Split a flattened table row into (label, figures)
+    
+    A row is an optional text label followed only by figures. Lines that
+    mix words and numbers further along (narrative sentences) are not rows.
+    Labels containing digits (e.g. "Note 12") are rejected as ambiguous.
+    
+    Returns:
+        (label, figures) or None if the line is not a table row
+    """
+    first = _VALUE.search(line)
+    if not first:
+        return None
+    
+    label = line[:first.start()].strip(' \t:$(')
+    if re.search(r'\d', label):
+        return None
+    
+    rest = line[first.start():]
+    if not _ROW_FILLER.match(_VALUE.sub(' ', rest)):
+        return None
+    
+    values = [_normalize_value(v) for v in _VALUE.findall(rest)]
+    if not values:
+        return None
+    return label, values
+
+
+def _row_records(label: str, old_values: List[str], new_values: List[str], scale: str) -> List[Dict]:
+    """
+    Records for one pair of matched rows
+    
+    Columns are aligned at the offset that matches the most cells: as-is,
+    shifted by one (a year-over-year table rolls one column each filing:
+    last year's current-period figure becomes this year's prior-period
+    figure) or, when the column counts differ, right-aligned. Cells left
+    without a partner because a column was added or dropped are reported
+    as 'added'/'removed' records rather than ignored.
+    """
+    records = []
+    
+    def record(column_label, old, new):
+        records.append({'label': f'{label}{column_label}', 'old': old, 'new': new, 'scale': scale})
+    
+    def column(j):
+        return f' (column {j + 1})' if j else ''
+    
+    def matches(offset):
+        return sum(
+            old_values[k] == new_values[k + offset]
+            for k in range(len(old_values)) if 0 <= k + offset < len(new_values)
+        )
+    
+    offsets = [0]
+    if len(new_values) > 1:
+        offsets.append(1)
+    if len(new_values) - len(old_values) not in offsets:
+        offsets.append(len(new_values) - len(old_values))
+    # Ties keep the earlier (simpler) alignment
+    offset = max(offsets, key=lambda d: (matches(d), -offsets.index(d)))
+    
+    if offset == 1:
+        # Rolled table: the new current period is compared with the old one,
+        # and the oldest old column dropping off is expected
+        if old_values[0] != new_values[0]:
+            record('', old_values[0], new_values[0])
+        for k, old in enumerate(old_values):
+            if k + 1 < len(new_values):
+                if old != new_values[k + 1]:
+                    record(f' (restated, column {k + 2})', old, new_values[k + 1])
+            elif k >= len(new_values):
+                record(f' (column {k + 1}, removed)', old, 'n/a')
+        for j in range(len(old_values) + 1, len(new_values)):
+            record(f' (column {j + 1}, added)', 'n/a', new_values[j])
+        return records
+    
+    for k, old in enumerate(old_values):
+        j = k + offset
+        if 0 <= j < len(new_values):
+            if old != new_values[j]:
+                record(column(j), old, new_values[j])
+        else:
+            record(f' (column {k + 1}, removed)', old, 'n/a')
+    for j, new in enumerate(new_values):
+        if not 0 <= j - offset < len(old_values):
+            record(f' (column {j + 1}, added)', 'n/a', new)
+    
+    return records
+
+
+def match_rows(old_lines: List[str], new_lines: List[str],
+               scale: str = '') -> Tuple[List[Dict], set, set]:
+    """
+    Align changed table rows between two blocks of lines
+    
+    Labelled rows are matched by label; unlabelled rows (figures only) are
+    matched by position when both blocks have the same number of them.
+    
+    Returns:
+        (records, indices of old_lines consumed, indices of new_lines consumed)
+    """
+    old_rows = [(i, parse_row(line)) for i, line in enumerate(old_lines)]
+    new_rows = [(i, parse_row(line)) for i, line in enumerate(new_lines)]
+    old_rows = [(i, row) for i, row in old_rows if row]
+    new_rows = [(i, row) for i, row in new_rows if row]
+    
+    records = []
+    used_old = set()
+    used_new = set()
+    
+    # Labelled rows: first unused old row with the same label
+    by_label = {}
+    for i, (label, values) in old_rows:
+        if label:
+            by_label.setdefault(label.lower(), []).append((i, values))
+    
+    for j, (label, values) in new_rows:
+        if not label:
+            continue
+        candidates = by_label.get(label.lower())
+        if not candidates:
+            continue
+        i, old_values = candidates.pop(0)
+        records.extend(_row_records(label, old_values, values, scale))
+        used_old.add(i)
+        used_new.add(j)
+    
+    # Unlabelled rows: positional, only when the blocks line up
+    old_bare = [(i, values) for i, (label, values) in old_rows if not label]
+    new_bare = [(j, values) for j, (label, values) in new_rows if not label]
+    if old_bare and len(old_bare) == len(new_bare):
+        for (i, old_values), (j, new_values) in zip(old_bare, new_bare):
+            records.extend(_row_records('(unlabelled row)', old_values, new_values, scale))
+            used_old.add(i)
+            used_new.add(j)
+    
+    return records, used_old, used_new
+
+
+def format_record(record: Dict) -> str:
+    """One record as "label: old → new (scale)" """
+    figure = record['new'] if record['new'] != 'n/a' else record['old']
+    scale = f" ({record['scale']})" if record.get('scale') and '%' not in figure else ''
+    return f"{record['label']}: {record['old']} → {record['new']}{scale}"
+
+
+if __name__ == "__main__":
+    old_block = [
+        "Net sales $ 383,285 $ 394,328",
+        "Gross margin 44.1% 43.3%",
+        "Research and development 29,915 26,251",
+        "Operating income 114,301 119,437",
+    ]
+    new_block = [
+        "Net sales $ 391,035 $ 383,285",
+        "Gross margin 46.2% 44.1%",
+        "Research and development 31,370 29,900",
+        "Operating income 123,216 114,301 119,437",
+        "Total net sales increased 2% compared to the prior year.",
+    ]
+    
+    records, used_old, used_new = match_rows(old_block, new_block, detect_scale("(In millions, except per-share amounts)"))
+    for record in records:
+        print(format_record(record))
+    print(f"Rows consumed: {len(used_old)} old, {len(used_new)} new (narrative line kept)")
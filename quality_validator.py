@@ -4,6 +4,9 @@ Checks if extraction meets quality standards
 Determines if user should get automatic refund
 """
 
+# Bump when checks or thresholds change, so cached validation results are redone
+VALIDATOR_VERSION = '1'
+
 
 class QualityValidator:
     """
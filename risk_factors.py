@@ -0,0 +1,84 @@
+"""
+Risk Factors Module
+Splits Item 1A into individual titled risk factors
+
+Each risk factor in a 10-K opens with a one-sentence heading (usually bold
+or italic, so get_text() puts it on its own line) followed by body
+paragraphs. The heuristics below do not need to be perfect: last year's
+Item 1A is mostly identical text, so both versions are segmented the same
+way and factors still line up.
+"""
+
+import re
+from typing import List, Tuple
+
+
+# Words that almost every risk factor heading contains
+_HEADING_WORDS = re.compile(
+    r'\b(could|may|might|would|adversely|adverse|risks?|depends?|dependent|subject to|fail|failure|'
+    r'unable|inability|uncertain|uncertainty|harm|volatil\w*|exposed?|impact)\b',
+    re.IGNORECASE
+)
+
+INTRODUCTION = '(Introduction)'
+
+
+def is_heading(line: str, next_line: str) -> bool:
+    """
+    Heuristic test for a risk factor heading
+    
+    A heading is a single sentence (25-300 chars) starting with a capital,
+    ending in a full stop, using typical risk vocabulary, and followed by
+    a longer body paragraph.
+    """
+    if not 25 <= len(line) <= 300:
+        return False
+    if not line[0].isupper() or not line.endswith(('.', '?')):
+        return False
+    if not _HEADING_WORDS.search(line):
+        return False
+    return len(next_line) > len(line)
+
+
+def segment_risk_factors(text: str) -> List[Tuple[str, str]]:
+    """
+    Split Item 1A text into (title, body) pairs in document order
+    
+    Text before the first heading (the section introduction) is returned
+    as a factor titled INTRODUCTION. Sub-category headings ("Risks Related
+    to Our Business") stay inside the body of the factor they follow.
+    """
+    lines = [line.strip() for line in text.split('\n') if line.strip()]
+    
+    factors = []
+    title = INTRODUCTION
+    body = []
+    
+    for idx, line in enumerate(lines):
+        next_line = lines[idx + 1] if idx + 1 < len(lines) else ''
+        if is_heading(line, next_line):
+            if body or title != INTRODUCTION:
+                factors.append((title, '\n'.join(body)))
+            title = line
+            body = []
+        else:
+            body.append(line)
+    
+    if body or title != INTRODUCTION:
+        factors.append((title, '\n'.join(body)))
+    
+    return factors
+
+
+if __name__ == "__main__":
+    sample = """
+    Item 1A. Risk Factors
+    The following risks could materially affect our business. Investors should consider them carefully.
+    Risks Related to Our Business
+    We depend on a small number of suppliers for key components.
+    Many of our components come from single-source suppliers in Asia. Any disruption at these suppliers, whether caused by natural disasters, trade restrictions or financial difficulty, could delay our products.
+    Cybersecurity incidents could harm our reputation and results.
+    We store sensitive customer data. A breach of our systems or those of our vendors could expose that data, lead to litigation and regulatory penalties, and damage customer trust.
+    """
+    for title, body in segment_risk_factors(sample):
+        print(f"- {title} ({len(body)} chars)")
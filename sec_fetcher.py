@@ -11,6 +11,12 @@ from typing import Dict, List, Optional, Tuple
 import re
 from datetime import datetime
 
+from stage_cache import StageCache
+from table_parser import mark_tables, split_tables
+
+# Bump when section/table extraction changes, so cached sections are re-extracted
+EXTRACTION_VERSION = '1'
+
 # Import local cache
 try:
     from local_cache import get_cache
@@ -18,11 +24,19 @@ try:
 except ImportError:
     CACHE_AVAILABLE = False
 
+# Import cross-filer boilerplate index
+try:
+    from boilerplate_index import get_boilerplate_index
+    BOILERPLATE_INDEX_AVAILABLE = True
+except ImportError:
+    BOILERPLATE_INDEX_AVAILABLE = False
+
 class SECFetcher:
     """Handles fetching and parsing of SEC 10-K filings"""
     
     BASE_URL = "https://www.sec.gov"
     RATE_LIMIT_DELAY = 0.2  # SEC allows 10 requests/second, using 5/second to be safe
+    TABLE_SECTIONS = {'Item 7', 'Item 8'}  # Tables parsed into grids and diffed cell by cell
     
     # Required headers for SEC EDGAR API  
     # SEC requires proper User-Agent with contact information
@@ -32,9 +46,18 @@ class SECFetcher:
         'Host': 'www.sec.gov'
     }
     
-    def __init__(self, use_cache: bool = True):
+    def __init__(self, use_cache: bool = True, index_boilerplate: bool = True, section_store=None):
+        """
+        Args:
+            use_cache: Cache HTML and extracted sections on local disk
+            index_boilerplate: Feed extracted filings to the boilerplate index
+            section_store: Optional SupabaseClient. Sections extracted for any
+                           earlier report are read back from it by accession,
+                           so a new year's report only processes the new filing.
+        """
         self.session = requests.Session()
         self.session.headers.update(self.HEADERS)
+        self._parsed_document = None
         self.use_cache = use_cache and CACHE_AVAILABLE
         
         if self.use_cache:
@@ -44,6 +67,16 @@ class SECFetcher:
             self.cache = None
             if use_cache and not CACHE_AVAILABLE:
                 print("⚠ Cache requested but local_cache module not available")
+        
+        # Extracted sections are reused per accession (see EXTRACTION_VERSION)
+        self.stages = StageCache(self.cache)
+        self.section_store = section_store
+        
+        # Every filing we extract feeds the cross-filer boilerplate index
+        if index_boilerplate and BOILERPLATE_INDEX_AVAILABLE:
+            self.boilerplate_index = get_boilerplate_index()
+        else:
+            self.boilerplate_index = None
     
     def get_company_cik(self, ticker: str) -> Optional[str]:
         """
@@ -105,6 +138,7 @@ class SECFetcher:
             filings = []
             forms = recent.get('form', [])
             filing_dates = recent.get('filingDate', [])
+            report_dates = recent.get('reportDate', [])
             accession_numbers = recent.get('accessionNumber', [])
             primary_documents = recent.get('primaryDocument', [])
             company_name = data.get('name', 'Unknown')
@@ -131,10 +165,15 @@ class SECFetcher:
                     primary_doc = primary_documents[i]
                     doc_url = f"https://www.sec.gov/Archives/edgar/data/{cik_unpadded}/{accession_no_hyphens}/{primary_doc}"
                     
+                    filing_date = datetime.strptime(filing_dates[i], '%Y-%m-%d').date()
+                    report_date = report_dates[i] if i < len(report_dates) else ''
+                    
                     filings.append({
                         'accession': accession,
                         'accession_no_hyphens': accession_no_hyphens,
-                        'filing_date': datetime.strptime(filing_dates[i], '%Y-%m-%d').date(),
+                        'filing_date': filing_date,
+                        'report_date': report_date,
+                        'fiscal_year': self._fiscal_year(report_date, filing_date),
                         'company_name': company_name,
                         'filing_url': doc_url,
                         'cik': cik_unpadded,
@@ -150,6 +189,16 @@ class SECFetcher:
             print(f"Error fetching 10-K filings for CIK {cik}: {e}")
             return []
     
+    def _fiscal_year(self, report_date: str, filing_date) -> int:
+        """
+        Fiscal year of a 10-K: the year its reporting period ends
+        Falls back to the year before filing (10-Ks are filed within ~90 days)
+        """
+        try:
+            return datetime.strptime(report_date, '%Y-%m-%d').year
+        except (TypeError, ValueError):
+            return filing_date.year - 1
+    
     def _get_filings_html_fallback(self, cik: str, count: int = 2) -> List[Dict]:
         """
         Fallback method to get filings by parsing HTML instead of XML
@@ -214,6 +263,7 @@ class SECFetcher:
                     'accession': accession,
                     'accession_no_hyphens': accession_no_hyphens,
                     'filing_date': filing_date,
+                    'fiscal_year': self._fiscal_year('', filing_date),
                     'company_name': 'Unknown',  # Not in this view
                     'filing_url': filing_url,
                     'needs_doc_page_fetch': True
@@ -341,9 +391,53 @@ class SECFetcher:
         
         return None
     
+    def _parse_document(self, html_content: str) -> Tuple[str, List[Optional[Dict]]]:
+        """
+        Parse a 10-K once: text with table sentinels, plus the parsed table grids
+        Remembers the last document, since every section is cut from the same one
+        """
+        if self._parsed_document and self._parsed_document[0] is html_content:
+            return self._parsed_document[1], self._parsed_document[2]
+        
+        soup = BeautifulSoup(html_content, 'html.parser')
+        tables = mark_tables(soup)
+        all_text = soup.get_text()
+        
+        self._parsed_document = (html_content, all_text, tables)
+        return all_text, tables
+    
     def extract_section(self, html_content: str, section_name: str) -> Optional[str]:
+        """Extract a section's text (tables of Items 7 and 8 removed, see extract_section_with_tables)"""
+        text, _ = self.extract_section_with_tables(html_content, section_name)
+        return text
+    
+    def extract_section_with_tables(self, html_content: str,
+                                    section_name: str) -> Tuple[Optional[str], List[Dict]]:
         """
-        Extract a specific section from 10-K HTML
+        Extract a section and, for Items 7 and 8, its numeric tables
+        
+        Tables in Items 7 and 8 are returned as row/column grids and taken
+        out of the narrative text, so they can be diffed cell by cell.
+        Other sections keep their table text inline.
+        
+        Returns:
+            (section text or None, list of table grids)
+        """
+        section_text = self._extract_marked_section(html_content, section_name)
+        if not section_text:
+            return None, []
+        
+        text, tables = split_tables(
+            section_text, self._parse_document(html_content)[1],
+            keep_tables=section_name not in self.TABLE_SECTIONS
+        )
+        if tables:
+            print(f"    Parsed {len(tables)} tables")
+        return text.strip(), tables
+    
+    def _extract_marked_section(self, html_content: str, section_name: str) -> Optional[str]:
+        """
+        Extract a specific section from 10-K HTML (text still has table sentinels)
         
         Strategy: Find ALL occurrences of the section marker, then pick the one
         with the most content between it and the next section. The real section
@@ -354,7 +448,7 @@ class SECFetcher:
         - Item 7: MD&A content must be at least 10K chars to avoid TOC entries
         """
         # Get all text
-        all_text = BeautifulSoup(html_content, 'html.parser').get_text()
+        all_text, _ = self._parse_document(html_content)
         all_text_lower = all_text.lower()
         
         # Special handling for Item 8 - Financial Statements
@@ -638,10 +732,13 @@ class SECFetcher:
         
         return section_text
     
-    def get_10k_sections(self, ticker: str) -> List[Dict]:
+    def get_10k_sections(self, ticker: str, count: int = 2) -> List[Dict]:
         """
-        Main method: Get the last 2 10-Ks for a ticker and extract all relevant sections
-        Returns list of dicts with filing metadata and extracted sections
+        Main method: Get the last `count` 10-Ks for a ticker and extract all relevant sections
+        Returns list of dicts with filing metadata and extracted sections (newest first)
+        
+        Each filing is extracted once, so with count > 2 (history mode) every
+        filing is shared by the two consecutive comparisons it belongs to.
         """
         print(f"\n{'='*60}")
         print(f"Fetching 10-K data for {ticker}")
@@ -654,8 +751,8 @@ class SECFetcher:
         
         print(f"CIK: {cik}")
         
-        # Get latest 2 10-K filings
-        filings = self.get_latest_10k_filings(cik, count=2)
+        # Get latest 10-K filings
+        filings = self.get_latest_10k_filings(cik, count=count)
         
         if len(filings) < 2:
             print(f"Need at least 2 10-K filings, found {len(filings)}")
@@ -673,41 +770,101 @@ class SECFetcher:
         for filing in filings:
             print(f"\nProcessing filing from {filing['filing_date']}...")
             
-            needs_index = filing.get('needs_index_parsing', False)
-            accession = filing.get('accession_no_hyphens')
-            cik = filing.get('cik')
-            
-            html_content = self.fetch_10k_html(
-                filing['filing_url'], 
-                needs_index_parsing=needs_index,
-                accession_no_hyphens=accession,
-                cik=cik
+            # A filing never changes once filed: only the extraction code can
+            extracted = self.stages.run(
+                'sections', EXTRACTION_VERSION,
+                {'accession': filing['accession'], 'sections': sections_to_extract},
+                lambda: self._load_or_extract_filing(filing, sections_to_extract, ticker),
+                should_store=lambda result: bool(result and result['sections'])
             )
-            
-            if not html_content:
-                print("  Failed to fetch HTML content")
+            if not extracted:
                 continue
             
-            print(f"  Successfully fetched HTML ({len(html_content):,} characters)")
-            
-            sections = {}
-            for section_name in sections_to_extract:
-                print(f"  Extracting {section_name}...", end=' ')
-                content = self.extract_section(html_content, section_name)
-                
-                if content:
-                    word_count = len(content.split())
-                    print(f"✓ ({word_count} words)")
-                    sections[section_name] = content
-                else:
-                    print("✗ Failed")
+            sections = extracted['sections']
+            if self.boilerplate_index and sections:
+                if self.boilerplate_index.add_filing(filing.get('accession'), filing.get('cik'), sections,
+                                                     fiscal_year=filing.get('fiscal_year')):
+                    print(f"  ✓ Added to boilerplate index")
             
             filing_data = filing.copy()
             filing_data['sections'] = sections
+            filing_data['tables'] = extracted['tables']
             results.append(filing_data)
         
         return results
-
+    
+    def _load_or_extract_filing(self, filing: Dict, sections_to_extract: List[str],
+                                ticker: str) -> Optional[Dict]:
+        """
+        Sections of a filing from the durable store, or freshly extracted
+        
+        Last year's newer filing is this year's older one, so for companies
+        we cover every year only the new filing is fetched and parsed.
+        """
+        if self.section_store is not None:
+            try:
+                stored = self.section_store.get_filing_sections(filing['accession'], EXTRACTION_VERSION)
+            except Exception as e:
+                print(f"  ⚠ Could not read stored sections: {e}")
+                stored = None
+            
+            if stored and stored['sections']:
+                print(f"  ✓ Reusing {len(stored['sections'])} sections extracted for an earlier report")
+                return stored
+        
+        extracted = self._extract_filing(filing, sections_to_extract)
+        
+        if self.section_store is not None and extracted and extracted['sections']:
+            try:
+                self.section_store.save_filing_sections(
+                    filing['accession'], EXTRACTION_VERSION, ticker,
+                    extracted['sections'], extracted['tables']
+                )
+            except Exception as e:
+                print(f"  ⚠ Could not store sections: {e}")
+        
+        return extracted
+    
+    def _extract_filing(self, filing: Dict, sections_to_extract: List[str]) -> Optional[Dict]:
+        """
+        Fetch one filing's HTML and extract its sections and tables
+        
+        Returns:
+            {'sections': {...}, 'tables': {...}} or None if the HTML could not be fetched
+        """
+        needs_index = filing.get('needs_index_parsing', False)
+        accession = filing.get('accession_no_hyphens')
+        cik = filing.get('cik')
+        
+        html_content = self.fetch_10k_html(
+            filing['filing_url'], 
+            needs_index_parsing=needs_index,
+            accession_no_hyphens=accession,
+            cik=cik
+        )
+        
+        if not html_content:
+            print("  Failed to fetch HTML content")
+            return None
+        
+        print(f"  Successfully fetched HTML ({len(html_content):,} characters)")
+        
+        sections = {}
+        tables = {}
+        for section_name in sections_to_extract:
+            print(f"  Extracting {section_name}...", end=' ')
+            content, section_tables = self.extract_section_with_tables(html_content, section_name)
+            
+            if content:
+                word_count = len(content.split())
+                print(f"✓ ({word_count} words)")
+                sections[section_name] = content
+                if section_tables:
+                    tables[section_name] = section_tables
+            else:
+                print("✗ Failed")
+        
+        return {'sections': sections, 'tables': tables}
 
 if __name__ == "__main__":
     # Test with a few companies
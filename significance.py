@@ -0,0 +1,149 @@
+"""
+Change Significance Module
+Scores diff hunks so that a fixed size budget keeps the most material changes
+
+Used instead of cutting content at the first N characters:
+- DiffAnalyzer fills a per-section character budget with the best hunks
+- AIAnalyzer applies the same ranking if content still exceeds its limit
+"""
+
+import math
+import re
+from typing import List, Tuple
+
+from text_fingerprint import shingles
+
+
+# Words that usually mark a disclosure an investor cares about
+RISK_KEYWORDS = [
+    'litigation', 'lawsuit', 'investigation', 'subpoena', 'settlement', 'penalty', 'fine',
+    'impairment', 'write-down', 'restatement', 'material weakness', 'going concern',
+    'default', 'covenant', 'bankruptcy', 'restructuring', 'layoff', 'workforce reduction',
+    'cybersecurity', 'breach', 'ransomware', 'outage',
+    'tariff', 'sanction', 'export control', 'embargo', 'regulation', 'regulatory',
+    'acquisition', 'divestiture', 'merger', 'spin-off', 'discontinued',
+    'recall', 'shortage', 'supply chain', 'concentration', 'dependence',
+    'decline', 'decrease', 'increase', 'loss', 'guidance', 'downgrade',
+    'chief executive', 'chief financial', 'resigned', 'appointed', 'board of directors',
+]
+
+_KEYWORD_PATTERN = re.compile(r'\b(' + '|'.join(re.escape(k) for k in RISK_KEYWORDS) + r')', re.IGNORECASE)
+_NUMBER_PATTERN = re.compile(r'\$?\d[\d,]*(?:\.\d+)?%?')
+
+# Relative weight of each signal in the final score
+NOVELTY_WEIGHT = 2.0
+NUMERIC_WEIGHT = 1.0
+SIZE_WEIGHT = 0.5
+KEYWORD_WEIGHT = 1.5
+
+# An oversized top hunk is only cut down to a window if at least this much fits
+MIN_WINDOW_CHARS = 200
+
+
+def score_hunk(hunk: str, reference_shingles: set) -> float:
+    """
+    Score one hunk (a changed paragraph or span)
+    
+    Signals:
+    - novelty: share of its word 3-grams not found on the other side of the diff
+    - numeric content: how many figures it contains
+    - size: longer hunks carry more information (log-scaled)
+    - risk keywords: litigation, impairment, tariffs, leadership changes, ...
+    """
+    hunk_shingles = shingles(hunk)
+    if hunk_shingles:
+        novelty = len(hunk_shingles - reference_shingles) / len(hunk_shingles)
+    else:
+        novelty = 0.0
+    
+    numbers = len(_NUMBER_PATTERN.findall(hunk))
+    keywords = len(_KEYWORD_PATTERN.findall(hunk))
+    
+    return (
+        NOVELTY_WEIGHT * novelty
+        + NUMERIC_WEIGHT * min(numbers, 10) / 10
+        + SIZE_WEIGHT * math.log10(len(hunk) + 1)
+        + KEYWORD_WEIGHT * min(keywords, 4) / 4
+    )
+
+
+def best_window(hunk: str, size: int, reference_shingles: set) -> str:
+    """
+    Highest-scoring slice of an oversized hunk, marked with '…' where cut
+    
+    Used when a single hunk (often a whole table or paragraph that
+    get_text() returned as one line) is larger than the budget on its own.
+    """
+    if len(hunk) <= size:
+        return hunk
+    
+    size = max(size - 4, 1)  # Room for the '… ' / ' …' markers
+    step = max(size // 4, 1)
+    starts = list(range(0, len(hunk) - size, step)) + [len(hunk) - size]
+    start = max(starts, key=lambda i: (score_hunk(hunk[i:i + size], reference_shingles), -i))
+    
+    window = hunk[start:start + size]
+    prefix = '… ' if start > 0 else ''
+    suffix = ' …' if start + size < len(hunk) else ''
+    return prefix + window + suffix
+
+
+def select_hunks(hunks: List[str], char_budget: int, reference: str = '') -> Tuple[List[str], int, int, float]:
+    """
+    Greedily fill a character budget with the highest-scoring hunks
+    
+    If the top-ranked hunk is larger than the budget by itself, its
+    highest-scoring window is kept instead of dropping it (half the budget
+    when other hunks are competing for the rest).
+    
+    Args:
+        hunks: Changed paragraphs/spans in document order
+        char_budget: Maximum total characters to keep
+        reference: Text from the other side of the diff (used for novelty)
+    
+    Returns:
+        (selected hunks in original order, number omitted, number truncated,
+        total score of all hunks)
+    """
+    hunks = [h for h in hunks if h.strip()]
+    reference_shingles = shingles(reference) if reference else set()
+    scores = [score_hunk(h, reference_shingles) for h in hunks]
+    total_score = sum(scores)
+    
+    if sum(len(h) + 1 for h in hunks) <= char_budget:
+        return hunks, 0, 0, total_score
+    
+    # Best first; ties keep document order so results are deterministic
+    ranked = sorted(range(len(hunks)), key=lambda i: (-scores[i], i))
+    
+    chosen = {}
+    remaining = char_budget
+    for rank, i in enumerate(ranked):
+        size = len(hunks[i]) + 1
+        if size <= remaining:
+            chosen[i] = hunks[i]
+            remaining -= size
+        elif rank == 0:
+            window_size = char_budget // 2 if len(hunks) > 1 else char_budget
+            if window_size >= MIN_WINDOW_CHARS:
+                chosen[i] = best_window(hunks[i], window_size - 1, reference_shingles)
+                remaining -= len(chosen[i]) + 1
+    
+    selected = [chosen[i] for i in sorted(chosen)]
+    truncated = sum(1 for i in chosen if chosen[i] is not hunks[i])
+    return selected, len(hunks) - len(selected), truncated, total_score
+
+
+def fit_to_budget(text: str, char_budget: int, reference: str = '') -> str:
+    """
+    Trim newline-separated hunks to a budget by significance
+    Returns text unchanged if it already fits
+    """
+    if len(text) <= char_budget:
+        return text
+    
+    selected, omitted, _, _ = select_hunks(text.split('\n'), char_budget, reference)
+    result = '\n'.join(selected)
+    if omitted:
+        result += f"\n\n[... {omitted} lower-significance changes omitted ...]"
+    return result
@@ -0,0 +1,97 @@
+"""
+Stage Cache Module
+Build-system style reuse of pipeline stage outputs
+
+Every stage (sections, diffs, AI summaries, validation) stores its output
+under a key derived from its inputs and a version tag owned by the code
+that produces it. Bumping a version (e.g. PROMPT_VERSION after a prompt
+tweak) invalidates that stage and everything keyed on its output, while
+earlier stages are still served from the cache.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Optional
+
+
+class StageCache:
+    """Versioned stage artifacts on top of LocalCache's artifact store"""
+    
+    def __init__(self, store=None):
+        """
+        Args:
+            store: LocalCache (or anything with get_artifact/save_artifact).
+                   None disables caching - every stage is recomputed.
+        """
+        self.store = store
+        self.hits = []
+        self.misses = []
+    
+    def key(self, stage: str, version: str, inputs: Any) -> str:
+        """Stable key for a stage run: stage name, code version and inputs"""
+        payload = json.dumps([stage, version, inputs], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def get(self, stage: str, key: str) -> Optional[Any]:
+        if self.store is None:
+            return None
+        return self.store.get_artifact(f'stage-{stage}', key)
+    
+    def put(self, stage: str, key: str, value: Any):
+        if self.store is not None:
+            self.store.save_artifact(f'stage-{stage}', key, value)
+    
+    def run(self, stage: str, version: str, inputs: Any, compute: Callable[[], Any],
+            should_store: Callable[[Any], bool] = bool,
+            on_hit: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        Return the stored output for these inputs, or compute and store it
+        
+        Args:
+            stage: Stage name ('sections', 'ai', 'validation', ...)
+            version: Code version tag of the stage
+            inputs: JSON-serializable inputs (or digests of them)
+            compute: Produces the output on a miss
+            should_store: Outputs failing this check (e.g. failed
+                          extractions) are returned but not cached
+            on_hit: Applied to a reused output before returning it
+                    (e.g. to zero the cost of reused AI summaries)
+        """
+        key = self.key(stage, version, inputs)
+        cached = self.get(stage, key)
+        if cached is not None:
+            self.hits.append(stage)
+            print(f"    ✓ Reused {stage} (version {version})")
+            return on_hit(cached) if on_hit else cached
+        
+        self.misses.append(stage)
+        value = compute()
+        if should_store(value):
+            self.put(stage, key, value)
+        return value
+
+
+def digest(value: Any) -> str:
+    """Short content digest of any JSON-serializable value (for use as a stage input)"""
+    payload = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+
+if __name__ == "__main__":
+    import shutil
+    from local_cache import LocalCache
+    
+    stages = StageCache(LocalCache('./test_stage_cache'))
+    calls = []
+    
+    def compute():
+        calls.append(1)
+        return {'summary': 'computed'}
+    
+    stages.run('ai', '1', {'diff': 'abc'}, compute)
+    stages.run('ai', '1', {'diff': 'abc'}, compute)   # Same inputs and version: reused
+    stages.run('ai', '2', {'diff': 'abc'}, compute)   # Version bumped: recomputed
+    print(f"Computed {len(calls)} times (expected 2)")
+    
+    shutil.rmtree('./test_stage_cache')
+    print("Test cache cleaned up")
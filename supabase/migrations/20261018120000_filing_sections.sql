@@ -0,0 +1,17 @@
+-- Sections extracted from each filing, so later reports on the same filing
+-- skip the EDGAR fetch and extraction (SupabaseClient.get_filing_sections /
+-- save_filing_sections). One row per filing and extraction version.
+create table if not exists public.filing_sections (
+    accession text not null,
+    extraction_version text not null,
+    ticker text not null,
+    sections jsonb not null,
+    tables jsonb not null default '{}'::jsonb,
+    created_at timestamptz not null default now(),
+    primary key (accession, extraction_version)
+);
+
+create index if not exists filing_sections_ticker_idx on public.filing_sections (ticker);
+
+-- Only the worker (service role, which bypasses RLS) reads and writes it
+alter table public.filing_sections enable row level security;
@@ -0,0 +1,4 @@
+-- What reused (cached) AI responses originally cost, next to ai_cost_usd
+-- (what the report actually spent). Written on every report insert.
+alter table public.reports
+    add column if not exists ai_cost_cached_usd numeric not null default 0;
@@ -0,0 +1,183 @@
+"""
+Table Parser Module
+Parses 10-K HTML tables into row/column grids
+
+get_text() flattens a table into a run of cell strings, losing which figure
+belongs to which row and period. The fetcher marks every table in the text
+with sentinels and parses it into a grid here, so Items 7 and 8 can carry
+their tables separately from the narrative and be diffed cell by cell.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from numeric_delta import detect_scale
+
+
+# Sentinels placed around each top-level table before get_text()
+TABLE_START = '\u27e6TABLE {}\u27e7'
+TABLE_END = '\u27e6/TABLE\u27e7'
+_MARKED_TABLE = re.compile('\u27e6TABLE (\\d+)\u27e7(.*?)\u27e6/TABLE\u27e7', re.DOTALL)
+_STRAY_MARKER = re.compile('\u27e6/?TABLE(?: \\d+)?\u27e7')
+
+_FIGURE = re.compile(r'\(?\$?\s*\d[\d,]*(?:\.\d+)?\s*\)?\s*%?|[—–-]+')
+_YEAR_CELL = re.compile(r'(?:19|20)\d\d')
+
+
+def _is_figure(cell: str) -> bool:
+    return bool(_FIGURE.fullmatch(cell))
+
+
+def _merge_cells(cells: List[str]) -> List[str]:
+    """
+    Drop spacer cells and glue split symbols back onto their figures
+    ("$" | "1,234" -> "$1,234", "(12" | ")" -> "(12)", "4.5" | "%" -> "4.5%")
+    """
+    merged = []
+    pending = ''
+    for cell in cells:
+        cell = re.sub(r'\s+', ' ', cell).strip()
+        if not cell:
+            continue
+        if cell in ('$', '('):
+            pending += cell
+            continue
+        if cell in (')', '%', ')%') and merged:
+            merged[-1] += cell
+            continue
+        merged.append(pending + cell)
+        pending = ''
+    return merged
+
+
+def parse_table(table) -> Optional[Dict]:
+    """
+    Parse a BeautifulSoup <table> into a grid
+    
+    Returns:
+        {'columns': [period headers], 'rows': {row label: {column: value}},
+         'scale': 'millions' | 'thousands' | ...} or None for tables that
+        are not numeric (layout tables, tables of contents, signatures)
+    """
+    header = []
+    rows = {}
+    
+    for tr in table.find_all('tr'):
+        cells = _merge_cells([cell.get_text(' ', strip=True) for cell in tr.find_all(['td', 'th'])])
+        if not cells:
+            continue
+        
+        label, values = cells[0], cells[1:]
+        is_period_header = all(_YEAR_CELL.fullmatch(v) for v in values)
+        if values and not is_period_header and not _is_figure(label) and all(_is_figure(v) for v in values):
+            # Repeated labels ("Total", "Other") get a position suffix
+            key = label
+            n = 2
+            while key in rows:
+                key = f'{label} ({n})'
+                n += 1
+            rows[key] = values
+        elif not rows:
+            header.append(cells)
+    
+    if len(rows) < 2:
+        return None
+    
+    width = max(len(values) for values in rows.values())
+    
+    # Period headers: the last header row with a cell for every column
+    columns = [f'column {k + 1}' for k in range(width)]
+    for cells in reversed(header):
+        if len(cells) >= width:
+            columns = cells[-width:]
+            break
+    
+    # Segment tables repeat period headers ("2024 ... 2024")
+    seen = {}
+    for k, column in enumerate(columns):
+        seen[column] = seen.get(column, 0) + 1
+        if seen[column] > 1:
+            columns[k] = f'{column} ({seen[column]})'
+    
+    # Short rows (subtotals, blanks in early periods) align to the right
+    grid = {}
+    for label, values in rows.items():
+        offset = width - len(values)
+        grid[label] = {columns[offset + k]: value for k, value in enumerate(values)}
+    
+    return {
+        'columns': columns,
+        'rows': grid,
+        'scale': detect_scale(table.get_text(' '))
+    }
+
+
+def mark_tables(soup) -> List[Optional[Dict]]:
+    """
+    Parse every top-level table and wrap it in sentinels in the soup
+    
+    Returns:
+        Parsed grids, indexed by the number in each TABLE_START marker
+        (None for tables that are not numeric)
+    """
+    tables = []
+    for table in soup.find_all('table'):
+        if table.find_parent('table') is not None:
+            continue  # Nested tables are part of their parent
+        tables.append(parse_table(table))
+        table.insert_before(f'\n{TABLE_START.format(len(tables) - 1)}\n')
+        table.insert_after(f'\n{TABLE_END}\n')
+    return tables
+
+
+def split_tables(section_text: str, tables: List[Optional[Dict]],
+                 keep_tables: bool) -> Tuple[str, List[Dict]]:
+    """
+    Separate a section's narrative from its tables
+    
+    Args:
+        section_text: Section text containing table sentinels
+        tables: Grids returned by mark_tables for the same document
+        keep_tables: True to leave table text inline (just drop the sentinels)
+    
+    Returns:
+        (text, grids of the numeric tables that were taken out). Each grid
+        gets a 'title': the last non-empty line of text before the table.
+    """
+    taken = []
+    
+    def replace(match):
+        idx = int(match.group(1))
+        table = tables[idx] if idx < len(tables) else None
+        if keep_tables or table is None:
+            return match.group(2)
+        
+        before = match.string[max(0, match.start() - 300):match.start()]
+        lines = [line.strip() for line in before.split('\n') if line.strip()]
+        taken.append(dict(table, title=lines[-1][:120] if lines else ''))
+        return '\n'
+    
+    text = _MARKED_TABLE.sub(replace, section_text)
+    # A section boundary can cut through a table and leave one sentinel
+    text = _STRAY_MARKER.sub('', text)
+    return text, taken
+
+
+if __name__ == "__main__":
+    from bs4 import BeautifulSoup
+    
+    html = """
+    <p>Consolidated Statements of Operations (in millions)</p>
+    <table>
+      <tr><td></td><td>2024</td><td></td><td>2023</td></tr>
+      <tr><td>Net sales</td><td>$</td><td>391,035</td><td>$</td><td>383,285</td></tr>
+      <tr><td>Cost of sales</td><td>210,352</td><td>214,137</td></tr>
+      <tr><td>Net loss</td><td>(1,200</td><td>)</td><td>(900</td><td>)</td></tr>
+    </table>
+    <p>Revenue grew due to services.</p>
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    tables = mark_tables(soup)
+    text, taken = split_tables(soup.get_text(), tables, keep_tables=False)
+    print(f"Narrative: {' '.join(text.split())}")
+    print(f"Tables: {taken}")
@@ -0,0 +1,33 @@
+"""Shared fixtures: the repo's modules are flat, so tests import them from the root"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from anthropic_stub import StubAnthropicServer  # noqa: E402
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    """
+    Start a StubAnthropicServer and point the SDK at it
+    
+    Yields (server, api_key). The key is unique to this server: get_client
+    pools one client per key for the process, so a shared key would reuse a
+    client bound to an earlier test's (stopped) server.
+    """
+    servers = []
+    
+    def start(**options):
+        server = StubAnthropicServer(**options).start()
+        servers.append(server)
+        monkeypatch.setenv('ANTHROPIC_BASE_URL', server.base_url)
+        return server, f'stub-key-{server.base_url}'
+    
+    yield start
+    
+    for server in servers:
+        server.stop()
@@ -0,0 +1,140 @@
+"""AIAnalyzer.analyze_batch and ValidationPipeline.run_batch_analysis against the local stub API"""
+
+import pytest
+
+import ai_analyzer
+from ai_analyzer import AIAnalyzer, SECTION_NAMES
+from local_cache import LocalCache
+
+
+DIFF_RESULTS = {
+    'Item 1A': {
+        'has_meaningful_changes': True,
+        'added_content': 'New risk factor: tariffs on imported components could raise costs.',
+        'removed_content': '',
+        'significance': 12.0
+    }
+}
+
+
+def make_pairs(tickers):
+    return {
+        ticker: {'company_name': f'{ticker} Inc.', 'ticker': ticker, 'old_date': '2023-02-01',
+                 'new_date': '2024-02-01', 'diff_results': DIFF_RESULTS}
+        for ticker in tickers
+    }
+
+
+def batch_posts(server):
+    return [call for call in server.calls if call[0] == 'POST' and call[1] == '/v1/messages/batches']
+
+
+def statuses(result):
+    return {section['section']: section['status'] for section in result['sections']}
+
+
+def test_batch_results_map_back_to_callers_keys(stub_api):
+    server, api_key = stub_api(polls_until_ended=2)
+    results = AIAnalyzer(api_key=api_key).analyze_batch(make_pairs(['AAPL', 'BRK.B', 'XOM']), poll_interval=0)
+    
+    # The stub returns results in reverse order; keys and order follow the input
+    assert list(results) == ['AAPL', 'BRK.B', 'XOM']
+    for ticker, result in results.items():
+        assert result['ticker'] == ticker
+        assert set(statuses(result).values()) == {'analyzed'}
+        assert result['total_cost_usd'] > 0
+        assert result['total_tokens'] > 0
+    
+    # One submission on the beta path, polled until it ended, then one results download
+    assert len(batch_posts(server)) == 1
+    assert {beta for _, path, beta in server.calls if '/batches' in path} == {'message-batches-2024-09-24'}
+    polls = [path for method, path, _ in server.calls if method == 'GET' and path.count('/') == 4]
+    assert len(polls) >= 2
+    assert sum(1 for _, path, _ in server.calls if path.endswith('/results')) == 1
+
+
+def test_errored_and_expired_entries_become_error_results(stub_api):
+    # custom_ids follow submission order: pair-0 AAPL, pair-1 BRK.B, pair-2 XOM
+    server, api_key = stub_api(failing_ids={'pair-1'}, expired_ids={'pair-2'})
+    results = AIAnalyzer(api_key=api_key).analyze_batch(make_pairs(['AAPL', 'BRK.B', 'XOM']), poll_interval=0)
+    
+    assert set(statuses(results['AAPL']).values()) == {'analyzed'}
+    
+    errored = results['BRK.B']
+    assert set(statuses(errored).values()) == {'error'}
+    assert 'errored' in errored['sections'][0]['summary']
+    assert 'Overloaded' in errored['sections'][0]['summary']
+    assert errored['total_cost_usd'] == 0.0
+    
+    expired = results['XOM']
+    assert set(statuses(expired).values()) == {'error'}
+    assert 'expired' in expired['sections'][0]['summary']
+
+
+def test_batch_that_does_not_end_is_canceled(stub_api):
+    server, api_key = stub_api(polls_until_ended=1000)
+    results = AIAnalyzer(api_key=api_key).analyze_batch(make_pairs(['AAPL']), poll_interval=0, max_wait=0)
+    
+    assert set(statuses(results['AAPL']).values()) == {'error'}
+    assert any(path.endswith('/cancel') for _, path, _ in server.calls)
+
+
+def test_cached_pairs_are_not_resubmitted(stub_api, tmp_path):
+    server, api_key = stub_api()
+    analyzer = AIAnalyzer(api_key=api_key, response_cache=LocalCache(str(tmp_path)))
+    
+    first = analyzer.analyze_batch(make_pairs(['AAPL']), poll_interval=0)
+    assert len(batch_posts(server)) == 1
+    
+    # AAPL is answered from the response cache; only MSFT is submitted
+    second = analyzer.analyze_batch(make_pairs(['AAPL', 'MSFT']), poll_interval=0)
+    posts = batch_posts(server)
+    assert len(posts) == 2
+    assert [section['summary'] for section in second['AAPL']['sections']] == \
+        [section['summary'] for section in first['AAPL']['sections']]
+    assert second['AAPL']['total_cost_usd'] == 0.0
+    assert second['AAPL']['cached_cost_usd'] == first['AAPL']['total_cost_usd']
+    
+    # Everything cached: nothing is submitted at all
+    analyzer.analyze_batch(make_pairs(['AAPL', 'MSFT']), poll_interval=0)
+    assert len(batch_posts(server)) == 2
+
+
+def test_run_batch_analysis_uses_one_message_batch(stub_api, tmp_path, monkeypatch):
+    validation_pipeline = pytest.importorskip('validation_pipeline')
+    server, api_key = stub_api(failing_ids={'pair-1'})
+    
+    def filing(ticker, year, risk):
+        return {
+            'company_name': f'{ticker} Inc.',
+            'accession': f'{ticker}-{year}',
+            'filing_date': f'{year + 1}-02-01',
+            'filing_url': f'https://example.com/{ticker}/{year}',
+            'fiscal_year': year,
+            'sections': {name: f'{name} overview.\n\n{risk}' for name in SECTION_NAMES},
+            'tables': {}
+        }
+    
+    filings = {
+        ticker: [filing(ticker, 2024, 'Tariffs on imported components may raise costs materially.'),
+                 filing(ticker, 2023, 'Tariffs were not a significant risk.')]
+        for ticker in ['AAPL', 'XOM']
+    }
+    filings['NEWCO'] = [filing('NEWCO', 2024, 'First filing.')]
+    
+    monkeypatch.setattr(ai_analyzer, 'AI_BATCH_POLL_SECONDS', 0)  # run_batch_analysis uses the default
+    pipeline = validation_pipeline.ValidationPipeline(api_key=api_key)
+    monkeypatch.setattr(pipeline.fetcher, 'get_10k_sections', lambda ticker: filings[ticker])
+    pipeline.diff_analyzer.result_cache = None
+    pipeline.ai_analyzer.response_cache = LocalCache(str(tmp_path))
+    
+    results = pipeline.run_batch_analysis(['AAPL', 'NEWCO', 'XOM'], use_batches=True)
+    by_ticker = {result['ticker']: result for result in results['results']}
+    
+    assert [result['ticker'] for result in results['results']] == ['AAPL', 'NEWCO', 'XOM']
+    assert by_ticker['NEWCO']['status'] == 'error'
+    assert by_ticker['AAPL']['status'] == 'success'
+    assert by_ticker['AAPL']['newer_filing']['accession'] == 'AAPL-2024'
+    # XOM went out second (pair-1), which the stub fails
+    assert set(statuses(by_ticker['XOM']).values()) == {'error'}
+    assert len(batch_posts(server)) == 1
@@ -0,0 +1,265 @@
+"""
+Text Fingerprint Module
+Normalization and hashing helpers for comparing paragraphs across filings
+"""
+
+import hashlib
+import re
+import zlib
+from typing import List, Optional, Set, Tuple
+
+
+_WHITESPACE = re.compile(r'\s+')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+def normalize_paragraph(paragraph: str) -> str:
+    """
+    Normalize a paragraph for comparison
+    - Collapse all whitespace runs to a single space
+    - Lowercase (case-only edits are never material)
+    """
+    return _WHITESPACE.sub(' ', paragraph).strip().lower()
+
+
+def paragraph_hash(paragraph: str) -> str:
+    """Stable 64-bit hash (hex) of a normalized paragraph"""
+    return hashlib.blake2b(normalize_paragraph(paragraph).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split text on blank lines, dropping empty paragraphs"""
+    return [p for p in _PARAGRAPH_BREAK.split(text) if p.strip()]
+
+
+# Rolling hash parameters (polynomial hash modulo a Mersenne prime)
+_ROLL_BASE = 1_000_003
+_ROLL_MOD = (1 << 61) - 1
+
+
+def content_defined_chunks(paragraphs: List[str], target_size: int,
+                           avg_paragraph_size: float, window: int = 4,
+                           keys: Optional[List[str]] = None) -> List[str]:
+    """
+    Group paragraphs into chunks whose boundaries depend on content, not position
+    
+    A rolling hash runs over the hashes of the last `window` paragraphs. A chunk
+    ends wherever that hash hits a boundary value. Inserting or deleting a
+    paragraph only moves the boundaries next to it; further on, both versions
+    cut at the same places again, so unchanged regions give identical chunks.
+    
+    Args:
+        paragraphs: Paragraphs in document order
+        target_size: Desired average chunk size in chars
+        avg_paragraph_size: Average paragraph length. Pass the same value for
+                            both versions so they use the same boundary rule.
+        window: Number of paragraphs the rolling hash covers
+        keys: Per-paragraph text the boundaries are computed from (e.g. the
+              canonical form), if not the paragraphs themselves. Chunking
+              paragraphs and keys gives chunks with the same boundaries.
+    """
+    divisor = max(1, int(round(target_size / max(avg_paragraph_size, 1.0))))
+    min_size = target_size // 4
+    max_size = target_size * 4
+    base_power = pow(_ROLL_BASE, window, _ROLL_MOD)
+    
+    values = [int(paragraph_hash(p), 16) % _ROLL_MOD for p in (keys or paragraphs)]
+    
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    rolling = 0
+    
+    for idx, (para, value) in enumerate(zip(paragraphs, values)):
+        rolling = (rolling * _ROLL_BASE + value) % _ROLL_MOD
+        if idx >= window:
+            rolling = (rolling - values[idx - window] * base_power) % _ROLL_MOD
+        
+        current_chunk.append(para)
+        current_size += len(keys[idx]) if keys else len(para)
+        
+        at_boundary = idx + 1 >= window and rolling % divisor == 0
+        if (at_boundary and current_size >= min_size) or current_size >= max_size:
+            chunks.append('\n\n'.join(current_chunk))
+            current_chunk = []
+            current_size = 0
+    
+    if current_chunk:
+        chunks.append('\n\n'.join(current_chunk))
+    
+    return chunks
+
+
+# MinHash parameters: 32 hash functions split into 8 LSH bands of 4 rows.
+# Pairs with Jaccard similarity above ~0.6 almost always share a band.
+MINHASH_PERMUTATIONS = 32
+LSH_BANDS = 8
+_MINHASH_MASKS = [
+    int(hashlib.blake2b(f'minhash-{i}'.encode(), digest_size=4).hexdigest(), 16)
+    for i in range(MINHASH_PERMUTATIONS)
+]
+_WORD = re.compile(r'\w+')
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """
+    Hashed word n-grams of a paragraph (normalized, order-aware)
+    Uses crc32 rather than hash() so results match across worker processes
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(' '.join(words).encode())} if words else set()
+    return {zlib.crc32(' '.join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(shingle_set: Set[int]) -> Tuple[int, ...]:
+    """MinHash signature using one base hash XOR-ed with fixed masks"""
+    if not shingle_set:
+        return tuple([0] * MINHASH_PERMUTATIONS)
+    return tuple(min(s ^ mask for s in shingle_set) for mask in _MINHASH_MASKS)
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """Exact Jaccard similarity of two shingle sets"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def find_similar_pairs(old_paragraphs: List[str], new_paragraphs: List[str],
+                       min_similarity: float) -> List[Tuple[int, int, float]]:
+    """
+    Pair near-duplicate paragraphs between two lists
+    
+    Uses MinHash + LSH banding to find candidates, so cost grows with the
+    number of paragraphs rather than their product. Candidates are then
+    checked with exact Jaccard similarity on word 3-grams.
+    
+    Returns:
+        List of (old_index, new_index, similarity), best matches first,
+        each paragraph used at most once
+    """
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    old_shingles = [shingles(p) for p in old_paragraphs]
+    new_shingles = [shingles(p) for p in new_paragraphs]
+    
+    # Bucket old paragraphs by each band of their signature
+    buckets = {}
+    for idx, sh in enumerate(old_shingles):
+        if not sh:
+            continue
+        sig = minhash_signature(sh)
+        for band in range(LSH_BANDS):
+            key = (band, sig[band * rows:(band + 1) * rows])
+            buckets.setdefault(key, []).append(idx)
+    
+    candidates = set()
+    for new_idx, sh in enumerate(new_shingles):
+        if not sh:
+            continue
+        sig = minhash_signature(sh)
+        for band in range(LSH_BANDS):
+            key = (band, sig[band * rows:(band + 1) * rows])
+            for old_idx in buckets.get(key, ()):
+                candidates.add((old_idx, new_idx))
+    
+    scored = []
+    for old_idx, new_idx in candidates:
+        similarity = jaccard(old_shingles[old_idx], new_shingles[new_idx])
+        if similarity >= min_similarity:
+            scored.append((old_idx, new_idx, similarity))
+    
+    # Greedy one-to-one matching, best first (ties broken by position)
+    scored.sort(key=lambda item: (-item[2], item[0], item[1]))
+    used_old = set()
+    used_new = set()
+    pairs = []
+    for old_idx, new_idx, similarity in scored:
+        if old_idx in used_old or new_idx in used_new:
+            continue
+        used_old.add(old_idx)
+        used_new.add(new_idx)
+        pairs.append((old_idx, new_idx, similarity))
+    
+    return pairs
+
+
+# Fiscal-year / page canonicalization (compiled once, applied line by line)
+# Bare 4-digit numbers are years; amounts >= 1,000 carry commas in filings
+_YEAR = re.compile(r'(?<![$\d,.])\b(19[5-9]\d|20\d\d)\b(?!,\d|\.\d|%)')
+_YEAR_TOKEN = re.compile(r'<FY([+-]\d+)?>')
+# Years that roll over with the reporting period: "fiscal 2024", "fiscal years
+# 2024 and 2023", "year ended September 28, 2024", "December 31, 2024". Other
+# years (transaction dates, targets, history) are facts and stay literal.
+_MONTH = r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?'
+_YEAR_LIST = r'(?:19[5-9]\d|20\d\d)(?:\s*(?:,\s*and|,|and)\s*(?:19[5-9]\d|20\d\d))*'
+_PERIOD = re.compile(
+    r'\b(?:fiscal(?:\s+years?)?|(?:years?|periods?|quarters?|months?)\s+ended(?:\s+' + _MONTH
+    + r'\s+\d{1,2},)?|december\s+31,)\s*' + _YEAR_LIST + r'\b(?!,\d|\.\d|%)',
+    re.IGNORECASE
+)
+# Only explicit page markers - a bare number on its own line may be a table cell
+_PAGE_LINE = re.compile(r'^(?:page\s+(?:F-)?\d{1,3}|[-–—]\s*\d{1,3}\s*[-–—]|F-\d{1,3})$', re.IGNORECASE)
+_PAGE_REF = re.compile(r'\b(pages?)\s+(?:F-)?\d{1,3}(?:\s*(?:-|–|through|to|and)\s*(?:F-)?\d{1,3})?', re.IGNORECASE)
+# The current and prior period; older years in a period context stay literal
+_PERIOD_OFFSETS = (0, -1)
+
+
+def has_year(text: str) -> bool:
+    """True if text contains a year reference"""
+    return bool(_YEAR.search(text))
+
+
+def _year_tokens(text: str, fiscal_year: int) -> str:
+    """Rewrite the years of text at a period offset as <FY> / <FY-1>"""
+    def year_token(match):
+        offset = int(match.group(1)) - fiscal_year
+        if offset not in _PERIOD_OFFSETS:
+            return match.group(1)
+        return f'<FY{offset:+d}>' if offset else '<FY>'
+    
+    return _YEAR.sub(year_token, text)
+
+
+def canonicalize_text(text: str, fiscal_year: int) -> str:
+    """
+    Rewrite period and page references relative to a filing's fiscal year
+    
+    - The current and prior fiscal year become <FY> and <FY-1>, but only
+      where they name a reporting period ("fiscal 2023" in last year's
+      filing and "fiscal 2024" in this year's both become "fiscal <FY>";
+      likewise "year ended ... 2024" and "December 31, 2024")
+    - Page-number lines and "page 45" / "pages F-12 to F-15" references
+      become <PAGE>
+    
+    Any other year is left as written: "acquired Foo Corp on March 15, 2022"
+    is the same fact in both filings, and "complete in 2024" becoming
+    "complete in 2025" is a real slip.
+    
+    Works line by line and never adds or removes lines, so line N of the
+    output always corresponds to line N of the input.
+    """
+    lines = []
+    for line in text.split('\n'):
+        if _PAGE_LINE.match(line):
+            lines.append('<PAGE>')
+            continue
+        line = _PAGE_REF.sub(lambda m: f'{m.group(1)} <PAGE>', line)
+        lines.append(_PERIOD.sub(lambda m: _year_tokens(m.group(0), fiscal_year), line))
+    
+    return '\n'.join(lines)
+
+
+def canonicalize_header(header: str, fiscal_year: int) -> str:
+    """
+    Canonical form of a table column header
+    
+    A year in a column header always names the column's period, so it is
+    rewritten without needing a period phrase around it ("2024" -> "<FY>").
+    """
+    return _year_tokens(header, fiscal_year)
+
+
+def restore_years(text: str, fiscal_year: int) -> str:
+    """Turn <FY±N> tokens back into the years of the given filing"""
+    return _YEAR_TOKEN.sub(lambda m: str(fiscal_year + int(m.group(1) or 0)), text)
@@ -0,0 +1,121 @@
+"""
+Token Budget Module
+Splits a per-report input token budget across sections by change significance
+
+Replaces the fixed 15,000-character cut per side: a section with one
+reworded sentence no longer reserves the same room as an MD&A rewrite,
+and the budget is measured in tokens (what the model's limit is in)
+rather than characters.
+"""
+
+import math
+from typing import Dict, Optional
+
+
+# Typical for 10-K prose; replaced by the ratio measured on API counts
+DEFAULT_CHARS_PER_TOKEN = 3.6
+
+# Largest sample sent to the counting endpoint (~110K tokens of filing text)
+MAX_CALIBRATION_CHARS = 400_000
+
+
+class TokenCounter:
+    """Counts tokens with the API, falling back to a calibrated local estimate"""
+    
+    def __init__(self, client=None, model: Optional[str] = None):
+        """
+        Args:
+            client: Anthropic client for messages.count_tokens (None = estimate only)
+            model: Model whose tokenizer to count with
+        """
+        self.client = client
+        self.model = model
+        self.counted_chars = 0
+        self.counted_tokens = 0
+    
+    @property
+    def chars_per_token(self) -> float:
+        """Characters per token, calibrated on every text the API has counted"""
+        if self.counted_tokens < 100:
+            return DEFAULT_CHARS_PER_TOKEN
+        return self.counted_chars / self.counted_tokens
+    
+    def estimate(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+    
+    def count(self, text: str) -> int:
+        """Token count of text (API if available, otherwise estimated)"""
+        if not text:
+            return 0
+        
+        if self.client is not None:
+            try:
+                # Token counting is a beta endpoint in the pinned SDK (anthropic 0.40)
+                result = self.client.beta.messages.count_tokens(
+                    model=self.model,
+                    messages=[{"role": "user", "content": text}]
+                )
+                self.counted_chars += len(text)
+                self.counted_tokens += result.input_tokens
+                return result.input_tokens
+            except Exception as e:
+                # Don't retry on every section; use the (calibrated) estimate from here on
+                print(f"    ⚠ Token counting API unavailable, estimating instead: {e}")
+                self.client = None
+        
+        return self.estimate(text)
+    
+    def calibrate(self, text: str, max_chars: int = MAX_CALIBRATION_CHARS):
+        """
+        Tune estimate() with one API count of (a sample of) text
+        
+        One round-trip per report instead of one per section; the sample
+        cap keeps the request inside the endpoint's context limit.
+        """
+        if self.client is not None and text:
+            self.count(text[:max_chars])
+
+
+def allocate(demands: Dict[str, int], weights: Dict[str, float], total: int) -> Dict[str, int]:
+    """
+    Split a token budget across sections in proportion to their weights
+    
+    A section never gets more than it needs: when its proportional share
+    exceeds its demand, it gets its demand and the surplus is shared among
+    the rest by weight (water-filling).
+    
+    Args:
+        demands: Tokens each section needs to be sent in full
+        weights: Relative importance (change significance) of each section
+        total: Budget to split
+    
+    Returns:
+        Tokens allocated per section (sums to at most total)
+    """
+    allocation = {name: 0 for name in demands}
+    active = {name for name, demand in demands.items() if demand > 0}
+    remaining = total
+    
+    while active and remaining > 0:
+        weight_sum = sum(weights[name] for name in active)
+        shares = {name: remaining * weights[name] / weight_sum for name in active}
+        
+        satisfied = {name for name in active if demands[name] <= shares[name]}
+        if not satisfied:
+            for name in active:
+                allocation[name] = int(shares[name])
+            break
+        
+        for name in satisfied:
+            allocation[name] = demands[name]
+            remaining -= demands[name]
+        active -= satisfied
+    
+    return allocation
+
+
+if __name__ == "__main__":
+    demands = {'Item 1': 2000, 'Item 1A': 30000, 'Item 7': 45000, 'Item 8': 8000}
+    weights = {'Item 1': 5.0, 'Item 1A': 40.0, 'Item 7': 60.0, 'Item 8': 10.0}
+    for name, tokens in allocate(demands, weights, total=48000).items():
+        print(f"{name}: needs {demands[name]:,}, allocated {tokens:,}")
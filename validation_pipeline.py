@@ -7,21 +7,27 @@ Fetches filings → Performs diff → Generates AI summaries
 import os
 import sys
 import json
+import time
 from datetime import datetime
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
 
 from sec_fetcher import SECFetcher
 from diff_analyzer import DiffAnalyzer
 from ai_analyzer import AIAnalyzer
 
 
+# Filing pairs stored for compare_analysis_modes, so every run diffs the same sections
+FIXTURES_DIR = Path(__file__).resolve().parent / 'validation_fixtures'
+
+
 class ValidationPipeline:
     """Full pipeline for validating 10-K analysis"""
     
     def __init__(self, api_key: Optional[str] = None):
         self.fetcher = SECFetcher()
-        self.diff_analyzer = DiffAnalyzer()
-        self.ai_analyzer = AIAnalyzer(api_key=api_key)
+        self.diff_analyzer = DiffAnalyzer(result_cache=self.fetcher.cache)
+        self.ai_analyzer = AIAnalyzer(api_key=api_key, response_cache=self.fetcher.cache)
     
     def run_full_analysis(self, ticker: str) -> Dict:
         """
@@ -58,10 +64,7 @@ class ValidationPipeline:
         
         # Step 2: Perform diff analysis
         print("\nSTEP 2: Performing diff analysis...")
-        diff_results = self.diff_analyzer.compare_sections(
-            old_sections=older_filing['sections'],
-            new_sections=newer_filing['sections']
-        )
+        diff_results = self.compare_filings(older_filing, newer_filing)
         
         print(f"\n✓ Diff analysis complete:")
         for section, result in diff_results.items():
@@ -79,7 +82,23 @@ class ValidationPipeline:
             diff_results=diff_results
         )
         
-        # Add filing metadata
+        return self.add_filing_metadata(analysis_result, older_filing, newer_filing)
+    
+    def compare_filings(self, older_filing: Dict, newer_filing: Dict) -> Dict:
+        """Section diffs between two filings from get_10k_sections"""
+        return self.diff_analyzer.compare_sections(
+            old_sections=older_filing['sections'],
+            new_sections=newer_filing['sections'],
+            old_fiscal_year=older_filing.get('fiscal_year'),
+            new_fiscal_year=newer_filing.get('fiscal_year'),
+            old_tables=older_filing.get('tables'),
+            new_tables=newer_filing.get('tables'),
+            old_accession=older_filing.get('accession'),
+            new_accession=newer_filing.get('accession')
+        )
+    
+    def add_filing_metadata(self, analysis_result: Dict, older_filing: Dict, newer_filing: Dict) -> Dict:
+        """Attach filing metadata to an AI analysis result"""
         analysis_result['older_filing'] = {
             'accession': older_filing['accession'],
             'filing_date': str(older_filing['filing_date']),
@@ -95,34 +114,177 @@ class ValidationPipeline:
         
         return analysis_result
     
-    def run_batch_analysis(self, tickers: List[str]) -> Dict:
+    def run_batch_analysis(self, tickers: List[str], use_batches: bool = False) -> Dict:
         """
         Run analysis on multiple tickers
         Useful for validation testing across different companies
+        
+        Args:
+            tickers: Tickers to analyze
+            use_batches: Submit all AI requests as one Message Batch (half
+                         price, results within 24 hours) instead of calling
+                         Claude once per ticker
         """
-        results = []
-        total_cost = 0.0
+        if use_batches:
+            results = self.run_message_batch(tickers)
+        else:
+            results = []
+            for ticker in tickers:
+                try:
+                    results.append(self.run_full_analysis(ticker))
+                except Exception as e:
+                    print(f"\n✗ Error processing {ticker}: {e}")
+                    results.append({
+                        'ticker': ticker,
+                        'status': 'error',
+                        'error': str(e)
+                    })
+        
+        total_cost = sum(result.get('total_cost_usd') or 0.0 for result in results)
+        
+        return {
+            'results': results,
+            'total_cost_usd': round(total_cost, 2),
+            'total_cost_gbp': round(total_cost * 0.79, 2),
+            'analyzed_at': datetime.now().isoformat()
+        }
+    
+    def run_message_batch(self, tickers: List[str]) -> List[Dict]:
+        """
+        Fetch and diff every ticker, then generate all AI summaries in one
+        Message Batch
+        
+        Returns:
+            Results in ticker order, in the run_full_analysis format
+        """
+        results = {}
+        pairs = {}
+        filings_by_ticker = {}
         
         for ticker in tickers:
+            print(f"\nPreparing {ticker}...")
             try:
-                result = self.run_full_analysis(ticker)
-                results.append(result)
-                
-                if result.get('total_cost_usd'):
-                    total_cost += result['total_cost_usd']
+                filings = self.fetcher.get_10k_sections(ticker)
+                if len(filings) < 2:
+                    results[ticker] = {
+                        'ticker': ticker,
+                        'status': 'error',
+                        'error': f'Need 2 filings, found {len(filings)}'
+                    }
+                    continue
+                newer_filing, older_filing = filings[0], filings[1]
                 
+                filings_by_ticker[ticker] = (older_filing, newer_filing)
+                pairs[ticker] = {
+                    'company_name': newer_filing['company_name'],
+                    'ticker': ticker,
+                    'old_date': str(older_filing['filing_date']),
+                    'new_date': str(newer_filing['filing_date']),
+                    'diff_results': self.compare_filings(older_filing, newer_filing)
+                }
             except Exception as e:
                 print(f"\n✗ Error processing {ticker}: {e}")
-                results.append({
+                results[ticker] = {
                     'ticker': ticker,
                     'status': 'error',
                     'error': str(e)
-                })
+                }
+        
+        if pairs:
+            print(f"\nSubmitting {len(pairs)} AI requests as a Message Batch...")
+            for ticker, analysis_result in self.ai_analyzer.analyze_batch(pairs).items():
+                older_filing, newer_filing = filings_by_ticker[ticker]
+                results[ticker] = self.add_filing_metadata(analysis_result, older_filing, newer_filing)
+        
+        return [results[ticker] for ticker in tickers]
+    
+    def load_filing_pair(self, ticker: str, fixtures_dir: Path = FIXTURES_DIR) -> Optional[Tuple[Dict, Dict]]:
+        """
+        (older, newer) filings for a ticker from its stored fixture
+        
+        The first run fetches the latest two 10-Ks and stores them as
+        <fixtures_dir>/<ticker>.json; later runs read that copy, so they diff
+        the same sections even after a new 10-K is filed.
+        
+        Returns:
+            (older_filing, newer_filing) or None if fewer than 2 filings exist
+        """
+        fixture = Path(fixtures_dir) / f'{ticker}.json'
+        if fixture.exists():
+            with open(fixture, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            print(f"✓ Loaded {ticker} filings from {fixture}")
+            return stored['older'], stored['newer']
+        
+        filings = self.fetcher.get_10k_sections(ticker)
+        if len(filings) < 2:
+            return None
+        newer_filing, older_filing = filings[0], filings[1]
+        
+        fixture.parent.mkdir(parents=True, exist_ok=True)
+        with open(fixture, 'w', encoding='utf-8') as f:
+            json.dump({'older': older_filing, 'newer': newer_filing}, f, default=str)
+        print(f"✓ Stored {ticker} filings as {fixture}")
+        return older_filing, newer_filing
+    
+    def compare_analysis_modes(self, tickers: List[str], fixtures_dir: Path = FIXTURES_DIR) -> Dict:
+        """
+        Run single-call and per-section AI analysis on the same diffs
+        
+        Filings come from stored fixtures (see load_filing_pair), so the
+        inputs are identical run to run. The response cache is bypassed so
+        both modes make their API calls; point ANTHROPIC_BASE_URL at
+        anthropic_stub.py (--stub) to make those free and deterministic.
+        Latency is wall-clock time of the AI step only.
+        """
+        comparisons = []
+        response_cache = self.ai_analyzer.response_cache
+        self.ai_analyzer.response_cache = None
+        
+        try:
+            for ticker in tickers:
+                pair = self.load_filing_pair(ticker, fixtures_dir)
+                if pair is None:
+                    print(f"⚠ Skipping {ticker}: need 2 filings")
+                    continue
+                older_filing, newer_filing = pair
+                
+                diff_results = self.compare_filings(older_filing, newer_filing)
+                
+                arguments = {
+                    'company_name': newer_filing['company_name'],
+                    'ticker': ticker,
+                    'old_date': str(older_filing['filing_date']),
+                    'new_date': str(newer_filing['filing_date']),
+                    'diff_results': diff_results
+                }
+                
+                comparison = {'ticker': ticker}
+                for mode, analyze in [('single', self.ai_analyzer.analyze_all_sections),
+                                      ('sections', self.ai_analyzer.analyze_sections_concurrently)]:
+                    started = time.perf_counter()
+                    result = analyze(**arguments)
+                    comparison[mode] = {
+                        'latency_seconds': round(time.perf_counter() - started, 2),
+                        'cost_usd': result['total_cost_usd'],
+                        'tokens': result['total_tokens'],
+                        'failed_sections': sum(1 for section in result['sections'] if section['status'] == 'error'),
+                        'sections_with_changes': sum(1 for section in result['sections'] if section['has_changes'])
+                    }
+                comparison['sections']['duplicates_removed'] = result.get('duplicates_removed', 0)
+                comparisons.append(comparison)
+        finally:
+            self.ai_analyzer.response_cache = response_cache
+        
+        print(f"\n{'Ticker':<8} {'Mode':<9} {'Latency':>8} {'Cost':>9} {'Tokens':>8} {'Failed':>7}")
+        for comparison in comparisons:
+            for mode in ('single', 'sections'):
+                row = comparison[mode]
+                print(f"{comparison['ticker']:<8} {mode:<9} {row['latency_seconds']:>7.1f}s "
+                      f"${row['cost_usd']:>8.4f} {row['tokens']:>8,} {row['failed_sections']:>7}")
         
         return {
-            'results': results,
-            'total_cost_usd': round(total_cost, 2),
-            'total_cost_gbp': round(total_cost * 0.79, 2),
+            'comparisons': comparisons,
             'analyzed_at': datetime.now().isoformat()
         }
     
@@ -203,6 +365,20 @@ def main():
     except ImportError:
         print("⚠ python-dotenv not installed, trying environment variable")
     
+    if '--compare-modes' in sys.argv:
+        # Single-call vs per-section AI analysis on stored filings.
+        # --stub answers the AI calls locally: no key, no spend.
+        if '--stub' in sys.argv:
+            from anthropic_stub import StubAnthropicServer
+            stub = StubAnthropicServer().start()
+            os.environ['ANTHROPIC_BASE_URL'] = stub.base_url
+            print(f"✓ AI calls go to the local stub at {stub.base_url}")
+        api_key = 'stub-key' if '--stub' in sys.argv else os.environ.get('ANTHROPIC_API_KEY')
+        pipeline = ValidationPipeline(api_key=api_key)
+        results = pipeline.compare_analysis_modes(['AAPL', 'MSFT', 'PFE', 'XOM'])
+        pipeline.save_results(results)
+        return
+    
     # Check for API key
     api_key = os.environ.get('ANTHROPIC_API_KEY')
     if not api_key:
@@ -245,7 +421,8 @@ def main():
     
     # Run validation
     pipeline = ValidationPipeline(api_key=api_key)
-    results = pipeline.run_batch_analysis(test_tickers)
+    # --batch: one Message Batch at half price, for runs nobody is waiting on
+    results = pipeline.run_batch_analysis(test_tickers, use_batches='--batch' in sys.argv)
     
     # Save results
     pipeline.save_results(results)
@@ -3,17 +3,42 @@ Worker - Processes report generation jobs
 Runs in background thread
 """
 
+import os
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from sec_fetcher import SECFetcher
 from diff_analyzer import DiffAnalyzer
-from ai_analyzer import AIAnalyzer
-from quality_validator import QualityValidator
+from boilerplate_index import get_boilerplate_index
+from ai_analyzer import AIAnalyzer, AI_MAX_CONCURRENCY, PROMPT_VERSION
+from quality_validator import QualityValidator, VALIDATOR_VERSION
 from database import SupabaseClient
+from stage_cache import digest
 import requests
 
 
-def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
+# Stream AI responses so progress updates per section (AI_STREAMING=0 to disable)
+AI_STREAMING = os.environ.get('AI_STREAMING', '1') != '0'
+
+# History-mode comparisons other than the latest through one Message Batch
+# (half price, but minutes or more to complete; AI_BATCH_HISTORY=1 to enable)
+AI_BATCH_HISTORY = os.environ.get('AI_BATCH_HISTORY', '0') == '1'
+
+
+def summaries_by_section(ai_results):
+    """Convert AIAnalyzer's sections list to the summaries dict stored in the database"""
+    summaries = {}
+    for section in ai_results.get('sections', []):
+        section_name = section.get('section')  # It's 'section', not 'section_name'
+        summary = section.get('summary', '')
+        if section_name and summary:
+            summaries[section_name] = summary
+    return summaries
+
+
+def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False, years=2,
+                analysis_mode='single'):
     """
     Main job processing function
     Runs the entire pipeline: fetch → extract → diff → AI → validate → save
@@ -25,6 +50,11 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
         callback_url: URL to call when done
         jobs: Shared dict for status tracking
         dry_run: If True, skip AI analysis (for testing without API costs)
+        years: Number of 10-Ks to cover. 2 (default) is a normal report;
+               more is history mode: years - 1 consecutive comparisons from
+               one fetch, saved as one report each (the latest is the main one).
+        analysis_mode: 'single' (one API call for all sections) or 'sections'
+                       (one concurrent call per section, then deduplicated)
     """
     
     # Track start time
@@ -59,7 +89,8 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
                 'created_at', desc=True
             ).limit(1).execute()
             
-            if existing.data:
+            # History mode always builds fresh: a cached report covers one year only
+            if existing.data and years == 2:
                 report = existing.data[0]
                 is_refunded = report.get('refunded', False)
                 
@@ -195,15 +226,20 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
         # STEP 1: Fetch and extract sections
         # ========================================
         print(f"[{job_id}] Step 1: Fetching 10-K data for {ticker}")
-        fetcher = SECFetcher()
-        filings = fetcher.get_10k_sections(ticker)
+        fetcher = SECFetcher(section_store=db)
+        stages = fetcher.stages  # Same stage cache for every step of this job
+        filings = fetcher.get_10k_sections(ticker, count=years)
         
         if len(filings) < 2:
             raise Exception(f"Need 2 10-K filings to compare, found {len(filings)}")
         
         print(f"[{job_id}] ✓ Fetched {len(filings)} filings")
         print(f"[{job_id}]   Newer: {filings[0]['filing_date']}")
-        print(f"[{job_id}]   Older: {filings[1]['filing_date']}")
+        print(f"[{job_id}]   Older: {filings[-1]['filing_date']}")
+        
+        # (older, newer) for each consecutive pair, newest pair first.
+        # A normal report is the single pair; history mode has years - 1.
+        pairs = [(filings[i + 1], filings[i]) for i in range(len(filings) - 1)]
         
         jobs[job_id]['progress'] = 30
         jobs[job_id]['current_step'] = 'Analyzing differences...'
@@ -211,21 +247,21 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
         # ========================================
         # STEP 2: Run diff analysis
         # ========================================
-        print(f"[{job_id}] Step 2: Performing diff analysis")
-        diff_analyzer = DiffAnalyzer()
-        diff_results = diff_analyzer.compare_sections(
-            old_sections=filings[1]['sections'],
-            new_sections=filings[0]['sections']
+        print(f"[{job_id}] Step 2: Performing diff analysis ({len(pairs)} comparison(s))")
+        diff_analyzer = DiffAnalyzer(
+            max_workers=int(os.environ.get('DIFF_MAX_WORKERS', '1')),
+            boilerplate_index=get_boilerplate_index(),
+            result_cache=fetcher.cache
         )
+        all_diff_results = diff_analyzer.compare_filing_history(filings)
         
         print(f"[{job_id}] ✓ Diff analysis complete")
-        print(f"[{job_id}]   Sections compared: {len(diff_results)}")
         
         # Debug: Check which sections have meaningful changes
-        for section_name, diff_result in diff_results.items():
-            print(f"[{job_id}]   {section_name}: has_meaningful_changes = {diff_result.get('has_meaningful_changes', False)}")
-        
-        print(f"[{job_id}] Step 3: Generating AI summaries")
+        for (older, newer), diff_results in zip(pairs, all_diff_results):
+            print(f"[{job_id}]   {older['filing_date']} → {newer['filing_date']}: {len(diff_results)} sections compared")
+            for section_name, diff_result in diff_results.items():
+                print(f"[{job_id}]     {section_name}: has_meaningful_changes = {diff_result.get('has_meaningful_changes', False)}")
         
         jobs[job_id]['progress'] = 50
         jobs[job_id]['current_step'] = 'Generating AI summaries...'
@@ -235,39 +271,135 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
         # ========================================
         if dry_run:
             print(f"[{job_id}] Step 3: Skipping AI analysis (DRY RUN)")
-            ai_results = {
-                'sections': [],
-                'total_cost_usd': 0.0,
-                'total_tokens': 0
-            }
-            summaries = {
-                'Item 1': '[DRY RUN] AI analysis skipped',
-                'Item 1A': '[DRY RUN] AI analysis skipped',
-                'Item 7': '[DRY RUN] AI analysis skipped',
-                'Item 8': '[DRY RUN] AI analysis skipped'
-            }
+            all_ai_results = [
+                {'sections': [], 'total_cost_usd': 0.0, 'total_tokens': 0}
+                for _ in pairs
+            ]
+            all_summaries = [
+                {
+                    'Item 1': '[DRY RUN] AI analysis skipped',
+                    'Item 1A': '[DRY RUN] AI analysis skipped',
+                    'Item 7': '[DRY RUN] AI analysis skipped',
+                    'Item 8': '[DRY RUN] AI analysis skipped'
+                }
+                for _ in pairs
+            ]
         else:
             print(f"[{job_id}] Step 3: Generating AI summaries")
-            ai_analyzer = AIAnalyzer()
-            ai_results = ai_analyzer.analyze_all_sections(
-                ticker=ticker,
-                company_name=filings[0]['company_name'],
-                old_date=str(filings[1]['filing_date']),
-                new_date=str(filings[0]['filing_date']),
-                diff_results=diff_results
-            )
+            ai_analyzer = AIAnalyzer(response_cache=fetcher.cache)
+            
+            # Progress moves from 50 to 80 as section summaries stream in
+            sections_total = 4 * len(pairs)
+            sections_done = []
+            progress_lock = threading.Lock()
+            
+            def on_section(analysis):
+                with progress_lock:
+                    sections_done.append(analysis['section'])
+                    jobs[job_id]['progress'] = 50 + (30 * len(sections_done)) // sections_total
+                    if analysis['status'] == 'error':
+                        jobs[job_id]['current_step'] = f"AI summary failed: {analysis['section']}"
+                    else:
+                        jobs[job_id]['current_step'] = f"Summarized {analysis['section']} ({len(sections_done)}/{sections_total})"
+            
+            def stage_inputs(pair_index, path='live'):
+                older, newer = pairs[pair_index]
+                inputs = {
+                    'model': ai_analyzer.model,
+                    'routing': ai_analyzer.routing_config(),
+                    'ticker': ticker,
+                    'company_name': newer['company_name'],
+                    'accessions': [older['accession'], newer['accession']],
+                    'diff': digest(all_diff_results[pair_index]),
+                    'mode': analysis_mode
+                }
+                # Batched results trim oversized sections instead of map-reducing
+                # them, so they are stored apart from live ones
+                if path != 'live':
+                    inputs['path'] = path
+                return inputs
+            
+            def is_stored(pair_index, path):
+                return stages.get('ai', stages.key('ai', PROMPT_VERSION, stage_inputs(pair_index, path))) is not None
+            
+            def analyze_pair(pair_index, compute=None, path='live'):
+                older, newer = pairs[pair_index]
+                diff_results = all_diff_results[pair_index]
+                return stages.run(
+                    'ai', PROMPT_VERSION,
+                    stage_inputs(pair_index, path),
+                    compute or (lambda: ai_analyzer.analyze_sections_concurrently(
+                        ticker=ticker,
+                        company_name=newer['company_name'],
+                        old_date=str(older['filing_date']),
+                        new_date=str(newer['filing_date']),
+                        diff_results=diff_results,
+                        on_section=on_section,
+                        max_concurrency=AI_MAX_CONCURRENCY
+                    ) if analysis_mode == 'sections' else ai_analyzer.analyze_all_sections(
+                        ticker=ticker,
+                        company_name=newer['company_name'],
+                        old_date=str(older['filing_date']),
+                        new_date=str(newer['filing_date']),
+                        diff_results=diff_results,
+                        stream=AI_STREAMING,
+                        on_section=on_section
+                    )),
+                    should_store=lambda result: all(s.get('status') in ('analyzed', 'unchanged') for s in result.get('sections', [])),
+                    # Reused summaries cost nothing this time; what they cost originally is saved
+                    on_hit=lambda result: {
+                        **result,
+                        'total_cost_usd': 0.0,
+                        'total_cost_gbp': 0.0,
+                        'total_tokens': 0,
+                        'cached_cost_usd': result.get('cached_cost_usd', 0.0) + result['total_cost_usd']
+                    }
+                )
+            
+            # Older comparisons without a stored live result can go out as one
+            # batch (single-call requests only); the latest pair stays live.
+            # Those already answered by an earlier batch are not resubmitted.
+            batch_indices = []
+            if AI_BATCH_HISTORY and analysis_mode == 'single':
+                batch_indices = [i for i in range(1, len(pairs)) if not is_stored(i, 'live')]
+            submit_indices = [i for i in batch_indices if not is_stored(i, 'batch')]
+            
+            # LLM calls are network-bound: live pairs run concurrently, and
+            # alongside the batch when there is one
+            with ThreadPoolExecutor(max_workers=min(len(pairs), AI_MAX_CONCURRENCY)) as pool:
+                futures = {
+                    i: pool.submit(analyze_pair, i)
+                    for i in range(len(pairs)) if i not in batch_indices
+                }
+                
+                batched = {}
+                if submit_indices:
+                    print(f"[{job_id}]   Batching {len(submit_indices)} history comparison(s)")
+                    batched = ai_analyzer.analyze_batch({
+                        i: {
+                            'company_name': pairs[i][1]['company_name'],
+                            'ticker': ticker,
+                            'old_date': str(pairs[i][0]['filing_date']),
+                            'new_date': str(pairs[i][1]['filing_date']),
+                            'diff_results': all_diff_results[i]
+                        }
+                        for i in submit_indices
+                    })
+                    for result in batched.values():
+                        for analysis in result.get('sections', []):
+                            on_section(analysis)
+                
+                all_ai_results = [
+                    futures[i].result() if i in futures
+                    else analyze_pair(i, lambda result=batched.get(i): result, path='batch')
+                    for i in range(len(pairs))
+                ]
             
             print(f"[{job_id}] ✓ AI analysis complete")
-            print(f"[{job_id}]   Cost: ${ai_results['total_cost_usd']:.4f}")
-            print(f"[{job_id}]   Tokens: {ai_results['total_tokens']:,}")
+            print(f"[{job_id}]   Cost: ${sum(r['total_cost_usd'] for r in all_ai_results):.4f}")
+            print(f"[{job_id}]   Tokens: {sum(r['total_tokens'] for r in all_ai_results):,}")
             
-            # Convert sections list to summaries dict for database
-            summaries = {}
-            for section in ai_results.get('sections', []):
-                section_name = section.get('section')  # It's 'section', not 'section_name'
-                summary = section.get('summary', '')
-                if section_name and summary:
-                    summaries[section_name] = summary
+            all_summaries = [summaries_by_section(ai_results) for ai_results in all_ai_results]
         
         jobs[job_id]['progress'] = 80
         jobs[job_id]['current_step'] = 'Validating quality...'
@@ -275,11 +407,25 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
         # Step 4: Validate quality
         print(f"[{job_id}] Step 4: Validating quality")
         validator = QualityValidator()
-        quality_result = validator.validate_extraction(
-            filings=filings,
-            diff_results=diff_results,
-            ai_results={'summaries': summaries}  # Pass summaries dict
-        )
+        quality_results = [
+            stages.run(
+                'validation', VALIDATOR_VERSION,
+                {
+                    'sections': digest([older['sections'], newer['sections']]),
+                    'diff': digest(diff_results),
+                    'summaries': digest(summaries)
+                },
+                lambda: validator.validate_extraction(
+                    filings=[newer, older],
+                    diff_results=diff_results,
+                    ai_results={'summaries': summaries}  # Pass summaries dict
+                )
+            )
+            for (older, newer), diff_results, summaries in zip(pairs, all_diff_results, all_summaries)
+        ]
+        
+        # The latest comparison is the report the user asked for: it decides the refund
+        quality_result = quality_results[0]
         
         if quality_result['is_valid']:
             print(f"[{job_id}] ✓ Quality check passed")
@@ -298,24 +444,31 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
         
         generation_time = int((datetime.now() - start_time).total_seconds())
         
-        report_id = db.create_report(
-            user_id=user_id,
-            ticker=ticker,
-            company_name=filings[0]['company_name'],
-            newer_filing_date=filings[0]['filing_date'],
-            older_filing_date=filings[1]['filing_date'],
-            newer_accession=filings[0]['accession'],
-            older_accession=filings[1]['accession'],
-            sections_extracted=list(filings[0]['sections'].keys()),
-            extraction_issues=quality_result['issues'],
-            extraction_success=quality_result['is_valid'],
-            ai_summaries=summaries,  # Use the summaries dict we created
-            ai_cost_usd=ai_results['total_cost_usd'],
-            total_tokens_consumed=ai_results['total_tokens'],
-            generation_time_seconds=generation_time
-        )
+        report_ids = []
+        for (older, newer), summaries, ai_results, pair_quality in zip(
+                pairs, all_summaries, all_ai_results, quality_results):
+            report_ids.append(db.create_report(
+                user_id=user_id,
+                ticker=ticker,
+                company_name=newer['company_name'],
+                newer_filing_date=newer['filing_date'],
+                older_filing_date=older['filing_date'],
+                newer_accession=newer['accession'],
+                older_accession=older['accession'],
+                sections_extracted=list(newer['sections'].keys()),
+                extraction_issues=pair_quality['issues'],
+                extraction_success=pair_quality['is_valid'],
+                ai_summaries=summaries,  # Use the summaries dict we created
+                ai_cost_usd=ai_results['total_cost_usd'],
+                ai_cost_cached_usd=ai_results.get('cached_cost_usd', 0.0),
+                total_tokens_consumed=ai_results['total_tokens'],
+                generation_time_seconds=generation_time
+            ))
+        report_id = report_ids[0]
         
         print(f"[{job_id}] ✓ Report saved: {report_id}")
+        if len(report_ids) > 1:
+            print(f"[{job_id}]   History reports: {', '.join(map(str, report_ids[1:]))}")
         
         # Update company status to 'working' since extraction succeeded
         try:
@@ -381,6 +534,7 @@ def process_job(job_id, user_id, ticker, callback_url, jobs, dry_run=False):
                     'job_id': job_id,
                     'status': 'completed',
                     'report_id': report_id,
+                    'report_ids': report_ids,
                     'refunded': not quality_result['is_valid']
                 },
                 headers={